@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Suite de non-régression des plans des requêtes de métriques
+
+Charge un jeu de données synthétique à plusieurs échelles dans une base
+PostgreSQL dédiée, puis capture EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) pour
+chaque requête de métrique :
+- requêtes de export_metrics.py (exports complets et deltas incrémentaux)
+- vue deployment_details
+- chaque requête de sql/queries.sql et sql/queries_conformes.sql
+
+Sont signalés : les seq scans sur un grand nombre de lignes, les écarts entre
+lignes estimées et réelles (row-estimate blowup) et, par rapport à une
+baseline JSON, les régressions de latence, de buffers et les nouveaux seq scans.
+Le code de sortie est 1 en cas de régression.
+
+La base (--pg-dbname, dora_bench par défaut) est vidée avant chaque échelle ;
+les autres paramètres de connexion viennent de DB_HOST, DB_PORT, DB_USER et DB_PASSWORD.
+
+Usage:
+    python bench_query_plans.py [--scales 1000 10000 50000] [--baseline query_plan_baseline.json]
+    python bench_query_plans.py --update-baseline
+"""
+
+import os
+import io
+import sys
+import json
+import argparse
+import contextlib
+from typing import Dict, List, Tuple, Optional, Any
+import psycopg2
+import config
+import export_metrics
+import retention
+from db_loader import DatabaseLoader
+from synthetic_data import generate_dataset
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+SQL_FILES = ['queries.sql', 'queries_conformes.sql']
+BASELINE_FILE = 'query_plan_baseline.json'
+
+# Un seq scan est signalé au-delà de ce nombre de lignes parcourues
+SEQ_SCAN_MIN_ROWS = 10000
+# Écart estimé/réel signalé (facteur), ignoré sous ce nombre de lignes
+ESTIMATE_FACTOR = 10
+ESTIMATE_MIN_ROWS = 100
+# Régression de latence : plus lent que la baseline de ce facteur et de ce nombre de ms
+# (la latence varie d'un run à l'autre, les buffers sont le signal stable)
+LATENCY_TOLERANCE = 1.0
+LATENCY_MIN_MS = 5.0
+BUFFERS_TOLERANCE = 1.0
+
+
+def parse_sql_file(path: str) -> List[Tuple[str, str]]:
+    """
+    Découpe un fichier SQL en requêtes nommées par leur section (titre encadré
+    de lignes -- ====) et le commentaire qui les précède
+
+    Returns:
+        Liste de (nom, requête)
+    """
+    queries = []
+    section, label = None, None
+    in_header = False
+    lines = []
+    stem = os.path.basename(path)
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if not lines and stripped.startswith('--'):
+                comment = stripped.lstrip('-').strip()
+                if comment and set(comment) <= {'='}:
+                    in_header = not in_header
+                    if in_header:
+                        section, label = None, None
+                elif comment and in_header and section is None:
+                    section = comment
+                elif comment and not in_header:
+                    label = comment
+                continue
+            if stripped or lines:
+                lines.append(line)
+            if stripped.endswith(';'):
+                name = ' / '.join(filter(None, [section, label]))
+                queries.append((f"{stem}#{len(queries) + 1} {name}", ''.join(lines).strip().rstrip(';')))
+                lines, label = [], None
+
+    return queries
+
+
+def collect_queries(watermark: Optional[str]) -> Dict[str, Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Catalogue des requêtes mesurées
+
+    Args:
+        watermark: Watermark des deltas incrémentaux (dernier chargement)
+
+    Returns:
+        Dictionnaire nom -> (requête, paramètres)
+    """
+    params = {'environment': 'production', 'repo': ''}
+    queries = {
+        'export:deployment_frequency': (export_metrics.DEPLOYMENT_FREQUENCY_QUERY, params),
+        'export:lead_time': (export_metrics.LEAD_TIME_QUERY, params),
+        'export:change_failure_rate': (export_metrics.CHANGE_FAILURE_RATE_QUERY, params),
+        'export:mttr': (export_metrics.MTTR_QUERY, {'repo': ''}),
+        'export:summary': (export_metrics.SUMMARY_QUERY, params),
+        'export:lead_time_delta': (
+            export_metrics.LEAD_TIME_DETAIL_QUERY + export_metrics.LEAD_TIME_CHANGED_FILTER,
+            dict(params, watermark=watermark)
+        ),
+        'export:mttr_delta': (
+            export_metrics.MTTR_DETAIL_QUERY + export_metrics.MTTR_CHANGED_FILTER,
+            {'watermark': watermark, 'repo': ''}
+        ),
+        'view:deployment_details': ("SELECT * FROM deployment_details", None),
+        'retention:trends': (retention.TRENDS_QUERY, dict(params, months=12)),
+    }
+    for filename in SQL_FILES:
+        for name, query in parse_sql_file(os.path.join(SQL_DIR, filename)):
+            queries[name] = (query, None)
+    return queries
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk(child)
+
+
+def analyze_plan(explain: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Résume un plan EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+
+    Returns:
+        Dictionnaire contenant latence, buffers, seq scans et pire écart d'estimation
+    """
+    root = explain[0]
+    plan = root['Plan']
+    seq_scans = set()
+    worst = {'factor': 1.0, 'node': None}
+
+    for node in _walk(plan):
+        loops = node.get('Actual Loops', 0)
+        if not loops:
+            continue
+        if node['Node Type'] == 'Seq Scan':
+            scanned = (node['Actual Rows'] + node.get('Rows Removed by Filter', 0)) * loops
+            if scanned >= SEQ_SCAN_MIN_ROWS:
+                seq_scans.add(node['Relation Name'])
+
+        estimated, actual = node['Plan Rows'], node['Actual Rows']
+        if max(estimated, actual) >= ESTIMATE_MIN_ROWS:
+            factor = max((actual + 1) / (estimated + 1), (estimated + 1) / (actual + 1))
+            if factor > worst['factor']:
+                relation = f" on {node['Relation Name']}" if 'Relation Name' in node else ""
+                worst = {'factor': round(factor, 1),
+                         'node': f"{node['Node Type']}{relation} (est {estimated}, actual {actual})"}
+
+    return {
+        'execution_ms': round(root['Execution Time'], 3),
+        'buffers': plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0),
+        'seq_scans': sorted(seq_scans),
+        'estimate_factor': worst['factor'],
+        'estimate_node': worst['node']
+    }
+
+
+def flags(result: Dict[str, Any]) -> List[str]:
+    """Problèmes de plan signalés indépendamment de la baseline"""
+    found = [f"seq scan {relation}" for relation in result['seq_scans']]
+    if result['estimate_factor'] >= ESTIMATE_FACTOR:
+        found.append(f"estimate x{result['estimate_factor']:g}: {result['estimate_node']}")
+    return found
+
+
+def regressions(result: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Régressions par rapport à la baseline de la même requête et de la même échelle"""
+    found = []
+    if (result['execution_ms'] > baseline['execution_ms'] * (1 + LATENCY_TOLERANCE)
+            and result['execution_ms'] - baseline['execution_ms'] > LATENCY_MIN_MS):
+        found.append(f"latency {baseline['execution_ms']:.1f} -> {result['execution_ms']:.1f} ms")
+    if result['buffers'] > baseline['buffers'] * (1 + BUFFERS_TOLERANCE) and result['buffers'] > 100:
+        found.append(f"buffers {baseline['buffers']} -> {result['buffers']}")
+    for relation in set(result['seq_scans']) - set(baseline['seq_scans']):
+        found.append(f"new seq scan on {relation}")
+    if result['estimate_factor'] >= ESTIMATE_FACTOR > baseline['estimate_factor']:
+        found.append(f"new estimate blowup x{result['estimate_factor']:g}")
+    return found
+
+
+def load_scale(loader: DatabaseLoader, deployments: int):
+    """Vide la base puis charge le jeu de données synthétique d'une échelle"""
+    data = generate_dataset(deployments, incidents=max(deployments // 10, 1))
+    loader.cursor.execute(
+        "TRUNCATE deployment_commits, incidents, deployments, changes, load_rejects, daily_rollups RESTART IDENTITY"
+    )
+    loader.conn.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.load_all_data(data)
+    loader.conn.autocommit = True
+    loader.cursor.execute("VACUUM ANALYZE")
+    loader.conn.autocommit = False
+
+
+def explain(cursor, query: str, params: Optional[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """Exécute EXPLAIN ANALYZE plusieurs fois et garde l'exécution la plus rapide"""
+    results = []
+    for _ in range(repeat):
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        plan = cursor.fetchone()[0]
+        results.append(analyze_plan(plan if isinstance(plan, list) else json.loads(plan)))
+    cursor.connection.rollback()
+    return min(results, key=lambda result: result['execution_ms'])
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Query plan regression suite for the metric SQL")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of synthetic deployments per scale")
+    parser.add_argument('--repeat', type=int, default=5, help="EXPLAIN ANALYZE runs per query (fastest kept)")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--report', help="Write the full results as JSON")
+    parser.add_argument('--pg-dbname', default='dora_bench')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    elif not args.update_baseline:
+        print(f"No baseline at {args.baseline}: plans are only checked for seq scans and estimates")
+
+    loader = DatabaseLoader(*config.db_params(args.pg_dbname))
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.connect()
+        loader.init_schema()
+
+    results = {}
+    failed = []
+    try:
+        for scale in args.scales:
+            print(f"Loading {scale} synthetic deployments...")
+            load_scale(loader, scale)
+            # Deltas mesurés en régime établi : rien n'a changé depuis le dernier chargement
+            loader.cursor.execute("""
+                SELECT GREATEST(
+                    (SELECT MAX(loaded_at) FROM deployments),
+                    (SELECT MAX(loaded_at) FROM changes),
+                    (SELECT MAX(loaded_at) FROM incidents),
+                    (SELECT MAX(created_at) FROM deployment_commits)
+                )
+            """)
+            watermark = loader.cursor.fetchone()[0]
+
+            results[str(scale)] = {}
+            print("=" * 110)
+            print(f"{'scale ' + str(scale):<58} {'ms':>9} {'buffers':>9} {'est x':>7}  flags")
+            print("=" * 110)
+            for name, (query, params) in collect_queries(watermark and watermark.isoformat()).items():
+                try:
+                    result = explain(loader.cursor, query, params, args.repeat)
+                except psycopg2.Error as e:
+                    loader.conn.rollback()
+                    print(f"{name[:58]:<58} ERROR: {str(e).strip().splitlines()[0]}")
+                    failed.append(f"{scale} {name}: error")
+                    continue
+
+                results[str(scale)][name] = result
+                notes = flags(result)
+                previous = baseline.get(str(scale), {}).get(name)
+                if previous:
+                    found = regressions(result, previous)
+                    failed += [f"{scale} {name}: {regression}" for regression in found]
+                    notes += [f"REGRESSION {regression}" for regression in found]
+                print(f"{name[:58]:<58} {result['execution_ms']:>9.2f} {result['buffers']:>9} "
+                      f"{result['estimate_factor']:>7g}  {'; '.join(notes)}")
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loader.disconnect()
+
+    print("=" * 110)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.report}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if failed:
+        print(f"{len(failed)} plan regressions:")
+        for regression in failed:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("No plan regressions")
+
+
+if __name__ == "__main__":
+    main()
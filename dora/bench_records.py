@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark mémoire : octets par ligne extraite, dictionnaires vs enregistrements typés
+
+Compare l'ancienne représentation (dict par élément + tuple reconstruit par le
+loader) aux enregistrements de records.py passés tels quels au loader.
+"""
+
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from records import CommitRecord, DeploymentRecord
+
+AUTHORS = [f"developer-{i}" for i in range(20)]
+LONG_MESSAGE = "Fix flaky integration test\n\n" + "Detailed explanation of the change. " * 200
+
+
+def commit_values(i: int):
+    """Valeurs brutes d'un commit synthétique (auteurs répétés, messages longs)"""
+    return (
+        f"{i:040x}",
+        datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+        # Chaînes distinctes à chaque ligne, comme celles décodées depuis l'API
+        ''.join(AUTHORS[i % len(AUTHORS)]),
+        LONG_MESSAGE + str(i)
+    )
+
+
+def deployment_values(i: int):
+    """Valeurs brutes d'un déploiement synthétique"""
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i)
+    return (i, f"{i:040x}", ''.join('production'), ''.join('success'), created_at, created_at, "Deploy to production")
+
+
+def as_commit_dict(values):
+    sha, committed_date, author, message = values
+    return {'sha': sha, 'committed_date': committed_date, 'author': author, 'message': message}
+
+
+def as_deployment_dict(values):
+    keys = ('deployment_id', 'sha', 'environment', 'status', 'created_at', 'updated_at', 'description')
+    return dict(zip(keys, values))
+
+
+def with_tuple(item):
+    """Dictionnaire extrait + tuple reconstruit par le loader (partageant les valeurs)"""
+    return item, tuple(item.values())
+
+
+def measure(build, rows: int) -> float:
+    """Mesure les octets alloués par ligne retenue en mémoire"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = [build(i) for i in range(rows)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del items
+    return allocated / rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    scenarios = [
+        ("commits      dict + tuple", lambda i: with_tuple(as_commit_dict(commit_values(i)))),
+        ("commits      CommitRecord", lambda i: CommitRecord.create(*commit_values(i))),
+        ("deployments  dict + tuple", lambda i: with_tuple(as_deployment_dict(deployment_values(i)))),
+        ("deployments  DeploymentRecord", lambda i: DeploymentRecord.create(*deployment_values(i))),
+    ]
+
+    print("=" * 70)
+    print(f"Memory per extracted row ({rows} rows)")
+    print("=" * 70)
+    for name, build in scenarios:
+        print(f"  {name:<32} {measure(build, rows):>10.0f} bytes/row")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark des sketches t-digest face aux percentiles exacts
+
+Pour chaque taille de jeu de données synthétique, compare les p50/p90/p99 du
+lead time (production, toute la période) obtenus en fusionnant les sketches
+journaliers sérialisés avec les percentiles exacts : NumPy (même interpolation
+que PERCENTILE_CONT) et, avec --postgres, PERCENTILE_CONT sur les lignes brutes.
+
+PostgreSQL est mesuré sur une base dédiée (--pg-dbname, dora_bench par défaut)
+dont les tables sont vidées avant le chargement ; les autres paramètres de
+connexion viennent de DB_HOST, DB_PORT, DB_USER et DB_PASSWORD.
+
+Usage:
+    python bench_sketches.py [--sizes 1000 10000 50000] [--compression 100] [--postgres]
+"""
+
+import io
+import time
+import argparse
+import contextlib
+from datetime import date
+import numpy as np
+import config
+from synthetic_data import generate_dataset
+from metrics import columns_from_records
+from sketches import TDigest, SketchStore, daily_sketches
+
+QUANTILES = [0.5, 0.9, 0.99]
+EXACT_QUERY = """
+    SELECT PERCENTILE_CONT(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (
+        ORDER BY EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 3600
+    )
+    FROM deployments d
+    JOIN deployment_commits dc ON d.id = dc.deployment_id
+    JOIN changes c ON dc.commit_id = c.id
+    WHERE d.status = 'success' AND d.environment = 'production'
+"""
+
+
+def lead_time_hours(columns) -> np.ndarray:
+    """Lead times bruts (production, déploiements réussis), en heures"""
+    mask = (columns.lead_status == 'success') & (columns.lead_environment == 'production')
+    return (columns.lead_deployed_at[mask] - columns.lead_committed_at[mask]) / np.timedelta64(1, 'h')
+
+
+def rank_error(values: np.ndarray, estimate: float, q: float) -> float:
+    """Écart entre le rang de l'estimation et le rang visé, en fraction de n"""
+    return abs(np.searchsorted(values, estimate) / values.size - q)
+
+
+def postgres_store(dbname: str, data) -> SketchStore:
+    """Charge le jeu de données dans la base de benchmark vidée"""
+    from db_loader import DatabaseLoader
+
+    params = config.db_params(dbname)
+
+    loader = DatabaseLoader(*params)
+    loader.connect()
+    loader.init_schema()
+    loader.cursor.execute("TRUNCATE deployment_commits, incidents, deployments, changes, load_rejects, metric_sketches")
+    loader.conn.commit()
+    loader.load_all_data(data)
+    loader.disconnect()
+
+    store = SketchStore(*params)
+    store.connect()
+    return store
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Compare t-digest sketches with exact percentiles")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Number of deployments per dataset")
+    parser.add_argument('--compression', type=int, default=100)
+    parser.add_argument('--postgres', action='store_true', help="Also time PERCENTILE_CONT in PostgreSQL")
+    parser.add_argument('--pg-dbname', default='dora_bench')
+    args = parser.parse_args()
+
+    print("=" * 96)
+    print(f"{'deployments':>11} {'rows':>8} {'sketches':>8} {'bytes':>9} {'quantile':>8} {'exact':>9} "
+          f"{'sketch':>9} {'rank err':>9} {'exact (ms)':>11} {'merge (ms)':>11}")
+    print("=" * 96)
+
+    for size in args.sizes:
+        data = generate_dataset(size, incidents=size // 10)
+        columns = columns_from_records(data)
+        values = np.sort(lead_time_hours(columns))
+
+        rows = daily_sketches(columns, 'bench/repo', args.compression)
+        blobs = [row[5] for row in rows if row[2] == 'lead_time' and row[3] == 'production']
+
+        start = time.perf_counter()
+        exact = np.percentile(values, [q * 100 for q in QUANTILES])
+        exact_ms = (time.perf_counter() - start) * 1000
+        label = 'np'
+
+        if args.postgres:
+            with contextlib.redirect_stdout(io.StringIO()):
+                store = postgres_store(args.pg_dbname, data)
+            try:
+                start = time.perf_counter()
+                store.cursor.execute(EXACT_QUERY)
+                exact = np.array(store.cursor.fetchone()[0])
+                exact_ms = (time.perf_counter() - start) * 1000
+                label = 'pg'
+                store.save(rows)
+                start = time.perf_counter()
+                digest = store.query('lead_time', date.min, date.max)
+            finally:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    store.disconnect()
+        else:
+            start = time.perf_counter()
+            digest = TDigest.merge_all((TDigest.from_bytes(blob) for blob in blobs), args.compression)
+        estimates = digest.quantile(QUANTILES)
+        merge_ms = (time.perf_counter() - start) * 1000
+
+        for i, q in enumerate(QUANTILES):
+            prefix = (f"{size:>11} {values.size:>8} {len(blobs):>8} {sum(map(len, blobs)):>9}"
+                      if i == 0 else " " * 39)
+            timings = f"{exact_ms:>8.2f} {label} {merge_ms:>11.2f}" if i == 0 else ""
+            print(f"{prefix} {'p' + format(q * 100, 'g'):>8} {exact[i]:>9.3f} {estimates[i]:>9.3f} "
+                  f"{rank_error(values, estimates[i], q):>9.4f} {timings}")
+    print("=" * 96)
+    print("rank err = |rank(sketch estimate) / n - q| ; exact (ms): np = numpy, pg = PERCENTILE_CONT")
+
+
+if __name__ == "__main__":
+    main()
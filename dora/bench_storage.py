@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends de stockage : SQLite embarqué vs PostgreSQL
+
+Charge le même jeu de données synthétique dans chaque backend puis exporte
+toutes les métriques, et compare les temps de chargement et de requête.
+
+PostgreSQL est mesuré sur une base dédiée (--pg-dbname, dora_bench par défaut)
+dont les tables sont vidées avant le chargement ; les autres paramètres de
+connexion viennent de DB_HOST, DB_PORT, DB_USER et DB_PASSWORD.
+
+Usage:
+    python bench_storage.py [--deployments 10000] [--commits-per-deployment 5] [--incidents 1000]
+"""
+
+import os
+import io
+import time
+import argparse
+import tempfile
+import contextlib
+import config
+from synthetic_data import generate_dataset
+
+ENVIRONMENTS = ['production', 'staging']
+
+
+def run_backend(loader, exporter, data) -> dict:
+    """Mesure le chargement puis l'export complet sur un backend"""
+    timings = {}
+    output_dir = tempfile.mkdtemp(prefix='dora_bench_')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.connect()
+        try:
+            loader.init_schema()
+            start = time.perf_counter()
+            loader.load_all_data(data)
+            timings['load'] = time.perf_counter() - start
+
+            # Second chargement identique : coût d'un run sans changement
+            start = time.perf_counter()
+            loader.load_all_data(data)
+            timings['reload'] = time.perf_counter() - start
+        finally:
+            loader.disconnect()
+
+        exporter.connect()
+        try:
+            start = time.perf_counter()
+            exporter.export_all_metrics(output_dir, environments=ENVIRONMENTS)
+            timings['export'] = time.perf_counter() - start
+        finally:
+            exporter.disconnect()
+
+    return timings
+
+
+def sqlite_backend():
+    """Crée un loader et un exporteur SQLite sur un fichier temporaire"""
+    from sqlite_backend import SQLiteLoader, SQLiteMetricsExporter
+
+    path = os.path.join(tempfile.mkdtemp(prefix='dora_bench_'), 'dora.db')
+    return SQLiteLoader(path), SQLiteMetricsExporter(path)
+
+
+def postgres_backend(dbname: str):
+    """Crée un loader et un exporteur PostgreSQL sur une base de benchmark vidée"""
+    from db_loader import DatabaseLoader
+    from export_metrics import MetricsExporter
+
+    params = config.db_params(dbname)
+
+    loader = DatabaseLoader(*params)
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.connect()
+        loader.init_schema()
+        loader.cursor.execute("TRUNCATE deployment_commits, incidents, deployments, changes, load_rejects")
+        loader.conn.commit()
+        loader.disconnect()
+
+    return DatabaseLoader(*params), MetricsExporter(*params)
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Compare SQLite and PostgreSQL storage backends")
+    parser.add_argument('--deployments', type=int, default=10000)
+    parser.add_argument('--commits-per-deployment', type=int, default=5)
+    parser.add_argument('--incidents', type=int, default=1000)
+    parser.add_argument('--pg-dbname', default='dora_bench')
+    parser.add_argument('--skip-postgres', action='store_true')
+    args = parser.parse_args()
+
+    data = generate_dataset(args.deployments, args.commits_per_deployment, args.incidents)
+    print(f"Synthetic dataset: {len(data['deployments'])} deployments, {len(data['commits'])} commits, "
+          f"{len(data['incidents'])} incidents")
+
+    backends = [('sqlite', sqlite_backend)]
+    if not args.skip_postgres:
+        backends.append(('postgresql', lambda: postgres_backend(args.pg_dbname)))
+
+    print("=" * 70)
+    print(f"{'backend':<12} {'load (s)':>10} {'reload (s)':>12} {'export (s)':>12}")
+    print("=" * 70)
+    for name, create in backends:
+        try:
+            loader, exporter = create()
+            timings = run_backend(loader, exporter, data)
+        except Exception as e:
+            print(f"{name:<12} unavailable: {e}")
+            continue
+        print(f"{name:<12} {timings['load']:>10.3f} {timings['reload']:>12.3f} {timings['export']:>12.3f}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Points de reprise du pipeline DORA
+
+Chaque étape (extraction par ressource, chargement par table, export par
+fichier) est enregistrée dans un répertoire de spool local. Un run qui échoue
+reprend au dernier point de reprise, et une étape dont les entrées et la cible
+(base, fichiers exportés) n'ont pas changé depuis le dernier run terminé est sautée.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import List, Optional, Type, Dict, Any
+
+STATE_FILE = 'state.json'
+
+
+class PipelineCheckpoint:
+    def __init__(self, spool_dir: str = ".dora_spool"):
+        """
+        Initialise le répertoire de spool et charge l'état du dernier run
+
+        Args:
+            spool_dir: Répertoire contenant l'état et les données extraites
+        """
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self.state = self._read_state()
+
+    def _read_state(self) -> Dict[str, Any]:
+        """Lit l'état persisté (run en cours + empreintes des runs terminés)"""
+        path = os.path.join(self.spool_dir, STATE_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        return {'run': {}, 'completed': {}}
+
+    def _write_state(self):
+        """Écrit l'état de façon atomique"""
+        path = os.path.join(self.spool_dir, STATE_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def is_resuming(self) -> bool:
+        """Indique si un run précédent s'est interrompu avant la fin"""
+        return bool(self.state['run'])
+
+    def is_done(self, step: str) -> bool:
+        """Indique si l'étape a déjà été terminée dans le run en cours"""
+        return step in self.state['run']
+
+    def mark_done(self, step: str, fingerprint: Optional[str] = None):
+        """Marque une étape comme terminée, avec l'empreinte de ses entrées"""
+        self.state['run'][step] = {
+            'fingerprint': fingerprint,
+            'completed_at': datetime.now().isoformat()
+        }
+        self._write_state()
+
+    def is_unchanged(self, step: str, fingerprint: str) -> bool:
+        """Indique si l'étape a été terminée au dernier run avec les mêmes entrées"""
+        return self.state['completed'].get(step) == fingerprint
+
+    def step_fingerprint(self, step: str) -> Optional[str]:
+        """Empreinte enregistrée pour une étape terminée dans le run en cours"""
+        return self.state['run'].get(step, {}).get('fingerprint')
+
+    def _records_path(self, name: str) -> str:
+        return os.path.join(self.spool_dir, f"{name}.jsonl")
+
+    def has_records(self, name: str) -> bool:
+        """Indique si les enregistrements d'une ressource ont été spoolés dans ce run"""
+        return self.is_done(f"extract:{name}") and os.path.exists(self._records_path(name))
+
+    def save_records(self, name: str, records: list) -> str:
+        """
+        Spoole les enregistrements extraits d'une ressource
+
+        Args:
+            name: Nom de la ressource (deployments, commits, ...)
+            records: Enregistrements (NamedTuple de records.py)
+
+        Returns:
+            Empreinte SHA-256 du contenu spoolé
+        """
+        path = self._records_path(name)
+        digest = hashlib.sha256()
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for record in records:
+                line = json.dumps(list(record), default=_encode_value) + '\n'
+                digest.update(line.encode('utf-8'))
+                f.write(line)
+        os.replace(path + '.tmp', path)
+
+        fingerprint = digest.hexdigest()
+        self.mark_done(f"extract:{name}", fingerprint)
+        return fingerprint
+
+    def load_records(self, name: str, record_type: Type) -> list:
+        """Relit les enregistrements spoolés d'une ressource"""
+        datetime_fields = {
+            index for index, annotation in enumerate(record_type.__annotations__.values())
+            if annotation in (datetime, Optional[datetime])
+        }
+
+        records = []
+        with open(self._records_path(name), encoding='utf-8') as f:
+            for line in f:
+                values = json.loads(line)
+                for index in datetime_fields:
+                    if values[index] is not None:
+                        values[index] = datetime.fromisoformat(values[index])
+                records.append(record_type(*values))
+        return records
+
+    def data_fingerprint(self, names: List[str]) -> str:
+        """Empreinte combinée des ressources spoolées (entrées de l'étape de chargement)"""
+        digest = hashlib.sha256()
+        for name in names:
+            step = self.state['run'].get(f"extract:{name}", {})
+            digest.update(f"{name}:{step.get('fingerprint')}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def finish_run(self):
+        """Clôture le run : conserve les empreintes et supprime les données spoolées"""
+        for step, info in self.state['run'].items():
+            self.state['completed'][step] = info['fingerprint']
+            if step.startswith('extract:'):
+                path = self._records_path(step.split(':', 1)[1])
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.state['run'] = {}
+        self._write_state()
+
+
+def combine_fingerprints(*parts: Any) -> str:
+    """Empreinte SHA-256 d'une suite de valeurs (empreintes, réglages, état de la cible)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def directory_fingerprint(path: str) -> str:
+    """
+    Empreinte de l'état d'un répertoire (chemins, tailles et dates de modification)
+
+    Un fichier supprimé, ajouté ou réécrit change l'empreinte ; un répertoire
+    absent a une empreinte propre.
+    """
+    entries = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            entries.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns))
+    return combine_fingerprints(sorted(entries))
+
+
+def _encode_value(value):
+    """Sérialise les valeurs non JSON (dates)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+CLI unifiée du pipeline DORA
+
+Toutes les étapes sont des sous-commandes d'une seule commande. Chaque
+sous-commande n'importe son backend (PyGithub, psycopg2, NumPy, ...) qu'au
+moment où elle s'exécute : status et l'aide démarrent sans payer l'import des
+dépendances lourdes (budget vérifié par bench startup).
+
+Les étapes extract et load communiquent par le spool du pipeline
+(DORA_SPOOL_DIR) : extract y écrit les données GitHub, load les charge dans le
+backend configuré (DORA_STORAGE) puis vide le spool.
+
+Usage:
+    python cli.py init                    # crée ou met à jour le schéma de la base
+    python cli.py extract                 # GitHub -> spool
+    python cli.py load                    # spool -> base
+    python cli.py link                    # liens déploiements / commits
+    python cli.py export [--incremental] [--compact]
+    python cli.py pipeline                # extract + load + export (run_dora_pipeline.py)
+    python cli.py serve [--port 8080]     # récepteur de webhooks
+    python cli.py status [--db]
+    python cli.py bench startup [--budget-ms 100]
+    python cli.py bench storage|sketches|query-plans|records [options]
+    python cli.py metrics|sketches|retention|queue|schedule|replay [options]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+from typing import List, Optional
+import config
+
+PROG = 'dora'
+
+# Sous-commandes déléguées au main() d'un module : module, arguments insérés, aide
+DELEGATED = {
+    'pipeline': ('run_dora_pipeline', [], "Run extract, load and export with checkpoints"),
+    'serve': ('webhook_server', ['serve'], "Receive GitHub webhooks over HTTP"),
+    'replay': ('webhook_server', ['replay'], "Load recorded webhook deliveries"),
+    'metrics': ('metrics', [], "Compute metrics in-process (NumPy)"),
+    'sketches': ('sketches', [], "Build and query t-digest sketches"),
+    'retention': ('retention', [], "Fold old raw rows into daily rollups and prune them"),
+    'queue': ('job_queue', [], "Distributed extraction job queue (enqueue, worker, progress)"),
+    'schedule': ('scheduler', [], "Adaptive polling scheduler for several repositories"),
+}
+
+BENCHMARKS = {
+    'storage': 'bench_storage',
+    'sketches': 'bench_sketches',
+    'query-plans': 'bench_query_plans',
+    'records': 'bench_records',
+}
+
+# Commandes dont le démarrage est mesuré, avec les modules lourds qu'elles peuvent importer
+# (status lit le fichier .env : l'import de python-dotenv compte dans son budget)
+LIGHT_COMMANDS = [(['--help'], ()), (['status'], ('dotenv',)), (['export', '--help'], ()), (['bench', '--help'], ())]
+HEAVY_MODULES = ('github', 'psycopg2', 'numpy', 'pyarrow', 'dotenv')
+STARTUP_BUDGET_MS = 100
+STARTUP_REPEAT = 7
+
+# Script exécuté dans un interpréteur neuf : lance la commande et liste les modules lourds importés
+_IMPORT_PROBE = """
+import sys, io, json, contextlib
+sys.path.insert(0, {directory!r})
+import cli
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        cli.main(sys.argv[1:])
+    except SystemExit:
+        pass
+print(json.dumps([name for name in {modules!r} if name in sys.modules]))
+"""
+
+
+def _record_types():
+    from records import DeploymentRecord, CommitRecord, DeploymentCommitRecord, HistoryWalkRecord, IncidentRecord
+
+    return {
+        'deployments': DeploymentRecord,
+        'commits': CommitRecord,
+        'deployment_commits': DeploymentCommitRecord,
+        'history_walks': HistoryWalkRecord,
+        'incidents': IncidentRecord
+    }
+
+
+def run_module(prog: str, module_name: str, argv: List[str]) -> int:
+    """
+    Exécute le main() d'un module avec les arguments donnés
+
+    Args:
+        prog: Nom de la commande affiché dans l'aide du module
+        module_name: Module à importer
+        argv: Arguments passés au module
+
+    Returns:
+        Code de sortie
+    """
+    module = importlib.import_module(module_name)
+    sys.argv = [prog] + argv
+    return module.main() or 0
+
+
+def cmd_init(args) -> int:
+    """Crée ou met à jour le schéma de la base configurée (à relancer après chaque mise à jour)"""
+    loader, _, database = config.create_backend()
+    try:
+        loader.connect()
+        loader.init_schema()
+    finally:
+        loader.disconnect()
+    print(f"Schema of {database} is up to date")
+    return 0
+
+
+def cmd_extract(args) -> int:
+    """Extrait les données GitHub dans le spool (reprend un spool non chargé)"""
+    from checkpoint import PipelineCheckpoint
+    import run_dora_pipeline
+
+    if not all(config.github_settings()):
+        print("Please set GITHUB_TOKEN, GITHUB_OWNER and GITHUB_REPO in .env file")
+        return 1
+
+    loader, _, _ = config.create_backend()
+    checkpoint = PipelineCheckpoint(config.spool_dir())
+    data = run_dora_pipeline.extract_step(loader, checkpoint, config.environments())
+
+    print(f"\nExtracted {config.repository()} into {checkpoint.spool_dir}/:")
+    for name, records in data.items():
+        print(f"  - {name}: {len(records)}")
+    print(f"Run '{PROG} load' to load them.")
+    return 0
+
+
+def cmd_load(args) -> int:
+    """Charge le spool dans la base configurée puis le vide"""
+    from checkpoint import PipelineCheckpoint
+    import run_dora_pipeline
+
+    checkpoint = PipelineCheckpoint(config.spool_dir())
+    missing = [name for name in run_dora_pipeline.RESOURCES if not checkpoint.has_records(name)]
+    if missing:
+        print(f"No extracted {', '.join(missing)} in {checkpoint.spool_dir}/, run '{PROG} extract' first")
+        return 1
+
+    record_types = _record_types()
+    data = {name: checkpoint.load_records(name, record_types[name]) for name in run_dora_pipeline.RESOURCES}
+    loader, _, database = config.create_backend()
+    print(f"Loading into {database}")
+    run_dora_pipeline.load_step(loader, data, checkpoint)
+    checkpoint.finish_run()
+    return 0
+
+
+def cmd_link(args) -> int:
+    """Recrée les liens déploiements / commits (SHA déployé et historique spoolé)"""
+    from checkpoint import PipelineCheckpoint
+
+    checkpoint = PipelineCheckpoint(config.spool_dir())
+    loader, _, _ = config.create_backend()
+    try:
+        loader.connect()
+        linked = loader.link_deployment_commits()
+        if checkpoint.has_records('deployment_commits'):
+            links = checkpoint.load_records('deployment_commits', _record_types()['deployment_commits'])
+            linked += loader.load_deployment_commit_links(links)
+    finally:
+        loader.disconnect()
+    print(f"Linked {linked} deployment-commit pairs")
+    return 1 if loader.last_error is not None else 0
+
+
+def cmd_export(args) -> int:
+    """Exporte les métriques en CSV depuis la base configurée"""
+    if args.compact and config.use_sqlite():
+        print("Incremental exports are only available with PostgreSQL")
+        return 1
+
+    _, exporter, _ = config.create_backend()
+    environments = args.environment or config.environments()
+    try:
+        exporter.connect()
+        if args.compact:
+            for environment in environments:
+                exporter.export_lead_time_incremental(args.output_dir, environment, compact=True)
+            exporter.export_mttr_incremental(args.output_dir, compact=True)
+            return 0
+        incremental = args.incremental or config.flag('DORA_INCREMENTAL_EXPORTS')
+        ok = exporter.export_all_metrics(args.output_dir, environments=environments, incremental=incremental)
+        return 0 if ok else 1
+    finally:
+        exporter.disconnect()
+
+
+def _age(timestamp: float) -> str:
+    minutes = (time.time() - timestamp) / 60
+    if minutes < 60:
+        return f"{minutes:.0f} min ago"
+    if minutes < 48 * 60:
+        return f"{minutes / 60:.1f} h ago"
+    return f"{minutes / 1440:.1f} days ago"
+
+
+def cmd_status(args) -> int:
+    """Affiche la configuration, l'état du spool et des exports (et de la base avec --db)"""
+    from checkpoint import STATE_FILE
+
+    print("=" * 70)
+    print("DORA status")
+    print("=" * 70)
+    print(f"Repository:    {config.repository()}")
+    print(f"Storage:       {config.database_description()}")
+    print(f"Environments:  {', '.join(config.environments())}")
+
+    spool = config.spool_dir()
+    state_path = os.path.join(spool, STATE_FILE)
+    if os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        steps = sorted(state.get('run', {}))
+        print(f"Spool:         {spool}/ " + (f"(run in progress: {', '.join(steps)})" if steps else "(idle)"))
+    else:
+        print(f"Spool:         {spool}/ (no run yet)")
+
+    if os.path.isdir(args.output_dir):
+        files = [os.path.join(args.output_dir, name) for name in os.listdir(args.output_dir) if name.endswith('.csv')]
+        if files:
+            latest = max(files, key=os.path.getmtime)
+            print(f"Exports:       {len(files)} CSV files in {args.output_dir}/, "
+                  f"latest {os.path.basename(latest)} ({_age(os.path.getmtime(latest))})")
+        else:
+            print(f"Exports:       no CSV files in {args.output_dir}/")
+    else:
+        print(f"Exports:       {args.output_dir}/ does not exist")
+
+    if args.db:
+        # Lignes du repository configuré (les tables sont partagées entre repositories)
+        loader, _, _ = config.create_backend()
+        try:
+            loader.connect()
+            for table, (rows, _) in loader.table_state().items():
+                print(f"  - {table}: {rows} rows")
+        finally:
+            loader.disconnect()
+    print("=" * 70)
+    return 0
+
+
+def measure_startup(argv: List[str], repeat: int) -> float:
+    """Durée médiane (ms) d'un lancement de la commande dans un interpréteur neuf"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append((time.perf_counter() - start) * 1000)
+    return sorted(durations)[len(durations) // 2]
+
+
+def heavy_imports(command: List[str]) -> List[str]:
+    """Modules lourds importés par une commande (lancée dans un interpréteur neuf)"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    probe = _IMPORT_PROBE.format(directory=directory, modules=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', probe] + command, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def cmd_bench_startup(args) -> int:
+    """
+    Mesure le démarrage des commandes légères et vérifie le budget
+
+    Le coût propre de la CLI est la durée médiane de la commande moins celle
+    d'un interpréteur vide ; il doit rester sous le budget, sans import lourd
+    autre que ceux permis à la commande.
+    """
+    script = os.path.abspath(__file__)
+    interpreter_ms = measure_startup([sys.executable, '-c', 'pass'], args.repeat)
+
+    print("=" * 78)
+    print(f"Startup budget: {args.budget_ms:.0f} ms over a bare interpreter ({interpreter_ms:.1f} ms)")
+    print("=" * 78)
+    print(f"{'command':<22} {'total (ms)':>11} {'cli (ms)':>9}  {'heavy imports':<20} result")
+    print("-" * 78)
+
+    failed = []
+    for command, allowed in LIGHT_COMMANDS:
+        total_ms = measure_startup([sys.executable, script] + command, args.repeat)
+        overhead_ms = total_ms - interpreter_ms
+        heavy = [name for name in heavy_imports(command) if name not in allowed]
+        ok = overhead_ms <= args.budget_ms and not heavy
+        if not ok:
+            failed.append(' '.join(command))
+        print(f"{' '.join(command):<22} {total_ms:>11.1f} {overhead_ms:>9.1f}  "
+              f"{', '.join(heavy) or '-':<20} {'ok' if ok else 'OVER BUDGET'}")
+    print("=" * 78)
+
+    if failed:
+        print(f"{len(failed)} commands over budget: {', '.join(failed)}")
+        return 1
+    print("All lightweight commands within budget")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construit le parser (sans importer aucun backend)"""
+    parser = argparse.ArgumentParser(prog=PROG, description="DORA metrics pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    init = subparsers.add_parser('init', help="Create or migrate the database schema")
+    init.set_defaults(handler=cmd_init)
+    extract = subparsers.add_parser('extract', help="Extract GitHub data into the spool")
+    extract.set_defaults(handler=cmd_extract)
+    load = subparsers.add_parser('load', help="Load the spooled data into the database")
+    load.set_defaults(handler=cmd_load)
+    link = subparsers.add_parser('link', help="Link deployments to their commits")
+    link.set_defaults(handler=cmd_link)
+
+    export = subparsers.add_parser('export', help="Export DORA metrics to CSV")
+    export.add_argument('--output-dir', help="Output directory (default: DORA_OUTPUT_DIR or exports)")
+    export.add_argument('--environment', action='append', help="Environment, repeatable; default: DORA_ENVIRONMENTS")
+    export.add_argument('--incremental', action='store_true',
+                        help="Write lead time and MTTR details as delta files (default: DORA_INCREMENTAL_EXPORTS)")
+    export.add_argument('--compact', action='store_true', help="Compact incremental exports now")
+    export.set_defaults(handler=cmd_export)
+
+    status = subparsers.add_parser('status', help="Show configuration, spool and export status")
+    status.add_argument('--output-dir', help="Output directory (default: DORA_OUTPUT_DIR or exports)")
+    status.add_argument('--db', action='store_true', help="Also count rows in the database")
+    status.set_defaults(handler=cmd_status)
+
+    bench = subparsers.add_parser('bench', help="Run benchmarks")
+    benchmarks = bench.add_subparsers(dest='benchmark', required=True, metavar='benchmark')
+    startup = benchmarks.add_parser('startup', help="Check the startup time of lightweight commands")
+    startup.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    startup.add_argument('--repeat', type=int, default=STARTUP_REPEAT)
+    startup.set_defaults(handler=cmd_bench_startup)
+    for name, module_name in BENCHMARKS.items():
+        benchmarks.add_parser(name, add_help=False, help=f"{module_name}.py").set_defaults(module=module_name)
+
+    for name, (module_name, _, description) in DELEGATED.items():
+        subparsers.add_parser(name, add_help=False, help=description).set_defaults(module=module_name)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Fonction principale"""
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    config.load_env()
+    if getattr(args, 'output_dir', True) is None:
+        args.output_dir = config.output_dir()
+
+    if args.command == 'bench' and args.benchmark in BENCHMARKS:
+        return run_module(f"{PROG} bench {args.benchmark}", args.module, extra)
+    if args.command in DELEGATED:
+        module_name, prefix, _ = DELEGATED[args.command]
+        # Sous-commande du module (ex: serve) : elle apparaît déjà dans son aide
+        return run_module(PROG if prefix else f"{PROG} {args.command}", module_name, prefix + extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
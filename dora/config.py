@@ -0,0 +1,123 @@
+"""
+Configuration partagée des scripts DORA (variables d'environnement et fichier .env)
+
+Ce module n'importe que la bibliothèque standard : python-dotenv et les
+backends de stockage (psycopg2, sqlite3) ne sont importés qu'au moment où
+ils servent, pour que les commandes légères de la CLI démarrent vite.
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+DEFAULT_SPOOL_DIR = '.dora_spool'
+DEFAULT_SQLITE_PATH = 'dora_metrics.db'
+DEFAULT_OUTPUT_DIR = 'exports'
+
+
+def load_env():
+    """Charge le fichier .env dans les variables d'environnement"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def db_params(dbname: Optional[str] = None) -> Tuple[str, int, str, str, str]:
+    """
+    Paramètres de connexion PostgreSQL (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD)
+
+    Args:
+        dbname: Base à utiliser à la place de DB_NAME (ex: base de benchmark)
+
+    Returns:
+        Tuple (host, port, dbname, user, password)
+    """
+    return (
+        os.getenv('DB_HOST', 'localhost'),
+        int(os.getenv('DB_PORT', 5432)),
+        dbname or os.getenv('DB_NAME', 'dora_metrics'),
+        os.getenv('DB_USER', 'dora_user'),
+        os.getenv('DB_PASSWORD', 'dora_password')
+    )
+
+
+def github_settings() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Token, owner et repository GitHub (GITHUB_TOKEN, GITHUB_OWNER, GITHUB_REPO)"""
+    return os.getenv('GITHUB_TOKEN'), os.getenv('GITHUB_OWNER'), os.getenv('GITHUB_REPO')
+
+
+def repository() -> str:
+    """Repository configuré au format owner/name (vide si GITHUB_OWNER ou GITHUB_REPO manque)"""
+    owner, name = os.getenv('GITHUB_OWNER', ''), os.getenv('GITHUB_REPO', '')
+    return f"{owner}/{name}" if owner and name else ''
+
+
+def output_dir() -> str:
+    """Répertoire des CSV exportés (DORA_OUTPUT_DIR)"""
+    return os.getenv('DORA_OUTPUT_DIR', DEFAULT_OUTPUT_DIR)
+
+
+def env_list(name: str) -> List[str]:
+    """Lit une liste séparée par des virgules (espaces et éléments vides ignorés)"""
+    return [item.strip() for item in os.getenv(name, '').split(',') if item.strip()]
+
+
+def environments() -> List[str]:
+    """Environnements extraits et exportés (DORA_ENVIRONMENTS, production par défaut)"""
+    return env_list('DORA_ENVIRONMENTS') or ['production']
+
+
+def flag(name: str) -> bool:
+    """Lit une variable booléenne (1, true, yes)"""
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+
+def spool_dir() -> str:
+    """Répertoire de spool du pipeline (DORA_SPOOL_DIR)"""
+    return os.getenv('DORA_SPOOL_DIR', DEFAULT_SPOOL_DIR)
+
+
+def use_sqlite() -> bool:
+    """Indique si le backend SQLite embarqué est configuré (DORA_STORAGE=sqlite)"""
+    return os.getenv('DORA_STORAGE', 'postgresql') == 'sqlite'
+
+
+def sqlite_path() -> str:
+    """Fichier de la base SQLite embarquée (DORA_SQLITE_PATH)"""
+    return os.getenv('DORA_SQLITE_PATH', DEFAULT_SQLITE_PATH)
+
+
+def database_description() -> str:
+    """Description lisible de la base configurée"""
+    if use_sqlite():
+        return f"SQLite ({sqlite_path()})"
+    return f"PostgreSQL ({db_params()[2]})"
+
+
+def database_identity() -> str:
+    """Identité de la base configurée (serveur et base, ou chemin absolu du fichier SQLite)"""
+    if use_sqlite():
+        return f"sqlite:{os.path.abspath(sqlite_path())}"
+    host, port, dbname, _, _ = db_params()
+    return f"postgresql://{host}:{port}/{dbname}"
+
+
+def create_backend():
+    """
+    Crée le loader et l'exporteur du backend de stockage configuré (DORA_STORAGE),
+    limités au repository configuré
+
+    Returns:
+        Tuple (loader, exporteur, description de la base)
+    """
+    repo = repository()
+    if use_sqlite():
+        from sqlite_backend import SQLiteLoader, SQLiteMetricsExporter
+
+        path = sqlite_path()
+        return SQLiteLoader(path, repo=repo), SQLiteMetricsExporter(path, repo=repo), database_description()
+
+    from db_loader import DatabaseLoader
+    from export_metrics import MetricsExporter
+
+    params = db_params()
+    return DatabaseLoader(*params, repo=repo), MetricsExporter(*params, repo=repo), database_description()
@@ -5,12 +5,24 @@ Script pour charger les données extraites de GitHub dans PostgreSQL
 import os
 import psycopg2
 from psycopg2.extras import execute_values
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Optional
+from records import DeploymentRecord, LoadResult, RetentionHorizon, utc_day
+from storage import BaseLoader, PostgreSQLDialect, REPO_TABLES
 
+# Nombre de lignes par instruction INSERT (un savepoint par lot)
+CHUNK_SIZE = 1000
 
-class DatabaseLoader:
-    def __init__(self, host: str, port: int, dbname: str, user: str, password: str):
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'schema.sql')
+
+
+class DatabaseLoader(BaseLoader):
+    dialect = PostgreSQLDialect()
+    db_error = psycopg2.Error
+    # Les agrégats de la rétention sont aussi rangés par repository
+    repo_tables = REPO_TABLES + ('daily_rollups',)
+
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str,
+                 chunk_size: int = CHUNK_SIZE, repo: str = ''):
         """
         Initialise la connexion à la base de données PostgreSQL
 
@@ -20,6 +32,8 @@ class DatabaseLoader:
             dbname: Nom de la base de données
             user: Nom d'utilisateur
             password: Mot de passe
+            chunk_size: Nombre de lignes par lot chargé
+            repo: Repository des lignes chargées (owner/name)
         """
         self.conn_params = {
             'host': host,
@@ -28,8 +42,7 @@ class DatabaseLoader:
             'user': user,
             'password': password
         }
-        self.conn = None
-        self.cursor = None
+        super().__init__(chunk_size, repo)
 
     def connect(self):
         """Établit la connexion à la base de données"""
@@ -50,227 +63,116 @@ class DatabaseLoader:
             self.conn.close()
             print("Database connection closed.")
 
-    def load_deployments(self, deployments: List[Dict[str, Any]]) -> int:
+    def init_schema(self):
         """
-        Charge les déploiements dans la base de données
+        Crée ou met à jour le schéma en appliquant sql/schema.sql (idempotent)
 
-        Args:
-            deployments: Liste des déploiements à charger
-
-        Returns:
-            Nombre de déploiements insérés
+        Étape explicite (dora init, make migrate) : le script recrée les vues et
+        ajoute les colonnes et index manquants, ce qui demande les droits du
+        propriétaire des tables et des verrous exclusifs. Les chargements
+        (pipeline, webhooks, workers) ne l'appliquent jamais.
         """
-        if not deployments:
-            print("No deployments to load.")
-            return 0
-
-        print(f"Loading {len(deployments)} deployments...")
-
-        insert_query = """
-            INSERT INTO deployments (deployment_id, sha, environment, status, created_at, updated_at, description)
-            VALUES %s
-            ON CONFLICT (deployment_id) DO UPDATE SET
-                status = EXCLUDED.status,
-                updated_at = EXCLUDED.updated_at
-        """
-
-        values = [
-            (
-                d['deployment_id'],
-                d['sha'],
-                d['environment'],
-                d['status'],
-                d['created_at'],
-                d['updated_at'],
-                d['description']
-            )
-            for d in deployments
-        ]
-
-        try:
-            execute_values(self.cursor, insert_query, values)
-            self.conn.commit()
-            print(f"Successfully loaded {len(deployments)} deployments")
-            return len(deployments)
-        except psycopg2.Error as e:
-            self.conn.rollback()
-            print(f"Error loading deployments: {e}")
-            return 0
+        print(f"Applying {os.path.basename(SCHEMA_FILE)}...")
+        with open(SCHEMA_FILE, encoding='utf-8') as f:
+            self.cursor.execute(f.read())
+        self.assign_legacy_rows()
+        self.conn.commit()
 
-    def load_commits(self, commits: List[Dict[str, Any]]) -> int:
+    def _upsert(self, table: str, key_column: str, query: str, rows: List[tuple]) -> LoadResult:
         """
-        Charge les commits dans la base de données
+        Exécute un upsert dont le DO UPDATE ne réécrit que les lignes modifiées
+
+        La requête se termine par RETURNING (xmax = 0) : seules les lignes
+        insérées (xmax = 0) ou modifiées sont retournées, les lignes identiques
+        ne génèrent ni écriture ni tuple mort.
 
         Args:
-            commits: Liste des commits à charger
+            table: Table chargée
+            key_column: Colonne de la clé de conflit
+            query: Requête INSERT ... ON CONFLICT ... WHERE ... IS DISTINCT FROM ... RETURNING
+            rows: Enregistrements à charger
 
         Returns:
-            Nombre de commits insérés
-        """
-        if not commits:
-            print("No commits to load.")
-            return 0
-
-        print(f"Loading {len(commits)} commits...")
-
-        insert_query = """
-            INSERT INTO changes (sha, committed_date, author, message)
-            VALUES %s
-            ON CONFLICT (sha) DO UPDATE SET
-                committed_date = EXCLUDED.committed_date,
-                author = EXCLUDED.author,
-                message = EXCLUDED.message
-        """
-
-        values = [
-            (
-                c['sha'],
-                c['committed_date'],
-                c['author'],
-                c['message']
+            Nombre de lignes insérées, modifiées et inchangées
+        """
+        returned = execute_values(self.cursor, query, rows, page_size=len(rows), fetch=True)
+        inserted = sum(1 for (is_insert,) in returned if is_insert)
+        return LoadResult(
+            inserted=inserted,
+            updated=len(returned) - inserted,
+            unchanged=len(rows) - len(returned)
+        )
+
+    def _execute_batch(self, query: str, rows: List[tuple]) -> int:
+        """Exécute une requête VALUES %s sur un lot de lignes (une seule instruction)"""
+        execute_values(self.cursor, query, rows, page_size=len(rows))
+        return self.cursor.rowcount
+
+    def retention_horizon(self) -> RetentionHorizon:
+        """
+        Horizon de la rétention du repository (retention_horizons) : les lignes
+        antérieures ont été repliées en agrégats journaliers puis purgées
+        """
+        self.cursor.execute(
+            "SELECT deployments_before, incidents_before FROM retention_horizons WHERE repo = %s",
+            (self.repo,)
+        )
+        row = self.cursor.fetchone()
+        return RetentionHorizon(*row) if row else RetentionHorizon()
+
+    def _retained(self, table: str, records: list) -> list:
+        """
+        Écarte les déploiements antérieurs à l'horizon de la rétention et les
+        incidents des jours repliés (les jours ayant encore un incident ouvert ne
+        le sont pas : leurs incidents restent chargés)
+        """
+        if table == 'deployments':
+            before = self.retention_horizon().deployments_before
+            if before is None:
+                return records
+            return [r for r in records if r.created_at is None or utc_day(r.created_at) >= before]
+
+        if table == 'incidents':
+            # Incidents repliés sous l'environnement 'all' (voir retention.py)
+            self.cursor.execute(
+                "SELECT day FROM daily_rollups WHERE repo = %s AND environment = 'all'", (self.repo,)
             )
-            for c in commits
-        ]
+            folded = {day for (day,) in self.cursor.fetchall()}
+            return [r for r in records if r.created_at is None or utc_day(r.created_at) not in folded]
 
-        try:
-            execute_values(self.cursor, insert_query, values)
-            self.conn.commit()
-            print(f"Successfully loaded {len(commits)} commits")
-            return len(commits)
-        except psycopg2.Error as e:
-            self.conn.rollback()
-            print(f"Error loading commits: {e}")
-            return 0
+        return records
 
-    def load_incidents(self, incidents: List[Dict[str, Any]]) -> int:
+    def get_deployments(self, environments: Optional[List[str]] = None) -> List[DeploymentRecord]:
         """
-        Charge les incidents dans la base de données
+        Relit les déploiements du repository chargés en base (ex: pour parcourir
+        leur historique dans un job séparé de l'extraction des déploiements)
 
         Args:
-            incidents: Liste des incidents à charger
+            environments: Environnements à relire (par défaut: tous)
 
         Returns:
-            Nombre d'incidents insérés
-        """
-        if not incidents:
-            print("No incidents to load.")
-            return 0
-
-        print(f"Loading {len(incidents)} incidents...")
-
-        insert_query = """
-            INSERT INTO incidents (issue_number, title, state, created_at, closed_at, labels, assignees)
-            VALUES %s
-            ON CONFLICT (issue_number) DO UPDATE SET
-                title = EXCLUDED.title,
-                state = EXCLUDED.state,
-                closed_at = EXCLUDED.closed_at,
-                labels = EXCLUDED.labels,
-                assignees = EXCLUDED.assignees
+            Liste des déploiements (DeploymentRecord)
         """
-
-        values = [
-            (
-                i['issue_number'],
-                i['title'],
-                i['state'],
-                i['created_at'],
-                i['closed_at'],
-                i['labels'],
-                i['assignees']
-            )
-            for i in incidents
-        ]
-
-        try:
-            execute_values(self.cursor, insert_query, values)
-            self.conn.commit()
-            print(f"Successfully loaded {len(incidents)} incidents")
-            return len(incidents)
-        except psycopg2.Error as e:
-            self.conn.rollback()
-            print(f"Error loading incidents: {e}")
-            return 0
-
-    def link_deployment_commits(self):
-        """
-        Crée les liens entre déploiements et commits
-        Simplification : 1 commit = 1 déploiement (le commit SHA du déploiement)
-        """
-        print("Linking deployments to commits...")
-
         query = """
-            INSERT INTO deployment_commits (deployment_id, commit_id)
-            SELECT d.id, c.id
-            FROM deployments d
-            JOIN changes c ON d.sha = c.sha
-            WHERE NOT EXISTS (
-                SELECT 1 FROM deployment_commits dc
-                WHERE dc.deployment_id = d.id AND dc.commit_id = c.id
-            )
+            SELECT deployment_id, sha, environment, status, created_at, updated_at, description
+            FROM deployments
+            WHERE repo = %(repo)s
+              AND (%(environments)s IS NULL OR environment = ANY(%(environments)s))
+            ORDER BY created_at
         """
 
-        try:
-            self.cursor.execute(query)
-            self.conn.commit()
-            print(f"Successfully linked {self.cursor.rowcount} deployment-commit pairs")
-            return self.cursor.rowcount
-        except psycopg2.Error as e:
-            self.conn.rollback()
-            print(f"Error linking deployments and commits: {e}")
-            return 0
-
-    def load_all_data(self, data: Dict[str, List[Dict[str, Any]]]):
-        """
-        Charge toutes les données dans la base de données
-
-        Args:
-            data: Dictionnaire contenant deployments, commits et incidents
-        """
-        print("=" * 70)
-        print("Starting database loading...")
-        print("=" * 70)
-
-        # Charge les commits d'abord (car les déploiements y font référence)
-        commits_loaded = self.load_commits(data.get('commits', []))
-
-        # Charge les déploiements
-        deployments_loaded = self.load_deployments(data.get('deployments', []))
-
-        # Crée les liens deployment_commits
-        links_created = self.link_deployment_commits()
-
-        # Charge les incidents
-        incidents_loaded = self.load_incidents(data.get('incidents', []))
-
-        print("=" * 70)
-        print("Loading completed!")
-        print(f"  - Commits loaded: {commits_loaded}")
-        print(f"  - Deployments loaded: {deployments_loaded}")
-        print(f"  - Deployment-Commit links: {links_created}")
-        print(f"  - Incidents loaded: {incidents_loaded}")
-        print("=" * 70)
+        self.cursor.execute(query, {'repo': self.repo, 'environments': environments})
+        return [DeploymentRecord(*row) for row in self.cursor.fetchall()]
 
 
 def main():
     """Fonction principale pour tester le chargement"""
-    from dotenv import load_dotenv
+    import config
     from github_extractor import GitHubDataExtractor
 
     # Charge les variables d'environnement
-    load_dotenv()
-
-    # Configuration GitHub
-    github_token = os.getenv('GITHUB_TOKEN')
-    github_owner = os.getenv('GITHUB_OWNER')
-    github_repo = os.getenv('GITHUB_REPO')
-
-    # Configuration base de données
-    db_host = os.getenv('DB_HOST', 'localhost')
-    db_port = int(os.getenv('DB_PORT', 5432))
-    db_name = os.getenv('DB_NAME', 'dora_metrics')
-    db_user = os.getenv('DB_USER', 'dora_user')
-    db_password = os.getenv('DB_PASSWORD', 'dora_password')
+    config.load_env()
+    github_token, github_owner, github_repo = config.github_settings()
 
     if not all([github_token, github_owner, github_repo]):
         print("Error: Missing required GitHub environment variables")
@@ -281,7 +183,7 @@ def main():
     data = extractor.extract_all_data()
 
     # Charge les données dans PostgreSQL
-    loader = DatabaseLoader(db_host, db_port, db_name, db_user, db_password)
+    loader = DatabaseLoader(*config.db_params(), repo=config.repository())
 
     try:
         loader.connect()
@@ -4,14 +4,109 @@ Script pour exporter les métriques DORA en CSV
 
 import os
 import csv
+import json
+import argparse
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import storage
+from storage import BaseMetricsExporter, PostgreSQLDialect
 
+# Nombre de fichiers delta au-delà duquel un export incrémental est compacté
+COMPACT_AFTER = 24
+# Marge (secondes) retirée du watermark : une ligne datée par un chargement encore en
+# cours n'est visible qu'à son commit, et serait sinon sous le watermark déjà enregistré.
+# Doit dépasser la durée du plus long chargement ; les lignes de la marge sont réexportées.
+WATERMARK_LAG = 900
+MANIFEST_FILE = 'manifest.json'
 
-class MetricsExporter:
-    def __init__(self, host: str, port: int, dbname: str, user: str, password: str):
+# Requêtes des métriques (fenêtre glissante de 28 jours), communes aux backends
+DIALECT = PostgreSQLDialect()
+DEPLOYMENT_FREQUENCY_QUERY = DIALECT.render(storage.DEPLOYMENT_FREQUENCY_QUERY)
+LEAD_TIME_QUERY = DIALECT.render(storage.LEAD_TIME_QUERY)
+CHANGE_FAILURE_RATE_QUERY = DIALECT.render(storage.CHANGE_FAILURE_RATE_QUERY)
+MTTR_QUERY = DIALECT.render(storage.MTTR_QUERY)
+SUMMARY_QUERY = DIALECT.render(storage.SUMMARY_QUERY)
+
+# Détail du lead time, sur tout l'historique (exports incrémentaux) ; changed_at est
+# la date du dernier chargement ayant modifié le déploiement, le lien ou le commit
+LEAD_TIME_DETAIL_QUERY = """
+    SELECT
+        d.deployment_id,
+        d.sha as deployment_sha,
+        d.status as deployment_status,
+        d.created_at as deployed_at,
+        c.sha as commit_sha,
+        c.committed_date,
+        ROUND(EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 3600, 2) as lead_time_hours,
+        ROUND(EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 86400, 2) as lead_time_days,
+        GREATEST(d.loaded_at, dc.created_at, c.loaded_at) as changed_at
+    FROM deployments d
+    JOIN deployment_commits dc ON d.id = dc.deployment_id
+    JOIN changes c ON dc.commit_id = c.id
+    WHERE d.repo = %(repo)s AND d.environment = %(environment)s
+"""
+
+# Borne haute du watermark enregistré (horloge de la base, moins la marge)
+SAFE_WATERMARK_QUERY = """
+    SELECT (clock_timestamp() - %(lag)s * INTERVAL '1 second')::timestamp AS safe_until
+"""
+
+# Déploiements touchés depuis le watermark (chaque branche utilise un index sur la date de chargement)
+LEAD_TIME_CHANGED_FILTER = """
+    AND d.id IN (
+        SELECT id FROM deployments WHERE loaded_at > %(watermark)s
+        UNION
+        SELECT deployment_id FROM deployment_commits WHERE created_at > %(watermark)s
+        UNION
+        SELECT dc2.deployment_id
+        FROM changes c2
+        JOIN deployment_commits dc2 ON dc2.commit_id = c2.id
+        WHERE c2.loaded_at > %(watermark)s
+    )
+    ORDER BY changed_at, d.deployment_id, c.sha
+"""
+
+# État complet écrit à la compaction : seuls les déploiements réussis
+LEAD_TIME_BASE_FILTER = """
+    AND d.status = 'success'
+"""
+
+MTTR_DETAIL_QUERY = """
+    SELECT
+        issue_number,
+        title,
+        state,
+        created_at,
+        closed_at,
+        CASE
+            WHEN closed_at IS NOT NULL THEN
+                ROUND(EXTRACT(EPOCH FROM (closed_at - created_at)) / 3600, 2)
+            ELSE NULL
+        END as recovery_time_hours,
+        CASE
+            WHEN closed_at IS NOT NULL THEN
+                ROUND(EXTRACT(EPOCH FROM (closed_at - created_at)) / 86400, 2)
+            ELSE NULL
+        END as recovery_time_days,
+        loaded_at as changed_at
+    FROM incidents
+    WHERE repo = %(repo)s
+"""
+
+MTTR_CHANGED_FILTER = """
+    AND loaded_at > %(watermark)s
+    ORDER BY loaded_at, issue_number
+"""
+
+
+class MetricsExporter(BaseMetricsExporter):
+    dialect = DIALECT
+    db_error = psycopg2.Error
+    supports_incremental = True
+
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str, repo: str = ''):
         """
         Initialise l'exporteur de métriques
 
@@ -21,6 +116,7 @@ class MetricsExporter:
             dbname: Nom de la base de données
             user: Nom d'utilisateur
             password: Mot de passe
+            repo: Repository dont les métriques sont exportées (owner/name)
         """
         self.conn_params = {
             'host': host,
@@ -29,8 +125,7 @@ class MetricsExporter:
             'user': user,
             'password': password
         }
-        self.conn = None
-        self.cursor = None
+        super().__init__(repo)
 
     def connect(self):
         """Établit la connexion à la base de données"""
@@ -51,231 +146,163 @@ class MetricsExporter:
             self.conn.close()
             print("Database connection closed.")
 
-    def export_to_csv(self, query: str, filename: str, headers: List[str] = None):
+    @staticmethod
+    def _write_rows(filename: str, rows: List[Dict[str, Any]]):
+        """Écrit des lignes en CSV (en-têtes = colonnes de la requête)"""
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=rows[0].keys())
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def export_incremental(self, output_dir: str, name: str, detail_query: str, changed_filter: str,
+                           base_filter: str = "", params: Optional[Dict[str, Any]] = None,
+                           compact: bool = False, compact_after: int = COMPACT_AFTER,
+                           watermark_lag: int = WATERMARK_LAG) -> Optional[str]:
         """
-        Exécute une requête et exporte le résultat en CSV
+        Export incrémental d'un détail : seules les lignes nouvelles ou modifiées
+        depuis le dernier export sont écrites, dans un fichier delta daté
+
+        Le répertoire output_dir/incremental/<name>/ contient un fichier base
+        (état complet à la dernière compaction), les deltas suivants et un
+        manifest.json (watermark, liste des fichiers). Les consommateurs lisent
+        la base puis les deltas dans l'ordre, la dernière version d'une ligne
+        l'emportant. Au-delà de compact_after deltas, la base est réécrite depuis
+        la base de données et les deltas supprimés.
+
+        Le watermark est le plus grand changed_at exporté, plafonné à l'heure de
+        la base moins watermark_lag : les lignes d'un chargement validé après
+        l'export mais datées avant lui sont reprises au delta suivant (les lignes
+        de la marge peuvent donc apparaître dans deux deltas successifs).
 
         Args:
-            query: Requête SQL à exécuter
-            filename: Nom du fichier CSV de sortie
-            headers: En-têtes personnalisés (optionnel)
+            output_dir: Répertoire de sortie
+            name: Nom de l'export (sous-répertoire)
+            detail_query: Requête de détail (avec une colonne changed_at)
+            changed_filter: Filtre des lignes modifiées depuis %(watermark)s
+            base_filter: Filtre de l'état complet écrit à la compaction
+            params: Paramètres de la requête (optionnel)
+            compact: Force la compaction
+            compact_after: Nombre de deltas déclenchant la compaction
+            watermark_lag: Marge en secondes retirée du watermark enregistré
+
+        Returns:
+            Fichier écrit, ou None si rien n'a changé
         """
+        export_dir = os.path.join(output_dir, 'incremental', name)
+        os.makedirs(export_dir, exist_ok=True)
+        manifest_path = os.path.join(export_dir, MANIFEST_FILE)
+
+        manifest = {'watermark': None, 'base': None, 'deltas': [], 'compacted_at': None}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+
+        compact = compact or manifest['base'] is None or len(manifest['deltas']) >= compact_after
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
         try:
-            self.cursor.execute(query)
+            # Plafond lu avant la requête des lignes
+            self.cursor.execute(SAFE_WATERMARK_QUERY, {'lag': watermark_lag})
+            safe_until = self.cursor.fetchone()['safe_until']
+
+            if compact:
+                self.cursor.execute(detail_query + base_filter, params)
+            else:
+                self.cursor.execute(detail_query + changed_filter,
+                                    dict(params or {}, watermark=manifest['watermark']))
             rows = self.cursor.fetchall()
 
-            if not rows:
-                print(f"No data to export for {filename}")
-                return
+            if not compact and not rows:
+                print(f"No new rows for {name} since {manifest['watermark']}")
+                return None
+
+            filename = f"{'base' if compact else 'delta'}_{stamp}.csv"
+            if rows:
+                self._write_rows(os.path.join(export_dir, filename), rows)
+                watermark = min(max(row['changed_at'] for row in rows), safe_until).isoformat()
+                manifest['watermark'] = max(filter(None, [manifest['watermark'], watermark]))
+            else:
+                # Base vide : tout ce qui précède le plafond est couvert
+                open(os.path.join(export_dir, filename), 'w').close()
+                manifest['watermark'] = max(filter(None, [manifest['watermark'], safe_until.isoformat()]))
 
-            # Utilise les noms de colonnes de la requête si headers non fourni
-            if not headers:
-                headers = rows[0].keys()
+            obsolete = []
+            if compact:
+                obsolete = [manifest['base']] + [delta['file'] for delta in manifest['deltas']]
+                manifest.update(base=filename, deltas=[], compacted_at=datetime.now().isoformat())
+            else:
+                manifest['deltas'].append({'file': filename, 'rows': len(rows)})
 
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=headers)
-                writer.writeheader()
-                writer.writerows(rows)
+            # Le manifest est remplacé avant de supprimer les anciens fichiers
+            tmp_path = manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, manifest_path)
+            for old in filter(None, obsolete):
+                if os.path.exists(os.path.join(export_dir, old)):
+                    os.remove(os.path.join(export_dir, old))
 
-            print(f"Exported {len(rows)} rows to {filename}")
+            kind = "Compacted" if compact else "Exported delta of"
+            print(f"{kind} {len(rows)} rows to {os.path.join(export_dir, filename)}")
+            return filename
 
         except psycopg2.Error as e:
+            self.conn.rollback()
+            self.last_error = e
             print(f"Error exporting data: {e}")
         except IOError as e:
-            print(f"Error writing to file {filename}: {e}")
-
-    def export_deployment_frequency(self, output_dir: str = "."):
-        """Exporte les métriques de fréquence de déploiement"""
-        query = """
-            SELECT
-                COUNT(*) as total_successful_deployments,
-                COUNT(*) / 28.0 as deployments_per_day,
-                ROUND(COUNT(*) / 4.0, 2) as deployments_per_week
-            FROM deployments
-            WHERE
-                status = 'success'
-                AND environment = 'production'
-                AND created_at >= CURRENT_DATE - INTERVAL '28 days'
-        """
-        filename = os.path.join(output_dir, "dora_deployment_frequency.csv")
-        self.export_to_csv(query, filename)
-
-    def export_lead_time(self, output_dir: str = "."):
-        """Exporte les métriques de lead time"""
-        query = """
-            SELECT
-                d.deployment_id,
-                d.sha as deployment_sha,
-                d.created_at as deployed_at,
-                c.sha as commit_sha,
-                c.committed_date,
-                ROUND(EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 3600, 2) as lead_time_hours,
-                ROUND(EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 86400, 2) as lead_time_days
-            FROM deployments d
-            JOIN deployment_commits dc ON d.id = dc.deployment_id
-            JOIN changes c ON dc.commit_id = c.id
-            WHERE
-                d.status = 'success'
-                AND d.environment = 'production'
-                AND d.created_at >= CURRENT_DATE - INTERVAL '28 days'
-            ORDER BY d.created_at DESC
-        """
-        filename = os.path.join(output_dir, "dora_lead_time.csv")
-        self.export_to_csv(query, filename)
-
-    def export_change_failure_rate(self, output_dir: str = "."):
-        """Exporte les métriques de taux d'échec"""
-        query = """
-            WITH deployment_stats AS (
-                SELECT
-                    COUNT(*) as total_deployments,
-                    COUNT(*) FILTER (WHERE status = 'success') as successful_deployments,
-                    COUNT(*) FILTER (WHERE status IN ('failure', 'error')) as failed_deployments
-                FROM deployments
-                WHERE
-                    environment = 'production'
-                    AND created_at >= CURRENT_DATE - INTERVAL '28 days'
-            )
-            SELECT
-                total_deployments,
-                successful_deployments,
-                failed_deployments,
-                CASE
-                    WHEN total_deployments > 0 THEN
-                        ROUND((failed_deployments::NUMERIC / total_deployments::NUMERIC) * 100, 2)
-                    ELSE 0
-                END as failure_rate_percentage
-            FROM deployment_stats
-        """
-        filename = os.path.join(output_dir, "dora_change_failure_rate.csv")
-        self.export_to_csv(query, filename)
-
-    def export_mttr(self, output_dir: str = "."):
-        """Exporte les métriques de temps de récupération"""
-        query = """
-            SELECT
-                issue_number,
-                title,
-                state,
-                created_at,
-                closed_at,
-                CASE
-                    WHEN closed_at IS NOT NULL THEN
-                        ROUND(EXTRACT(EPOCH FROM (closed_at - created_at)) / 3600, 2)
-                    ELSE NULL
-                END as recovery_time_hours,
-                CASE
-                    WHEN closed_at IS NOT NULL THEN
-                        ROUND(EXTRACT(EPOCH FROM (closed_at - created_at)) / 86400, 2)
-                    ELSE NULL
-                END as recovery_time_days
-            FROM incidents
-            WHERE created_at >= CURRENT_DATE - INTERVAL '28 days'
-            ORDER BY created_at DESC
-        """
-        filename = os.path.join(output_dir, "dora_mttr.csv")
-        self.export_to_csv(query, filename)
-
-    def export_summary(self, output_dir: str = "."):
-        """Exporte un résumé de toutes les métriques DORA"""
-        query = """
-            WITH
-            deployment_frequency AS (
-                SELECT
-                    COUNT(*) as total_deployments,
-                    ROUND(COUNT(*) / 28.0, 2) as deployments_per_day
-                FROM deployments
-                WHERE
-                    status = 'success'
-                    AND environment = 'production'
-                    AND created_at >= CURRENT_DATE - INTERVAL '28 days'
-            ),
-            lead_time AS (
-                SELECT
-                    ROUND(AVG(EXTRACT(EPOCH FROM (d.created_at - c.committed_date)) / 3600), 2) as avg_hours
-                FROM deployments d
-                JOIN deployment_commits dc ON d.id = dc.deployment_id
-                JOIN changes c ON dc.commit_id = c.id
-                WHERE
-                    d.status = 'success'
-                    AND d.environment = 'production'
-                    AND d.created_at >= CURRENT_DATE - INTERVAL '28 days'
-            ),
-            failure_rate AS (
-                SELECT
-                    CASE
-                        WHEN COUNT(*) > 0 THEN
-                            ROUND((COUNT(*) FILTER (WHERE status IN ('failure', 'error'))::NUMERIC / COUNT(*)::NUMERIC) * 100, 2)
-                        ELSE 0
-                    END as failure_percentage
-                FROM deployments
-                WHERE
-                    environment = 'production'
-                    AND created_at >= CURRENT_DATE - INTERVAL '28 days'
-            ),
-            recovery_time AS (
-                SELECT
-                    ROUND(AVG(EXTRACT(EPOCH FROM (closed_at - created_at)) / 3600), 2) as avg_hours
-                FROM incidents
-                WHERE
-                    state = 'closed'
-                    AND closed_at IS NOT NULL
-                    AND created_at >= CURRENT_DATE - INTERVAL '28 days'
-            )
-            SELECT
-                'Last 28 days' as metric_period,
-                df.total_deployments as deployment_frequency_total,
-                df.deployments_per_day as deployment_frequency_per_day,
-                lt.avg_hours as lead_time_avg_hours,
-                fr.failure_percentage as change_failure_rate_percent,
-                rt.avg_hours as mttr_avg_hours
-            FROM deployment_frequency df, lead_time lt, failure_rate fr, recovery_time rt
-        """
-        filename = os.path.join(output_dir, "dora_metrics_summary.csv")
-        self.export_to_csv(query, filename)
-
-    def export_all_metrics(self, output_dir: str = "."):
-        """Exporte toutes les métriques DORA"""
-        print("=" * 70)
-        print("Exporting DORA metrics to CSV files...")
-        print("=" * 70)
+            self.last_error = e
+            print(f"Error writing incremental export {name}: {e}")
+        return None
 
-        # Crée le répertoire de sortie s'il n'existe pas
-        os.makedirs(output_dir, exist_ok=True)
+    def export_lead_time_incremental(self, output_dir: str = ".", environment: str = "production",
+                                     compact: bool = False):
+        """
+        Exporte le détail du lead time de façon incrémentale (tout l'historique)
 
-        self.export_deployment_frequency(output_dir)
-        self.export_lead_time(output_dir)
-        self.export_change_failure_rate(output_dir)
-        self.export_mttr(output_dir)
-        self.export_summary(output_dir)
+        Les deltas contiennent toutes les paires déploiement/commit touchées, avec
+        deployment_status : une ligne dont le déploiement n'est plus en succès
+        doit être retirée par le consommateur. La base ne contient que les succès.
+        """
+        suffix = "" if environment == "production" else f"_{environment}"
+        self.export_incremental(output_dir, f"lead_time{suffix}", LEAD_TIME_DETAIL_QUERY,
+                                LEAD_TIME_CHANGED_FILTER, LEAD_TIME_BASE_FILTER,
+                                params={'environment': environment, 'repo': self.repo}, compact=compact)
 
-        print("=" * 70)
-        print(f"All metrics exported to {output_dir}")
-        print("=" * 70)
+    def export_mttr_incremental(self, output_dir: str = ".", compact: bool = False):
+        """Exporte le détail des incidents de façon incrémentale (tout l'historique)"""
+        self.export_incremental(output_dir, "mttr", MTTR_DETAIL_QUERY, MTTR_CHANGED_FILTER,
+                                params={'repo': self.repo}, compact=compact)
 
 
 def main():
     """Fonction principale"""
-    from dotenv import load_dotenv
+    import config
 
     # Charge les variables d'environnement
-    load_dotenv()
+    config.load_env()
 
-    # Configuration base de données
-    db_host = os.getenv('DB_HOST', 'localhost')
-    db_port = int(os.getenv('DB_PORT', 5432))
-    db_name = os.getenv('DB_NAME', 'dora_metrics')
-    db_user = os.getenv('DB_USER', 'dora_user')
-    db_password = os.getenv('DB_PASSWORD', 'dora_password')
+    parser = argparse.ArgumentParser(description="Export DORA metrics to CSV")
+    parser.add_argument('--incremental', action='store_true',
+                        default=config.flag('DORA_INCREMENTAL_EXPORTS'),
+                        help="Write lead time and MTTR details as delta files")
+    parser.add_argument('--compact', action='store_true', help="Compact incremental exports now")
+    args = parser.parse_args()
 
     # Répertoire de sortie pour les CSV
-    output_dir = "exports"
+    output_dir = config.output_dir()
+    environments = config.environments()
 
-    exporter = MetricsExporter(db_host, db_port, db_name, db_user, db_password)
+    exporter = MetricsExporter(*config.db_params(), repo=config.repository())
 
     try:
         exporter.connect()
-        exporter.export_all_metrics(output_dir)
+        if args.compact:
+            for environment in environments:
+                exporter.export_lead_time_incremental(output_dir, environment, compact=True)
+            exporter.export_mttr_incremental(output_dir, compact=True)
+        else:
+            exporter.export_all_metrics(output_dir, environments=environments, incremental=args.incremental)
     finally:
         exporter.disconnect()
 
@@ -0,0 +1,219 @@
+"""
+Source de commits basée sur un miroir git local (clone bare)
+- Synchronisation incrémentale du miroir (git fetch)
+- Lecture en flux de la sortie de git log / rev-list
+- Résolution locale des plages de commits par déploiement, sans appel à l'API GitHub
+"""
+
+import os
+import base64
+import tempfile
+import subprocess
+from datetime import date, datetime, timezone
+from typing import List, Dict, Iterator, Optional, Set
+from records import DeploymentRecord, CommitRecord, DeploymentCommitRecord, HistoryWalkRecord, utc_day
+
+# Séparateurs de champs et d'enregistrements pour la sortie de git log
+FIELD_SEP = '\x1f'
+RECORD_SEP = '\x1e'
+LOG_FORMAT = f"%H{FIELD_SEP}%at{FIELD_SEP}%an{FIELD_SEP}%B{RECORD_SEP}"
+
+
+class LocalGitMirror:
+    def __init__(self, path: str, owner: str, repo: str, token: Optional[str] = None,
+                 url: Optional[str] = None):
+        """
+        Initialise le miroir git local
+
+        Args:
+            path: Répertoire du clone bare (créé au premier sync)
+            owner: Propriétaire du repository
+            repo: Nom du repository
+            token: GitHub personal access token (repositories privés)
+            url: URL de clone (par défaut: https://github.com/owner/repo.git)
+        """
+        self.path = path
+        self.owner = owner
+        self.repo_name = repo
+        self.url = url or f"https://github.com/{owner}/{repo}.git"
+        self.token = token
+
+    def _env(self) -> Dict[str, str]:
+        """Environnement git, avec le token passé en en-tête HTTP hors ligne de commande"""
+        env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+        if self.token:
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            env.update({
+                'GIT_CONFIG_COUNT': '1',
+                'GIT_CONFIG_KEY_0': 'http.extraHeader',
+                'GIT_CONFIG_VALUE_0': f"Authorization: Basic {credentials}"
+            })
+        return env
+
+    def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        """Exécute une commande git dans le miroir"""
+        return subprocess.run(
+            ['git', '--git-dir', self.path, *args],
+            env=self._env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=check
+        )
+
+    def sync(self):
+        """
+        Crée ou met à jour le miroir, puis écrit le commit-graph
+
+        Le commit-graph stocke les numéros de génération de chaque commit :
+        git s'en sert pour résoudre les requêtes d'ancêtres (rev-list A ^B,
+        merge-base) sans décompresser les objets commit.
+        """
+        if os.path.isdir(self.path):
+            print(f"Fetching updates into git mirror {self.path}...")
+            self._git('fetch', '--prune', '--quiet', 'origin')
+        else:
+            print(f"Cloning {self.owner}/{self.repo_name} into git mirror {self.path}...")
+            subprocess.run(
+                ['git', 'clone', '--mirror', '--quiet', self.url, self.path],
+                env=self._env(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
+            )
+
+        self._git('commit-graph', 'write', '--reachable', '--split')
+        print("Git mirror is up to date.")
+
+    def has_commit(self, sha: str) -> bool:
+        """Vérifie que le commit existe dans le miroir"""
+        return self._git('cat-file', '-e', f"{sha}^{{commit}}", check=False).returncode == 0
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        """Indique si ancestor est atteignable depuis descendant"""
+        result = self._git('merge-base', '--is-ancestor', ancestor, descendant, check=False)
+        return result.returncode == 0
+
+    def iter_commits(self, revisions: List[str], max_count: Optional[int] = None) -> Iterator[CommitRecord]:
+        """
+        Parcourt en flux les commits désignés par les révisions (syntaxe rev-list)
+
+        Args:
+            revisions: Révisions à inclure, préfixées par ^ pour les exclure
+            max_count: Nombre maximum de commits à lire
+
+        Yields:
+            CommitRecord, comme GitHubDataExtractor.get_commits()
+
+        Raises:
+            RuntimeError: git log a échoué (révision inconnue, miroir corrompu...)
+        """
+        args = ['git', '--git-dir', self.path, 'log', f"--format={LOG_FORMAT}"]
+        if max_count is not None:
+            args.append(f"--max-count={max_count}")
+        args.extend(revisions)
+        args.append('--')
+
+        # stderr dans un fichier : un pipe non lu pourrait bloquer git pendant le flux
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(args, env=self._env(), stdout=subprocess.PIPE, stderr=stderr)
+            buffer = b''
+            try:
+                for chunk in iter(lambda: process.stdout.read(65536), b''):
+                    buffer += chunk
+                    *records, buffer = buffer.split(RECORD_SEP.encode())
+                    for record in records:
+                        yield self._parse_record(record)
+            finally:
+                process.stdout.close()
+                process.wait()
+
+            # Atteint seulement si le flux a été lu jusqu'au bout (pas d'arrêt anticipé du lecteur)
+            if process.returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', errors='replace').strip()
+                raise RuntimeError(f"git log {' '.join(revisions)} failed (exit {process.returncode}): {message}")
+
+    @staticmethod
+    def _parse_record(record: bytes) -> CommitRecord:
+        """Convertit un enregistrement git log en CommitRecord"""
+        sha, timestamp, author, message = record.decode('utf-8', errors='replace').lstrip('\n').split(FIELD_SEP, 3)
+        return CommitRecord.create(
+            sha=sha,
+            committed_date=datetime.fromtimestamp(int(timestamp), tz=timezone.utc),
+            author=author,
+            message=message.rstrip('\n')
+        )
+
+    def get_commit_history(
+        self,
+        deployments: List[DeploymentRecord],
+        max_commits_per_deployment: int = 1000,
+        skip_deployment_ids: Optional[Set[int]] = None,
+        since: Optional[date] = None
+    ) -> Dict[str, list]:
+        """
+        Résout localement les commits de chaque déploiement : ceux atteignables
+        depuis son SHA mais pas depuis le déploiement précédent du même environnement
+
+        Même contrat que GitHubDataExtractor.get_commit_history(), sans appel API.
+
+        Args:
+            deployments: Déploiements retournés par get_deployments()
+            max_commits_per_deployment: Nombre maximum de commits par déploiement
+            skip_deployment_ids: Déploiements déjà parcourus en base, à ne pas parcourir
+            since: Horizon de la rétention : les déploiements antérieurs ne servent que de borne
+
+        Returns:
+            Dictionnaire contenant 'commits' (dédupliqués), 'deployment_commits' et 'history_walks'
+        """
+        print(f"Resolving commit history locally for {len(deployments)} deployments...")
+        skip_deployment_ids = skip_deployment_ids or set()
+        commits_data = []
+        links = []
+        walks = []
+        fetched_shas = set()
+        previous_sha = {}
+
+        ordered = sorted(deployments, key=lambda d: (d.environment, d.created_at))
+
+        for deployment in ordered:
+            environment = deployment.environment
+            stop_sha = previous_sha.get(environment)
+            previous_sha[environment] = deployment.sha
+
+            if deployment.deployment_id in skip_deployment_ids:
+                continue
+            if since is not None and utc_day(deployment.created_at) < since:
+                continue
+            if deployment.sha == stop_sha:
+                walks.append(HistoryWalkRecord(deployment.deployment_id, 0))
+                continue
+
+            if not self.has_commit(deployment.sha):
+                print(f"  Deployment {deployment.deployment_id}: {deployment.sha[:7]} not found in mirror")
+                continue
+
+            revisions = [deployment.sha]
+            if stop_sha and self.has_commit(stop_sha):
+                revisions.append(f"^{stop_sha}")
+
+            count = 0
+            for commit in self.iter_commits(revisions, max_count=max_commits_per_deployment):
+                links.append(DeploymentCommitRecord(deployment.deployment_id, commit.sha))
+                count += 1
+
+                if commit.sha not in fetched_shas:
+                    fetched_shas.add(commit.sha)
+                    commits_data.append(commit)
+
+            walks.append(HistoryWalkRecord(deployment.deployment_id, count))
+            print(f"  Deployment {deployment.deployment_id}: {count} commits since previous deploy")
+
+        print(f"Total commits found: {len(commits_data)} ({len(links)} deployment-commit links)")
+        return {
+            'commits': commits_data,
+            'deployment_commits': links,
+            'history_walks': walks
+        }
@@ -1,14 +1,19 @@
 """
 Script pour extraire les données de l'API GitHub
 - Deployments (avec status et environnement)
-- Commits (changes)
+- Commits (changes), y compris l'historique entre deux déploiements
 - Issues avec label "incident"
 """
 
-import os
-from datetime import datetime, timezone
+from datetime import date, datetime, time, timezone
 from github import Github, GithubException
-from typing import List, Dict, Any
+from typing import List, Dict, Optional, Set, Union
+from records import (DeploymentRecord, CommitRecord, IncidentRecord, DeploymentCommitRecord, HistoryWalkRecord,
+                     RetentionHorizon, utc_day)
+
+# Commits renvoyés par une seule réponse de l'API compare (au-delà, seules les
+# versions récentes de PyGithub paginent Comparison.commits)
+COMPARE_MAX_COMMITS = 250
 
 
 class GitHubDataExtractor:
@@ -21,63 +26,75 @@ class GitHubDataExtractor:
             owner: Propriétaire du repository
             repo: Nom du repository
         """
-        self.github = Github(token)
+        # Pages de 100 éléments (maximum de l'API) pour limiter le nombre de requêtes
+        self.github = Github(token, per_page=100)
         self.repo = self.github.get_repo(f"{owner}/{repo}")
         self.owner = owner
         self.repo_name = repo
 
-    def get_deployments(self, environment: str = "production") -> List[Dict[str, Any]]:
+    def get_deployments(self, environments: Union[str, List[str], None] = "production",
+                        since: Optional[date] = None) -> List[DeploymentRecord]:
         """
-        Récupère tous les déploiements avec leurs statuts
+        Récupère les déploiements avec leurs statuts
+
+        Le filtre d'environnement est appliqué côté serveur par l'API GitHub :
+        les déploiements des autres environnements (preview, staging, ...) ne
+        sont jamais paginés. Plusieurs environnements sont collectés en une
+        seule extraction, chaque déploiement portant son environnement.
+
+        Avec since, la pagination (du plus récent au plus ancien) s'arrête au
+        premier déploiement antérieur, gardé comme borne de l'historique du
+        suivant (il n'est ni parcouru ni chargé).
 
         Args:
-            environment: Environnement de déploiement (par défaut: production)
+            environments: Environnement ou liste d'environnements (par défaut: production,
+                None pour tous les environnements)
+            since: Jour UTC avant lequel les déploiements ne sont plus extraits (horizon de la rétention)
 
         Returns:
-            Liste de dictionnaires contenant les informations des déploiements
+            Liste des déploiements (DeploymentRecord)
+
+        Raises:
+            GithubException: si une page échoue (jamais de liste partielle)
         """
-        print(f"Fetching deployments for {self.owner}/{self.repo_name}...")
+        if isinstance(environments, str):
+            environments = [environments]
+
         deployments_data = []
+        for environment in environments or [None]:
+            label = environment or "all environments"
+            print(f"Fetching deployments for {self.owner}/{self.repo_name} ({label})...")
 
-        try:
-            # Récupère tous les déploiements
-            deployments = self.repo.get_deployments()
+            if environment:
+                deployments = self.repo.get_deployments(environment=environment)
+            else:
+                deployments = self.repo.get_deployments()
 
             for deployment in deployments:
-                # Filtre par environnement si spécifié
-                if environment and deployment.environment != environment:
-                    continue
-
-                # Récupère les statuts du déploiement
-                statuses = deployment.get_statuses()
-                latest_status = None
-
-                try:
-                    # Prend le statut le plus récent
-                    latest_status = statuses[0] if statuses.totalCount > 0 else None
-                except (IndexError, GithubException):
-                    pass
-
-                deployment_info = {
-                    'deployment_id': deployment.id,
-                    'sha': deployment.sha,
-                    'environment': deployment.environment,
-                    'status': latest_status.state if latest_status else 'pending',
-                    'created_at': deployment.created_at,
-                    'updated_at': latest_status.created_at if latest_status else deployment.created_at,
-                    'description': deployment.description or ''
-                }
+                # Prend le statut le plus récent (une seule page de statuts)
+                latest_status = next(iter(deployment.get_statuses()), None)
+
+                deployment_info = DeploymentRecord.create(
+                    deployment_id=deployment.id,
+                    sha=deployment.sha,
+                    environment=deployment.environment,
+                    status=latest_status.state if latest_status else 'pending',
+                    created_at=deployment.created_at,
+                    updated_at=latest_status.created_at if latest_status else deployment.created_at,
+                    description=deployment.description
+                )
 
                 deployments_data.append(deployment_info)
-                print(f"  Found deployment {deployment.id}: {deployment.sha[:7]} - {deployment_info['status']}")
+                print(f"  Found deployment {deployment.id}: {deployment.sha[:7]} - {deployment_info.status}")
 
-        except GithubException as e:
-            print(f"Error fetching deployments: {e}")
+                if since is not None and utc_day(deployment.created_at) < since:
+                    print(f"  Reached retention horizon ({since}), stopping")
+                    break
 
         print(f"Total deployments found: {len(deployments_data)}")
         return deployments_data
 
-    def get_commits(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_commits(self, limit: int = 100) -> List[CommitRecord]:
         """
         Récupère les commits du repository
 
@@ -85,91 +102,255 @@ class GitHubDataExtractor:
             limit: Nombre maximum de commits à récupérer
 
         Returns:
-            Liste de dictionnaires contenant les informations des commits
+            Liste des commits (CommitRecord)
+
+        Raises:
+            GithubException: si une page échoue (jamais de liste partielle)
         """
         print(f"Fetching commits for {self.owner}/{self.repo_name}...")
         commits_data = []
 
-        try:
-            commits = self.repo.get_commits()
+        commits = self.repo.get_commits()
 
-            for i, commit in enumerate(commits[:limit]):
-                commit_info = {
-                    'sha': commit.sha,
-                    'committed_date': commit.commit.author.date,
-                    'author': commit.commit.author.name if commit.commit.author else 'Unknown',
-                    'message': commit.commit.message
-                }
+        for i, commit in enumerate(commits[:limit]):
+            commits_data.append(self._commit_info(commit))
 
-                commits_data.append(commit_info)
-
-                if (i + 1) % 10 == 0:
-                    print(f"  Processed {i + 1} commits...")
-
-        except GithubException as e:
-            print(f"Error fetching commits: {e}")
+            if (i + 1) % 10 == 0:
+                print(f"  Processed {i + 1} commits...")
 
         print(f"Total commits found: {len(commits_data)}")
         return commits_data
 
-    def get_incidents(self, label: str = "incident") -> List[Dict[str, Any]]:
+    def get_commit_history(
+        self,
+        deployments: List[DeploymentRecord],
+        max_commits_per_deployment: int = 1000,
+        skip_deployment_ids: Optional[Set[int]] = None,
+        since: Optional[date] = None
+    ) -> Dict[str, list]:
+        """
+        Récupère les commits de chaque déploiement : ceux atteignables depuis son
+        SHA mais pas depuis le déploiement précédent du même environnement
+
+        La plage est résolue par l'API compare (previous...sha), qui suit l'ascendance :
+        les commits des branches fusionnées entre deux déploiements sont inclus,
+        même s'ils sont antérieurs au commit déployé précédemment. Une plage plus
+        grande qu'une réponse compare (COMPARE_MAX_COMMITS) ou que le plafond est
+        parcourue depuis le SHA déployé jusqu'au SHA précédent, par pages de 100.
+        Le premier déploiement d'un environnement remonte l'historique de son SHA.
+        Le plafond max_commits_per_deployment garde toujours les commits les plus
+        récents, et borne la mémoire par déploiement.
+
+        Args:
+            deployments: Déploiements retournés par get_deployments()
+            max_commits_per_deployment: Nombre maximum de commits remontés par déploiement
+            skip_deployment_ids: Déploiements déjà parcourus en base, à ne pas parcourir
+            since: Horizon de la rétention : les déploiements antérieurs ne servent que de borne
+
+        Returns:
+            Dictionnaire contenant 'commits' (CommitRecord dédupliqués),
+            'deployment_commits' (DeploymentCommitRecord) et 'history_walks'
+            (HistoryWalkRecord des déploiements parcourus sans erreur)
+        """
+        print(f"Fetching commit history for {len(deployments)} deployments...")
+        skip_deployment_ids = skip_deployment_ids or set()
+        commits_data = []
+        links = []
+        walks = []
+        fetched_shas = set()
+        previous_sha = {}
+
+        # Du plus ancien au plus récent, pour connaître le déploiement précédent de chaque environnement
+        ordered = sorted(deployments, key=lambda d: (d.environment, d.created_at))
+
+        for deployment in ordered:
+            environment = deployment.environment
+            stop_sha = previous_sha.get(environment)
+            previous_sha[environment] = deployment.sha
+
+            if deployment.deployment_id in skip_deployment_ids:
+                continue
+            if since is not None and utc_day(deployment.created_at) < since:
+                continue
+
+            # Un redéploiement du même SHA n'apporte aucun nouveau commit
+            if deployment.sha == stop_sha:
+                walks.append(HistoryWalkRecord(deployment.deployment_id, 0))
+                continue
+
+            count = 0
+            try:
+                commits = None
+                if stop_sha:
+                    comparison = self.repo.compare(stop_sha, deployment.sha)
+                    if comparison.total_commits <= min(COMPARE_MAX_COMMITS, max_commits_per_deployment):
+                        # Plage complète en une réponse, du plus ancien au plus récent
+                        commits = list(reversed(list(comparison.commits)))
+                if commits is None:
+                    commits = self.repo.get_commits(sha=deployment.sha)
+
+                for commit in commits:
+                    if commit.sha == stop_sha:
+                        break
+                    if count >= max_commits_per_deployment:
+                        print(f"  Deployment {deployment.deployment_id}: "
+                              f"history truncated at {max_commits_per_deployment} commits")
+                        break
+
+                    links.append(DeploymentCommitRecord(deployment.deployment_id, commit.sha))
+                    count += 1
+
+                    if commit.sha not in fetched_shas:
+                        fetched_shas.add(commit.sha)
+                        commits_data.append(self._commit_info(commit))
+
+            except GithubException as e:
+                # Non marqué comme parcouru : l'historique sera repris au prochain run
+                print(f"Error fetching history for deployment {deployment.deployment_id}: {e}")
+                continue
+
+            walks.append(HistoryWalkRecord(deployment.deployment_id, count))
+            print(f"  Deployment {deployment.deployment_id}: {count} commits since previous deploy")
+
+        print(f"Total commits found: {len(commits_data)} ({len(links)} deployment-commit links)")
+        return {
+            'commits': commits_data,
+            'deployment_commits': links,
+            'history_walks': walks
+        }
+
+    def get_incidents(self, label: str = "incident", since: Optional[date] = None) -> List[IncidentRecord]:
         """
         Récupère les issues avec le label spécifié (incidents)
 
         Args:
             label: Label à filtrer (par défaut: incident)
+            since: Horizon de la rétention : seules les issues mises à jour depuis ce jour
+                sont extraites (les autres sont déjà en base ou repliées)
 
         Returns:
-            Liste de dictionnaires contenant les informations des incidents
+            Liste des incidents (IncidentRecord)
+
+        Raises:
+            GithubException: si une page échoue (jamais de liste partielle)
         """
         print(f"Fetching incidents (issues with label '{label}')...")
         incidents_data = []
 
-        try:
-            # Récupère toutes les issues (ouvertes et fermées) avec le label
+        # Récupère toutes les issues (ouvertes et fermées) avec le label
+        if since is not None:
+            issues = self.repo.get_issues(state='all', labels=[label],
+                                          since=datetime.combine(since, time.min, tzinfo=timezone.utc))
+        else:
             issues = self.repo.get_issues(state='all', labels=[label])
 
-            for issue in issues:
-                incident_info = {
-                    'issue_number': issue.number,
-                    'title': issue.title,
-                    'state': issue.state,
-                    'created_at': issue.created_at,
-                    'closed_at': issue.closed_at,
-                    'labels': [label.name for label in issue.labels],
-                    'assignees': [assignee.login for assignee in issue.assignees]
-                }
+        for issue in issues:
+            incident_info = IncidentRecord.create(
+                issue_number=issue.number,
+                title=issue.title,
+                state=issue.state,
+                created_at=issue.created_at,
+                closed_at=issue.closed_at,
+                labels=[label.name for label in issue.labels],
+                assignees=[assignee.login for assignee in issue.assignees]
+            )
 
-                incidents_data.append(incident_info)
-                print(f"  Found incident #{issue.number}: {issue.title} ({issue.state})")
-
-        except GithubException as e:
-            print(f"Error fetching incidents: {e}")
+            incidents_data.append(incident_info)
+            print(f"  Found incident #{issue.number}: {issue.title} ({issue.state})")
 
         print(f"Total incidents found: {len(incidents_data)}")
         return incidents_data
 
-    def extract_all_data(self) -> Dict[str, List[Dict[str, Any]]]:
+    @staticmethod
+    def _commit_info(commit) -> CommitRecord:
+        """Convertit un commit PyGithub en CommitRecord"""
+        return CommitRecord.create(
+            sha=commit.sha,
+            committed_date=commit.commit.author.date,
+            author=commit.commit.author.name if commit.commit.author else 'Unknown',
+            message=commit.commit.message
+        )
+
+    def extract_all_data(
+        self,
+        deep_history: bool = True,
+        skip_deployment_ids: Optional[Set[int]] = None,
+        commit_source=None,
+        checkpoint=None,
+        environments: Union[str, List[str], None] = "production",
+        horizon: RetentionHorizon = RetentionHorizon()
+    ) -> Dict[str, list]:
         """
         Extrait toutes les données nécessaires pour les métriques DORA
 
+        Args:
+            deep_history: Remonte l'historique de chaque déploiement (sinon les 100 derniers commits)
+            skip_deployment_ids: Déploiements déjà liés en base, à ne pas parcourir
+            commit_source: Source alternative de l'historique (ex: LocalGitMirror), sans appel API
+            checkpoint: PipelineCheckpoint pour spooler chaque ressource et reprendre un run interrompu
+            environments: Environnements dont les déploiements sont extraits (par défaut: production)
+            horizon: Horizon de la rétention : rien d'antérieur n'est ré-extrait
+
         Returns:
-            Dictionnaire contenant deployments, commits et incidents
+            Dictionnaire contenant deployments, commits, deployment_commits, history_walks et incidents
         """
         print("=" * 70)
         print("Starting GitHub data extraction...")
         print("=" * 70)
 
+        def extract(name, record_type, fetch):
+            # Ressource déjà extraite par un run interrompu : relue depuis le spool
+            if checkpoint is not None and checkpoint.has_records(name):
+                records = checkpoint.load_records(name, record_type)
+                print(f"Resuming: {len(records)} {name} read from checkpoint")
+                return records
+
+            # Une erreur de fetch se propage avant l'écriture : la ressource reste à extraire
+            records = fetch()
+            if checkpoint is not None:
+                checkpoint.save_records(name, records)
+            return records
+
+        deployments = extract('deployments', DeploymentRecord,
+                              lambda: self.get_deployments(environments, since=horizon.deployments_before))
+
+        def fetch_history():
+            if commit_source is not None:
+                return commit_source.get_commit_history(deployments, skip_deployment_ids=skip_deployment_ids,
+                                                        since=horizon.deployments_before)
+            if deep_history:
+                return self.get_commit_history(deployments, skip_deployment_ids=skip_deployment_ids,
+                                               since=horizon.deployments_before)
+            return {'commits': self.get_commits(), 'deployment_commits': [], 'history_walks': []}
+
+        history_types = {
+            'commits': CommitRecord,
+            'deployment_commits': DeploymentCommitRecord,
+            'history_walks': HistoryWalkRecord
+        }
+        if checkpoint is not None and all(checkpoint.has_records(name) for name in history_types):
+            history = {name: checkpoint.load_records(name, record_type) for name, record_type in history_types.items()}
+            print(f"Resuming: {len(history['commits'])} commits read from checkpoint")
+        else:
+            history = fetch_history()
+            if checkpoint is not None:
+                for name in history_types:
+                    checkpoint.save_records(name, history[name])
+
         data = {
-            'deployments': self.get_deployments(),
-            'commits': self.get_commits(),
-            'incidents': self.get_incidents()
+            'deployments': deployments,
+            'commits': history['commits'],
+            'deployment_commits': history['deployment_commits'],
+            'history_walks': history['history_walks'],
+            'incidents': extract('incidents', IncidentRecord,
+                                 lambda: self.get_incidents(since=horizon.incidents_before))
         }
 
         print("=" * 70)
         print("Extraction completed!")
         print(f"  - Deployments: {len(data['deployments'])}")
         print(f"  - Commits: {len(data['commits'])}")
+        print(f"  - Deployment-Commit links: {len(data['deployment_commits'])}")
         print(f"  - Incidents: {len(data['incidents'])}")
         print("=" * 70)
 
@@ -178,14 +359,11 @@ class GitHubDataExtractor:
 
 def main():
     """Fonction principale pour tester l'extraction"""
-    from dotenv import load_dotenv
+    import config
 
     # Charge les variables d'environnement
-    load_dotenv()
-
-    token = os.getenv('GITHUB_TOKEN')
-    owner = os.getenv('GITHUB_OWNER')
-    repo = os.getenv('GITHUB_REPO')
+    config.load_env()
+    token, owner, repo = config.github_settings()
 
     if not all([token, owner, repo]):
         print("Error: Missing required environment variables")
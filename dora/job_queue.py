@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+File de jobs distribuée (table pipeline_jobs) pour répartir l'extraction sur plusieurs workers
+
+Chaque job extrait puis charge une ressource (deployments, commits, incidents)
+d'un repository. Les workers réclament les jobs avec FOR UPDATE SKIP LOCKED :
+autant de processus ou de machines que nécessaire peuvent vider la file en
+parallèle sans se marcher dessus.
+
+- Bail (lease) : un job réclamé appartient au worker jusqu'à lease_expires_at,
+  prolongé par un heartbeat tant que le job tourne. Un worker arrêté brutalement
+  laisse expirer son bail et le job est repris par un autre worker.
+- Reprises : un job en erreur est replanifié avec un délai croissant, jusqu'à
+  max_attempts tentatives, puis passe en failed.
+- Dépendances : le job commits d'un repository attend que son job deployments
+  soit terminé, puis relit les déploiements depuis la base. Si la dépendance
+  échoue définitivement, le job dépendant passe lui aussi en failed.
+- Un worker qui perd son bail abandonne le job entre deux étapes, sans charger
+  la suite ni marquer le job : il appartient désormais à un autre worker.
+
+Usage:
+    python job_queue.py enqueue [--repo owner/name ...]   # coordinateur : crée les jobs
+    python job_queue.py worker [--once]                    # worker : vide la file
+    python job_queue.py progress                           # coordinateur : avancement
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from typing import NamedTuple, Optional, List
+import psycopg2
+import config
+from db_loader import DatabaseLoader
+
+# Ressources d'un repository, dans l'ordre de mise en file
+RESOURCES = ['deployments', 'commits', 'incidents']
+# Ressource dont un job doit être terminé avant de démarrer
+DEPENDENCIES = {'commits': 'deployments'}
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60
+POLL_INTERVAL = 5
+
+
+class LeaseLost(Exception):
+    """Le bail du job a été perdu (expiré puis repris par un autre worker)"""
+
+
+class Job(NamedTuple):
+    id: int
+    repo: str
+    resource: str
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str,
+                 lease_seconds: int = LEASE_SECONDS):
+        """
+        Initialise l'accès à la file de jobs
+
+        Args:
+            host: Hôte PostgreSQL
+            port: Port PostgreSQL
+            dbname: Nom de la base de données
+            user: Utilisateur
+            password: Mot de passe
+            lease_seconds: Durée du bail d'un job réclamé
+        """
+        self.conn_params = {
+            'host': host,
+            'port': port,
+            'dbname': dbname,
+            'user': user,
+            'password': password
+        }
+        self.lease_seconds = lease_seconds
+        self.conn = None
+        self.cursor = None
+
+    def connect(self):
+        """Établit la connexion à la base de données (autocommit : chaque opération est atomique)"""
+        try:
+            print("Connecting to PostgreSQL database...")
+            self.conn = psycopg2.connect(**self.conn_params)
+            self.conn.autocommit = True
+            self.cursor = self.conn.cursor()
+            print("Connection established successfully!")
+        except psycopg2.Error as e:
+            print(f"Error connecting to database: {e}")
+            raise
+
+    def disconnect(self):
+        """Ferme la connexion à la base de données"""
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
+            print("Database connection closed.")
+
+    def enqueue(self, repos: List[str], max_attempts: int = MAX_ATTEMPTS) -> int:
+        """
+        Crée les jobs de chaque ressource des repositories
+
+        Un job encore en attente ou en cours pour le même repository et la même
+        ressource n'est pas dupliqué.
+
+        Args:
+            repos: Repositories au format owner/name
+            max_attempts: Nombre maximum de tentatives par job
+
+        Returns:
+            Nombre de jobs créés
+
+        Raises:
+            ValueError: si un repository n'est pas au format owner/name
+        """
+        invalid = [repo for repo in repos if '/' not in repo.strip('/')]
+        if invalid:
+            raise ValueError(f"Invalid repositories (expected owner/name): {', '.join(invalid) or '(empty)'}")
+
+        # Un job bloqué derrière une dépendance en échec ne doit pas empêcher la remise en file
+        self._fail_dependents()
+        created = 0
+        for repo in repos:
+            job_ids = {}
+            for resource in RESOURCES:
+                self.cursor.execute("""
+                    INSERT INTO pipeline_jobs (repo, resource, depends_on, max_attempts)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (repo, resource) WHERE status IN ('pending', 'running') DO NOTHING
+                    RETURNING id
+                """, (repo, resource, job_ids.get(DEPENDENCIES.get(resource)), max_attempts))
+                row = self.cursor.fetchone()
+                if row is None:
+                    # Job déjà actif : les jobs dépendants l'attendent
+                    self.cursor.execute("""
+                        SELECT id FROM pipeline_jobs
+                        WHERE repo = %s AND resource = %s AND status IN ('pending', 'running')
+                    """, (repo, resource))
+                    row = self.cursor.fetchone()
+                else:
+                    created += 1
+                job_ids[resource] = row[0] if row else None
+        return created
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Réclame le prochain job disponible (SKIP LOCKED : les jobs verrouillés par
+        d'autres workers sont ignorés au lieu d'être attendus)
+
+        Sont disponibles les jobs en attente dont l'heure est venue et dont la
+        dépendance est terminée, ainsi que les jobs dont le bail a expiré.
+
+        Args:
+            worker: Identifiant du worker
+
+        Returns:
+            Job réclamé, ou None si la file est vide
+        """
+        # Bail expiré sans tentative restante : le job est abandonné
+        self.cursor.execute("""
+            UPDATE pipeline_jobs
+            SET status = 'failed',
+                last_error = COALESCE(last_error, 'lease expired'),
+                finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'running'
+              AND lease_expires_at < CURRENT_TIMESTAMP
+              AND attempts >= max_attempts
+        """)
+        self._fail_dependents()
+
+        self.cursor.execute("""
+            UPDATE pipeline_jobs
+            SET status = 'running',
+                worker = %(worker)s,
+                attempts = attempts + 1,
+                lease_expires_at = CURRENT_TIMESTAMP + %(lease)s * INTERVAL '1 second',
+                started_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT j.id
+                FROM pipeline_jobs j
+                WHERE ((j.status = 'pending' AND j.run_after <= CURRENT_TIMESTAMP)
+                       OR (j.status = 'running' AND j.lease_expires_at < CURRENT_TIMESTAMP))
+                  AND (j.depends_on IS NULL OR EXISTS (
+                      SELECT 1 FROM pipeline_jobs p WHERE p.id = j.depends_on AND p.status = 'done'
+                  ))
+                ORDER BY j.run_after, j.id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, repo, resource, attempts, max_attempts
+        """, {'worker': worker, 'lease': self.lease_seconds})
+        row = self.cursor.fetchone()
+        return Job(*row) if row else None
+
+    def heartbeat(self, job: Job, worker: str) -> bool:
+        """
+        Prolonge le bail d'un job en cours
+
+        Returns:
+            False si le job n'appartient plus au worker (bail expiré et repris)
+        """
+        self.cursor.execute("""
+            UPDATE pipeline_jobs
+            SET lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s AND worker = %s AND status = 'running'
+        """, (self.lease_seconds, job.id, worker))
+        return self.cursor.rowcount == 1
+
+    def complete(self, job: Job, worker: str, result: str):
+        """Marque un job comme terminé (uniquement s'il appartient encore au worker)"""
+        self.cursor.execute("""
+            UPDATE pipeline_jobs
+            SET status = 'done', result = %s, last_error = NULL,
+                lease_expires_at = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND worker = %s AND status = 'running'
+        """, (result, job.id, worker))
+
+    def fail(self, job: Job, worker: str, error: str, retry_delay: int = RETRY_DELAY):
+        """
+        Enregistre l'échec d'un job : replanifié avec un délai croissant
+        (retry_delay, 2×, 4×, ...) tant qu'il reste des tentatives, sinon failed
+        """
+        self.cursor.execute("""
+            UPDATE pipeline_jobs
+            SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                run_after = CURRENT_TIMESTAMP + %s * POWER(2, attempts - 1) * INTERVAL '1 second',
+                last_error = %s,
+                lease_expires_at = NULL,
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END
+            WHERE id = %s AND worker = %s AND status = 'running'
+        """, (retry_delay, error, job.id, worker))
+        self._fail_dependents()
+
+    def _fail_dependents(self):
+        """
+        Passe en failed les jobs en attente dont la dépendance a définitivement
+        échoué (en cascade : un job dépendant d'un job ainsi échoué suit)
+        """
+        while True:
+            self.cursor.execute("""
+                UPDATE pipeline_jobs j
+                SET status = 'failed',
+                    last_error = 'dependency job ' || p.id || ' failed',
+                    finished_at = CURRENT_TIMESTAMP
+                FROM pipeline_jobs p
+                WHERE j.status = 'pending'
+                  AND j.depends_on = p.id
+                  AND p.status = 'failed'
+            """)
+            if self.cursor.rowcount == 0:
+                return
+
+    def progress(self) -> List[tuple]:
+        """
+        Avancement de la file par repository et ressource
+
+        Returns:
+            Lignes (repo, resource, status, attempts, worker, last_error) du dernier job de chaque paire
+        """
+        self.cursor.execute("""
+            SELECT DISTINCT ON (repo, resource) repo, resource, status, attempts, worker, last_error
+            FROM pipeline_jobs
+            ORDER BY repo, resource, id DESC
+        """)
+        return self.cursor.fetchall()
+
+
+class Heartbeat(threading.Thread):
+    """Prolonge le bail d'un job à intervalle régulier, sur sa propre connexion"""
+
+    def __init__(self, queue: JobQueue, job: Job, worker: str):
+        super().__init__(daemon=True)
+        self.queue = JobQueue(**queue.conn_params, lease_seconds=queue.lease_seconds)
+        self.job = job
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        self.queue.conn = psycopg2.connect(**self.queue.conn_params)
+        self.queue.conn.autocommit = True
+        self.queue.cursor = self.queue.conn.cursor()
+        try:
+            while not self.stopped.wait(self.queue.lease_seconds / 3):
+                if not self.queue.heartbeat(self.job, self.worker):
+                    print(f"WARNING: Lost lease on job {self.job.id}")
+                    self.lost = True
+                    return
+        finally:
+            self.queue.conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job: Job, loader: DatabaseLoader, token: str, environments: List[str],
+            git_mirror_path: Optional[str] = None, heartbeat: Optional[Heartbeat] = None) -> str:
+    """
+    Extrait puis charge la ressource d'un job, dans les tables du repository du job
+
+    Args:
+        job: Job réclamé
+        loader: DatabaseLoader connecté
+        token: GitHub personal access token
+        environments: Environnements de déploiement extraits
+        git_mirror_path: Miroir git local pour l'historique des commits (optionnel)
+        heartbeat: Heartbeat du job, vérifié avant chaque chargement (optionnel)
+
+    Returns:
+        Résumé du chargement
+
+    Raises:
+        LeaseLost: si le bail a été perdu avant un chargement (rien n'est chargé ensuite)
+        RuntimeError: si le chargement a échoué (le job sera retenté)
+    """
+    from github_extractor import GitHubDataExtractor
+
+    def check_lease():
+        if heartbeat is not None and heartbeat.lost:
+            raise LeaseLost(f"lost lease on job {job.id}")
+
+    owner, repo = job.repo.split('/', 1)
+    extractor = GitHubDataExtractor(token, owner, repo)
+    loader.repo = job.repo
+    loader.last_error = None
+    # Rien d'antérieur à l'horizon de la rétention n'est ré-extrait
+    horizon = loader.retention_horizon()
+
+    if job.resource == 'deployments':
+        deployments = extractor.get_deployments(environments, since=horizon.deployments_before)
+        check_lease()
+        result = f"deployments {loader.load_deployments(deployments)}"
+
+    elif job.resource == 'commits':
+        # Les déploiements ont été chargés par le job dont celui-ci dépend
+        deployments = loader.get_deployments(environments)
+        commit_source = extractor
+        if git_mirror_path:
+            from git_mirror import LocalGitMirror
+
+            commit_source = LocalGitMirror(git_mirror_path, owner, repo, token=token)
+            commit_source.sync()
+        history = commit_source.get_commit_history(
+            deployments, skip_deployment_ids=loader.get_walked_deployment_ids(), since=horizon.deployments_before
+        )
+        check_lease()
+        commits = loader.load_commits(history['commits'])
+        check_lease()
+        links = loader.link_deployment_commits() + loader.load_deployment_commit_links(history['deployment_commits'])
+        check_lease()
+        # Marqués parcourus seulement si leurs commits et leurs liens sont en base
+        if loader.last_error is None:
+            loader.mark_history_walked(history['history_walks'])
+        result = f"commits {commits}, {links} links"
+
+    elif job.resource == 'incidents':
+        incidents = extractor.get_incidents(since=horizon.incidents_before)
+        check_lease()
+        result = f"incidents {loader.load_incidents(incidents)}"
+
+    else:
+        raise ValueError(f"Unknown resource: {job.resource}")
+
+    if loader.last_error is not None:
+        raise RuntimeError(f"load failed: {loader.last_error}")
+    return result
+
+
+def work(queue: JobQueue, loader: DatabaseLoader, token: str, environments: List[str],
+         git_mirror_path: Optional[str] = None, once: bool = False):
+    """
+    Boucle d'un worker : réclame et exécute les jobs jusqu'à épuisement de la file
+    (once) ou indéfiniment
+
+    Args:
+        queue: JobQueue connectée
+        loader: DatabaseLoader connecté
+        token: GitHub personal access token
+        environments: Environnements de déploiement extraits
+        git_mirror_path: Miroir git local pour l'historique des commits (optionnel)
+        once: S'arrête quand aucun job n'est disponible
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker} started")
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if once:
+                print("No job available, stopping.")
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        print(f"Job {job.id}: {job.resource} for {job.repo} (attempt {job.attempts}/{job.max_attempts})")
+        heartbeat = Heartbeat(queue, job, worker)
+        heartbeat.start()
+        try:
+            result = run_job(job, loader, token, environments, git_mirror_path, heartbeat)
+        except LeaseLost as e:
+            # Le job appartient à un autre worker : ni échec ni succès enregistré
+            loader.conn.rollback()
+            heartbeat.stop()
+            print(f"Job {job.id} abandoned: {e}")
+            continue
+        except Exception as e:
+            loader.conn.rollback()
+            heartbeat.stop()
+            print(f"Job {job.id} failed: {e}")
+            queue.fail(job, worker, str(e))
+            continue
+
+        heartbeat.stop()
+        if heartbeat.lost:
+            print(f"Job {job.id} abandoned: lost lease on job {job.id}")
+            continue
+        queue.complete(job, worker, result)
+        print(f"Job {job.id} done: {result}")
+
+
+def main():
+    """Fonction principale"""
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="Distributed DORA extraction job queue")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    enqueue = subparsers.add_parser('enqueue', help="Enqueue extraction jobs for repositories")
+    enqueue.add_argument('--repo', action='append',
+                         help="Repository (owner/name), repeatable; default: GITHUB_OWNER/GITHUB_REPO")
+    enqueue.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    worker = subparsers.add_parser('worker', help="Claim and run jobs")
+    worker.add_argument('--once', action='store_true', help="Stop when no job is available")
+    subparsers.add_parser('progress', help="Show job progress")
+    args = parser.parse_args()
+
+    db_params = config.db_params()
+    queue = JobQueue(*db_params, lease_seconds=int(os.getenv('DORA_JOB_LEASE', LEASE_SECONDS)))
+    loader = DatabaseLoader(*db_params)
+
+    try:
+        loader.connect()
+        queue.connect()
+
+        if args.command == 'enqueue':
+            repos = args.repo or [config.repository()]
+            if not all(repos):
+                print("Please pass --repo or set GITHUB_OWNER and GITHUB_REPO in .env file")
+                sys.exit(1)
+            print(f"Enqueued {queue.enqueue(repos, args.max_attempts)} jobs for {len(repos)} repositories")
+
+        elif args.command == 'worker':
+            token, _, _ = config.github_settings()
+            if not token:
+                print("Please set GITHUB_TOKEN in .env file")
+                sys.exit(1)
+            work(queue, loader, token, config.environments(), os.getenv('GIT_MIRROR_PATH'), once=args.once)
+
+        else:
+            rows = queue.progress()
+            print("=" * 70)
+            print(f"{'repository':<30} {'resource':<12} {'status':<8} {'tries':>5}  worker")
+            print("=" * 70)
+            for repo, resource, status, attempts, worker_id, last_error in rows:
+                print(f"{repo:<30} {resource:<12} {status:<8} {attempts:>5}  {worker_id or '-'}")
+                if last_error and status != 'done':
+                    print(f"{'':<30} last error: {last_error}")
+            done = sum(1 for row in rows if row[2] == 'done')
+            print("=" * 70)
+            print(f"{done}/{len(rows)} jobs done")
+    finally:
+        queue.disconnect()
+        loader.disconnect()
+
+
+if __name__ == "__main__":
+    main()
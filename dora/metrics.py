@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Calcul vectorisé des métriques DORA en Python (NumPy)
+
+Les métriques sont calculées sur des colonnes (tableaux de dates et de statuts)
+au lieu d'un aller-retour SQL par métrique. Les colonnes peuvent venir :
+- directement de l'extraction (GitHubDataExtractor.extract_all_data())
+- de la base de données (PostgreSQL ou SQLite), lue par lots
+- de fichiers Parquet (pyarrow requis)
+
+Mêmes définitions que MetricsExporter.export_summary() : fenêtre de 28 jours
+à partir de CURRENT_DATE, CFR = déploiements failure/error sur le total.
+
+Usage:
+    python metrics.py            # affiche le résumé calculé depuis la base
+    python metrics.py --validate # compare avec le résumé SQL de l'exporteur
+"""
+
+import os
+import csv
+import sys
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from typing import NamedTuple, Dict, List, Optional, Sequence
+import numpy as np
+
+WINDOW_DAYS = 28
+FAILED_STATUSES = ('failure', 'error')
+FETCH_SIZE = 10000
+
+
+class MetricColumns(NamedTuple):
+    # Déploiements
+    deploy_created_at: np.ndarray
+    deploy_environment: np.ndarray
+    deploy_status: np.ndarray
+    # Paires déploiement / commit (lead time)
+    lead_deployed_at: np.ndarray
+    lead_committed_at: np.ndarray
+    lead_environment: np.ndarray
+    lead_status: np.ndarray
+    # Incidents (closed_at à NaT si ouvert)
+    incident_created_at: np.ndarray
+    incident_closed_at: np.ndarray
+    incident_state: np.ndarray
+
+
+def _to_datetime64(values: Sequence) -> np.ndarray:
+    """Convertit des dates (datetime, éventuellement aware, ou texte ISO) en datetime64[us] UTC naïf"""
+    converted = [
+        value.astimezone(timezone.utc).replace(tzinfo=None)
+        if isinstance(value, datetime) and value.tzinfo is not None else value
+        for value in values
+    ]
+    return np.array([value if value is not None else 'NaT' for value in converted], dtype='datetime64[us]')
+
+
+def columns_from_rows(deployments: List[tuple], leads: List[tuple], incidents: List[tuple]) -> MetricColumns:
+    """Construit les colonnes à partir de lignes (created_at, environment, status), ..."""
+    def column(rows, index, kind):
+        values = [row[index] for row in rows]
+        return _to_datetime64(values) if kind == 'time' else np.array(values, dtype=object)
+
+    return MetricColumns(
+        deploy_created_at=column(deployments, 0, 'time'),
+        deploy_environment=column(deployments, 1, 'text'),
+        deploy_status=column(deployments, 2, 'text'),
+        lead_deployed_at=column(leads, 0, 'time'),
+        lead_committed_at=column(leads, 1, 'time'),
+        lead_environment=column(leads, 2, 'text'),
+        lead_status=column(leads, 3, 'text'),
+        incident_created_at=column(incidents, 0, 'time'),
+        incident_closed_at=column(incidents, 1, 'time'),
+        incident_state=column(incidents, 2, 'text')
+    )
+
+
+def columns_from_records(data: Dict[str, list]) -> MetricColumns:
+    """
+    Construit les colonnes depuis le résultat de l'extraction
+
+    Args:
+        data: Dictionnaire de GitHubDataExtractor.extract_all_data()
+
+    Returns:
+        Colonnes des métriques
+    """
+    deployments = {d.deployment_id: d for d in data.get('deployments', [])}
+    commits = {c.sha: c for c in data.get('commits', [])}
+
+    # Même liaison que la base : SHA déployé + historique des déploiements
+    links = {(d.deployment_id, d.sha) for d in deployments.values() if d.sha in commits}
+    links.update((link.deployment_id, link.sha) for link in data.get('deployment_commits', [])
+                 if link.deployment_id in deployments and link.sha in commits)
+
+    leads = []
+    for deployment_id, sha in links:
+        deployment = deployments[deployment_id]
+        leads.append((deployment.created_at, commits[sha].committed_date, deployment.environment, deployment.status))
+
+    return columns_from_rows(
+        [(d.created_at, d.environment, d.status) for d in deployments.values()],
+        leads,
+        [(i.created_at, i.closed_at, i.state) for i in data.get('incidents', [])]
+    )
+
+
+def columns_from_database(cursor, repo: str = '', placeholder: str = '%s') -> MetricColumns:
+    """
+    Lit les colonnes d'un repository depuis la base (curseur psycopg2 ou sqlite3), par lots
+
+    Args:
+        cursor: Curseur ouvert sur la base DORA
+        repo: Repository lu (owner/name)
+        placeholder: Marqueur de paramètre du driver ('%s' ou '?')
+
+    Returns:
+        Colonnes des métriques
+    """
+    def fetch(query):
+        cursor.execute(query.format(p=placeholder), (repo,))
+        rows = []
+        while True:
+            batch = cursor.fetchmany(FETCH_SIZE)
+            if not batch:
+                return rows
+            rows.extend(tuple(row) for row in batch)
+
+    return columns_from_rows(
+        fetch("SELECT created_at, environment, status FROM deployments WHERE repo = {p}"),
+        fetch("""
+            SELECT d.created_at, c.committed_date, d.environment, d.status
+            FROM deployments d
+            JOIN deployment_commits dc ON d.id = dc.deployment_id
+            JOIN changes c ON dc.commit_id = c.id
+            WHERE d.repo = {p}
+        """),
+        fetch("SELECT created_at, closed_at, state FROM incidents WHERE repo = {p}")
+    )
+
+
+def columns_to_parquet(columns: MetricColumns, path: str):
+    """Écrit les colonnes dans un fichier Parquet par groupe (deployments, lead_times, incidents)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(path, exist_ok=True)
+    groups = {'deployments': 'deploy_', 'lead_times': 'lead_', 'incidents': 'incident_'}
+    for name, prefix in groups.items():
+        table = pa.table({
+            field[len(prefix):]: getattr(columns, field).tolist()
+            for field in MetricColumns._fields if field.startswith(prefix)
+        })
+        pq.write_table(table, os.path.join(path, f"{name}.parquet"))
+
+
+def columns_from_parquet(path: str) -> MetricColumns:
+    """Lit les colonnes écrites par columns_to_parquet()"""
+    import pyarrow.parquet as pq
+
+    values = {}
+    groups = {'deployments': 'deploy_', 'lead_times': 'lead_', 'incidents': 'incident_'}
+    for name, prefix in groups.items():
+        table = pq.read_table(os.path.join(path, f"{name}.parquet"))
+        for column in table.column_names:
+            array = table.column(column).to_numpy(zero_copy_only=False)
+            if np.issubdtype(array.dtype, np.datetime64):
+                array = array.astype('datetime64[us]')
+            else:
+                array = array.astype(object)
+            values[prefix + column] = array
+    return MetricColumns(**values)
+
+
+def concat_columns(batches: List[MetricColumns]) -> MetricColumns:
+    """Concatène plusieurs lots de colonnes (ex: agrégation multi-repositories)"""
+    return MetricColumns(*(np.concatenate(arrays) for arrays in zip(*batches)))
+
+
+def window_start(now: Optional[datetime] = None, days: int = WINDOW_DAYS) -> np.datetime64:
+    """Début de la fenêtre glissante, comme CURRENT_DATE - INTERVAL '28 days'"""
+    now = now or datetime.now(timezone.utc)
+    return np.datetime64(now.date(), 'us') - np.timedelta64(days, 'D')
+
+
+def _hours(delta: np.ndarray) -> np.ndarray:
+    return delta.astype('timedelta64[us]').astype(np.float64) / 3.6e9
+
+
+def deployment_frequency(columns: MetricColumns, environment: str = "production",
+                         now: Optional[datetime] = None) -> Dict[str, float]:
+    """Fréquence de déploiement : déploiements réussis sur la fenêtre"""
+    mask = ((columns.deploy_status == 'success')
+            & (columns.deploy_environment == environment)
+            & (columns.deploy_created_at >= window_start(now)))
+    total = int(np.count_nonzero(mask))
+    return {
+        'total_deployments': total,
+        'deployments_per_day': total / WINDOW_DAYS,
+        'deployments_per_week': total / (WINDOW_DAYS / 7)
+    }
+
+
+def lead_time(columns: MetricColumns, environment: str = "production", now: Optional[datetime] = None,
+              percentiles: Sequence[float] = (50, 90, 99)) -> Dict[str, Optional[float]]:
+    """Lead time for changes : moyenne et percentiles (interpolation linéaire, comme PERCENTILE_CONT)"""
+    mask = ((columns.lead_status == 'success')
+            & (columns.lead_environment == environment)
+            & (columns.lead_deployed_at >= window_start(now)))
+    hours = _hours(columns.lead_deployed_at[mask] - columns.lead_committed_at[mask])
+
+    result = {'total_changes': int(hours.size), 'avg_hours': float(hours.mean()) if hours.size else None}
+    quantiles = np.percentile(hours, percentiles) if hours.size else [None] * len(percentiles)
+    for percentile, value in zip(percentiles, quantiles):
+        result[f"p{percentile:g}_hours"] = float(value) if value is not None else None
+    return result
+
+
+def change_failure_rate(columns: MetricColumns, environment: str = "production",
+                        now: Optional[datetime] = None) -> Dict[str, float]:
+    """Taux d'échec : déploiements failure/error sur le total de la fenêtre"""
+    mask = (columns.deploy_environment == environment) & (columns.deploy_created_at >= window_start(now))
+    total = int(np.count_nonzero(mask))
+    failed = int(np.count_nonzero(mask & np.isin(columns.deploy_status, FAILED_STATUSES)))
+    return {
+        'total_deployments': total,
+        'failed_deployments': failed,
+        'failure_percentage': failed * 100 / total if total else 0.0
+    }
+
+
+def mttr(columns: MetricColumns, now: Optional[datetime] = None) -> Dict[str, Optional[float]]:
+    """Temps de récupération des incidents fermés ouverts dans la fenêtre"""
+    mask = ((columns.incident_state == 'closed')
+            & ~np.isnat(columns.incident_closed_at)
+            & (columns.incident_created_at >= window_start(now)))
+    hours = _hours(columns.incident_closed_at[mask] - columns.incident_created_at[mask])
+    return {
+        'total_resolved_incidents': int(hours.size),
+        'avg_hours': float(hours.mean()) if hours.size else None,
+        'median_hours': float(np.median(hours)) if hours.size else None
+    }
+
+
+def compute_summary(columns: MetricColumns, environment: str = "production",
+                    now: Optional[datetime] = None) -> Dict[str, Optional[float]]:
+    """
+    Résumé des 4 métriques, mêmes colonnes que dora_metrics_summary.csv
+
+    Args:
+        columns: Colonnes des métriques
+        environment: Environnement de déploiement
+        now: Date de référence (par défaut: maintenant)
+
+    Returns:
+        Dictionnaire des métriques (valeurs non arrondies)
+    """
+    df = deployment_frequency(columns, environment, now)
+    lt = lead_time(columns, environment, now)
+    return {
+        'deployment_frequency_total': df['total_deployments'],
+        'deployment_frequency_per_day': df['deployments_per_day'],
+        'lead_time_avg_hours': lt['avg_hours'],
+        'change_failure_rate_percent': change_failure_rate(columns, environment, now)['failure_percentage'],
+        'mttr_avg_hours': mttr(columns, now)['avg_hours']
+    }
+
+
+def validate_against_sql(columns: MetricColumns, exporter, environment: str = "production",
+                         tolerance: float = 0.011) -> List[str]:
+    """
+    Compare le résumé calculé au résumé SQL de l'exporteur
+
+    Args:
+        columns: Colonnes lues depuis la même base
+        exporter: MetricsExporter (ou SQLiteMetricsExporter) connecté
+        environment: Environnement comparé
+        tolerance: Écart toléré (le SQL arrondit à 2 décimales)
+
+    Returns:
+        Liste des écarts (vide si les résultats concordent)
+    """
+    output_dir = tempfile.mkdtemp(prefix='dora_validate_')
+    exporter.export_summary(output_dir, environment)
+    filename = exporter._metric_filename(output_dir, "metrics_summary", environment)
+    with open(filename, newline='', encoding='utf-8') as f:
+        expected = next(csv.DictReader(f))
+
+    mismatches = []
+    for name, value in compute_summary(columns, environment).items():
+        sql_value = float(expected[name]) if expected[name] not in ('', None) else None
+        if value is None or sql_value is None:
+            if value != sql_value:
+                mismatches.append(f"{name}: python={value} sql={sql_value}")
+        elif abs(value - sql_value) > tolerance:
+            mismatches.append(f"{name}: python={value:.4f} sql={sql_value}")
+    return mismatches
+
+
+def main():
+    """Fonction principale"""
+    import config
+
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="Compute DORA metrics in-process")
+    parser.add_argument('--environment', default='production')
+    parser.add_argument('--validate', action='store_true', help="Compare with the SQL summary")
+    args = parser.parse_args()
+
+    if config.use_sqlite():
+        from sqlite_backend import SQLiteMetricsExporter
+
+        exporter = SQLiteMetricsExporter(config.sqlite_path(), repo=config.repository())
+    else:
+        from export_metrics import MetricsExporter
+
+        exporter = MetricsExporter(*config.db_params(), repo=config.repository())
+
+    try:
+        exporter.connect()
+        columns = columns_from_database(exporter.conn.cursor(), exporter.repo, exporter.dialect.placeholder)
+
+        print("=" * 70)
+        print(f"DORA metrics (last {WINDOW_DAYS} days, {args.environment}) computed in-process")
+        print("=" * 70)
+        for name, value in compute_summary(columns, args.environment).items():
+            print(f"  {name:<32} {value if value is None else round(value, 2)}")
+
+        if args.validate:
+            mismatches = validate_against_sql(columns, exporter, args.environment)
+            print("=" * 70)
+            if mismatches:
+                print("Validation FAILED:")
+                for mismatch in mismatches:
+                    print(f"  - {mismatch}")
+                sys.exit(1)
+            print("Validation passed: results match the SQL summary")
+        print("=" * 70)
+    finally:
+        exporter.disconnect()
+
+
+if __name__ == "__main__":
+    main()
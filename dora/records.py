@@ -0,0 +1,119 @@
+"""
+Types d'enregistrements compacts échangés entre l'extraction et le chargement
+
+Les champs suivent l'ordre des colonnes des INSERT de DatabaseLoader : les
+enregistrements sont passés tels quels à execute_values, sans reconstruction.
+"""
+
+import sys
+from datetime import date, datetime, timezone
+from typing import NamedTuple, List, Optional
+
+# Longueur maximale conservée pour les messages de commit et descriptions
+MAX_MESSAGE_LENGTH = 1000
+
+# Statuts acceptés par la contrainte chk_status de la table deployments
+DEPLOYMENT_STATUSES = ('pending', 'success', 'failure', 'error', 'inactive')
+
+
+def truncate_text(text: Optional[str], limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """Tronque un texte long (messages de commit, descriptions)"""
+    if not text:
+        return ''
+    return text if len(text) <= limit else text[:limit]
+
+
+def intern_text(text: Optional[str]) -> str:
+    """Internalise une chaîne très répétée (auteurs, environnements, statuts)"""
+    return sys.intern(text) if text else ''
+
+
+def utc_day(value: datetime) -> date:
+    """Jour UTC d'une date (celui de created_at::date en base)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+class DeploymentRecord(NamedTuple):
+    deployment_id: int
+    sha: str
+    environment: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    description: str
+
+    @classmethod
+    def create(cls, deployment_id: int, sha: str, environment: str, status: str,
+               created_at: datetime, updated_at: datetime, description: Optional[str]) -> 'DeploymentRecord':
+        """Construit un déploiement en internalisant les valeurs répétées"""
+        # queued / in_progress (statuts GitHub intermédiaires) sont stockés comme pending
+        if status not in DEPLOYMENT_STATUSES:
+            status = 'pending'
+        return cls(deployment_id, sha, intern_text(environment), intern_text(status),
+                   created_at, updated_at, truncate_text(description))
+
+
+class CommitRecord(NamedTuple):
+    sha: str
+    committed_date: datetime
+    author: str
+    message: str
+
+    @classmethod
+    def create(cls, sha: str, committed_date: datetime, author: Optional[str],
+               message: Optional[str]) -> 'CommitRecord':
+        """Construit un commit avec un message tronqué et un auteur internalisé"""
+        return cls(sha, committed_date, intern_text(author or 'Unknown'), truncate_text(message))
+
+
+class IncidentRecord(NamedTuple):
+    issue_number: int
+    title: str
+    state: str
+    created_at: datetime
+    closed_at: Optional[datetime]
+    labels: List[str]
+    assignees: List[str]
+
+    @classmethod
+    def create(cls, issue_number: int, title: str, state: str, created_at: datetime,
+               closed_at: Optional[datetime], labels: List[str], assignees: List[str]) -> 'IncidentRecord':
+        """Construit un incident en internalisant état, labels et assignés"""
+        return cls(issue_number, title, intern_text(state), created_at, closed_at,
+                   [intern_text(label) for label in labels],
+                   [intern_text(assignee) for assignee in assignees])
+
+
+class DeploymentCommitRecord(NamedTuple):
+    deployment_id: int
+    sha: str
+
+
+class HistoryWalkRecord(NamedTuple):
+    """Déploiement dont l'historique a été parcouru (même sans nouveau commit)"""
+    deployment_id: int
+    commit_count: int
+
+
+class RetentionHorizon(NamedTuple):
+    """Jours avant lesquels la rétention a replié puis purgé les lignes d'un repository"""
+    deployments_before: Optional[date] = None
+    incidents_before: Optional[date] = None
+
+
+class LoadResult(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+
+    @property
+    def written(self) -> int:
+        """Nombre de lignes effectivement écrites (insérées ou modifiées)"""
+        return self.inserted + self.updated
+
+    def __str__(self) -> str:
+        summary = f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged"
+        return summary + (f", {self.rejected} rejected" if self.rejected else "")
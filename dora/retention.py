@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Rétention des données brutes et compaction en agrégats journaliers long terme
+
+Les tables brutes (deployments, deployment_commits, changes, incidents) ne
+gardent que les N derniers jours (180 par défaut). Avant la purge, les lignes
+plus anciennes du repository sont repliées, jour par jour, en :
+- une ligne daily_rollups par (jour, environnement) : déploiements totaux,
+  réussis et en échec (DF, CFR), nombre et somme des lead times
+- une ligne daily_rollups par jour sous l'environnement 'all' : incidents
+  ouverts et résolus, somme des temps de rétablissement (MTTR)
+- les sketches t-digest journaliers du lead time et du MTTR (metric_sketches)
+  pour garder les percentiles
+
+Le repli et la purge se font dans une seule transaction, tables brutes
+verrouillées en écriture : un chargement concurrent attend la fin de la purge.
+Un jour replié est définitif : l'horizon de la rétention (retention_horizons)
+arrête l'extraction, le chargement écarte les lignes des jours repliés et
+SketchStore.build ne recalcule pas leurs sketches.
+Les jours ayant encore un incident ouvert ne sont repliés qu'une fois tous
+leurs incidents fermés.
+
+La vue daily_metric_inputs réunit les agrégats et les tables brutes pour
+calculer les tendances sur tout l'historique.
+
+Usage:
+    python retention.py run [--days 180] [--incident-days 180] [--dry-run]
+    python retention.py trends [--months 12] [--environment production]
+"""
+
+import os
+import argparse
+from typing import NamedTuple
+import psycopg2
+import config
+from metrics import columns_from_rows
+from sketches import DEFAULT_COMPRESSION, ALL_ENVIRONMENTS, daily_sketches, save_sketches
+
+RAW_RETENTION_DAYS = 180
+
+
+class RetentionPolicy(NamedTuple):
+    # Jours de déploiements (et de leurs liens et commits) gardés dans les tables brutes
+    raw_days: int = RAW_RETENTION_DAYS
+    # Jours d'incidents gardés dans les tables brutes
+    incident_days: int = RAW_RETENTION_DAYS
+
+
+class RetentionResult(NamedTuple):
+    deployment_days: int = 0
+    incident_days: int = 0
+    sketches: int = 0
+    deployments: int = 0
+    changes: int = 0
+    incidents: int = 0
+
+
+# Agrégats par (jour, environnement) des déploiements antérieurs à la date limite ;
+# les jours déjà repliés ne sont pas recomptés
+FOLD_DEPLOYMENTS_QUERY = """
+    INSERT INTO daily_rollups (repo, day, environment, deployments_total, deployments_success,
+                               deployments_failed, lead_time_count, lead_time_sum_hours)
+    SELECT
+        d.repo,
+        d.created_at::date,
+        d.environment,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE d.status = 'success'),
+        COUNT(*) FILTER (WHERE d.status IN ('failure', 'error')),
+        COALESCE(SUM(lt.lead_time_count), 0),
+        COALESCE(SUM(lt.lead_time_sum_hours), 0)
+    FROM deployments d
+    LEFT JOIN (
+        SELECT
+            dc.deployment_id,
+            COUNT(*) as lead_time_count,
+            SUM(EXTRACT(EPOCH FROM (d2.created_at - c.committed_date)) / 3600) as lead_time_sum_hours
+        FROM deployment_commits dc
+        JOIN deployments d2 ON d2.id = dc.deployment_id
+        JOIN changes c ON c.id = dc.commit_id
+        WHERE d2.repo = %(repo)s AND d2.status = 'success' AND d2.created_at < %(cutoff)s
+        GROUP BY dc.deployment_id
+    ) lt ON lt.deployment_id = d.id
+    WHERE d.repo = %(repo)s AND d.created_at < %(cutoff)s
+    GROUP BY d.repo, d.created_at::date, d.environment
+    ON CONFLICT (repo, day, environment) DO NOTHING
+    RETURNING day, environment
+"""
+
+# Agrégats par jour des incidents antérieurs à la date limite, pour les jours
+# dont tous les incidents sont fermés
+FOLD_INCIDENTS_QUERY = """
+    INSERT INTO daily_rollups (repo, day, environment, incidents_opened, incidents_resolved, recovery_sum_hours)
+    SELECT
+        repo,
+        created_at::date,
+        %(all)s,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE closed_at IS NOT NULL),
+        COALESCE(SUM(EXTRACT(EPOCH FROM (closed_at - created_at)) / 3600)
+            FILTER (WHERE closed_at IS NOT NULL), 0)
+    FROM incidents
+    WHERE repo = %(repo)s AND created_at < %(cutoff)s
+    GROUP BY repo, created_at::date
+    HAVING COUNT(*) FILTER (WHERE state = 'open') = 0
+    ON CONFLICT (repo, day, environment) DO NOTHING
+    RETURNING day
+"""
+
+LEAD_TIME_ROWS_QUERY = """
+    SELECT d.created_at, c.committed_date, d.environment, d.status
+    FROM deployments d
+    JOIN deployment_commits dc ON d.id = dc.deployment_id
+    JOIN changes c ON dc.commit_id = c.id
+    WHERE d.repo = %(repo)s AND d.status = 'success' AND d.created_at < %(cutoff)s
+"""
+
+INCIDENT_ROWS_QUERY = """
+    SELECT created_at, closed_at, state
+    FROM incidents
+    WHERE repo = %(repo)s AND state = 'closed' AND created_at < %(cutoff)s
+"""
+
+# Horizon du repository, jamais reculé (une politique plus longue ne ramène pas les lignes purgées)
+RECORD_HORIZON_QUERY = """
+    INSERT INTO retention_horizons (repo, deployments_before, incidents_before)
+    VALUES (%(repo)s, %(raw_cutoff)s, %(incident_cutoff)s)
+    ON CONFLICT (repo) DO UPDATE SET
+        deployments_before = GREATEST(retention_horizons.deployments_before, EXCLUDED.deployments_before),
+        incidents_before = GREATEST(retention_horizons.incidents_before, EXCLUDED.incidents_before),
+        updated_at = clock_timestamp()
+"""
+
+# Incidents fermés des jours repliés (y compris lors d'un passage précédent)
+PRUNE_INCIDENTS_QUERY = """
+    DELETE FROM incidents i
+    USING daily_rollups r
+    WHERE i.repo = %(repo)s
+      AND i.created_at < %(cutoff)s
+      AND i.state = 'closed'
+      AND r.repo = i.repo
+      AND r.day = i.created_at::date
+      AND r.environment = %(all)s
+"""
+
+# Les incidents gardés ne doivent plus référencer les déploiements purgés
+DETACH_INCIDENTS_QUERY = """
+    UPDATE incidents SET deploy_id = NULL
+    WHERE deploy_id IN (SELECT id FROM deployments WHERE repo = %(repo)s AND created_at < %(cutoff)s)
+"""
+
+# Supprime aussi les liens deployment_commits (ON DELETE CASCADE)
+PRUNE_DEPLOYMENTS_QUERY = """
+    DELETE FROM deployments WHERE repo = %(repo)s AND created_at < %(cutoff)s
+"""
+
+# Commits anciens qui ne sont plus liés à aucun déploiement gardé
+PRUNE_CHANGES_QUERY = """
+    DELETE FROM changes c
+    WHERE c.repo = %(repo)s
+      AND c.committed_date < %(cutoff)s
+      AND NOT EXISTS (SELECT 1 FROM deployment_commits dc WHERE dc.commit_id = c.id)
+"""
+
+TRENDS_QUERY = """
+    SELECT
+        month,
+        SUM(deployments_success) FILTER (WHERE environment = %(environment)s) as deployments,
+        SUM(deployments_success) FILTER (WHERE environment = %(environment)s)
+            / MAX(LEAST(month + INTERVAL '1 month', CURRENT_DATE + 1)::date - month) as deployments_per_day,
+        SUM(lead_time_sum_hours) FILTER (WHERE environment = %(environment)s)
+            / NULLIF(SUM(lead_time_count) FILTER (WHERE environment = %(environment)s), 0) as lead_time_avg_hours,
+        100.0 * SUM(deployments_failed) FILTER (WHERE environment = %(environment)s)
+            / NULLIF(SUM(deployments_total) FILTER (WHERE environment = %(environment)s), 0)
+            as change_failure_rate_percent,
+        SUM(recovery_sum_hours) / NULLIF(SUM(incidents_resolved), 0) as mttr_avg_hours
+    FROM (
+        SELECT date_trunc('month', day)::date as month, *
+        FROM daily_metric_inputs
+        WHERE repo = %(repo)s
+          AND day >= date_trunc('month', CURRENT_DATE) - make_interval(months => %(months)s - 1)
+    ) inputs
+    GROUP BY month
+    ORDER BY month
+"""
+
+
+class RetentionJob:
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str):
+        """
+        Initialise la connexion à la base de données PostgreSQL
+
+        Args:
+            host: Hôte de la base de données
+            port: Port de la base de données
+            dbname: Nom de la base de données
+            user: Nom d'utilisateur
+            password: Mot de passe
+        """
+        self.conn_params = {
+            'host': host,
+            'port': port,
+            'dbname': dbname,
+            'user': user,
+            'password': password
+        }
+        self.conn = None
+        self.cursor = None
+
+    def connect(self):
+        """Établit la connexion à la base de données"""
+        try:
+            print("Connecting to PostgreSQL database...")
+            self.conn = psycopg2.connect(**self.conn_params)
+            self.cursor = self.conn.cursor()
+            print("Connection established successfully!")
+        except psycopg2.Error as e:
+            print(f"Error connecting to database: {e}")
+            raise
+
+    def disconnect(self):
+        """Ferme la connexion à la base de données"""
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
+            print("Database connection closed.")
+
+    def _fetch(self, query: str, params: dict) -> list:
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    def fold_and_prune(self, policy: RetentionPolicy, repo: str,
+                       compression: int = DEFAULT_COMPRESSION, dry_run: bool = False) -> RetentionResult:
+        """
+        Replie les lignes antérieures à la politique de rétention en agrégats
+        journaliers et en sketches, puis les purge, dans une seule transaction
+
+        Args:
+            policy: Politique de rétention
+            repo: Repository replié et purgé (owner/name)
+            compression: Paramètre δ du t-digest
+            dry_run: Annule la transaction après avoir compté ce qui serait replié et purgé
+
+        Returns:
+            Jours repliés, sketches enregistrés et lignes purgées
+        """
+        try:
+            self.cursor.execute("LOCK TABLE deployments, deployment_commits, changes, incidents "
+                                "IN SHARE ROW EXCLUSIVE MODE")
+            self.cursor.execute("SELECT CURRENT_DATE - %s, CURRENT_DATE - %s",
+                                (policy.raw_days, policy.incident_days))
+            raw_cutoff, incident_cutoff = self.cursor.fetchone()
+            raw = {'cutoff': raw_cutoff, 'repo': repo}
+            incident = {'cutoff': incident_cutoff, 'all': ALL_ENVIRONMENTS, 'repo': repo}
+
+            # Repli : seuls les jours nouvellement agrégés reçoivent des sketches
+            deployment_days = set(self._fetch(FOLD_DEPLOYMENTS_QUERY, raw))
+            incident_days = {day for (day,) in self._fetch(FOLD_INCIDENTS_QUERY, incident)}
+
+            sketch_rows = []
+            if deployment_days or incident_days:
+                columns = columns_from_rows(
+                    [],
+                    self._fetch(LEAD_TIME_ROWS_QUERY, raw) if deployment_days else [],
+                    self._fetch(INCIDENT_ROWS_QUERY, incident) if incident_days else []
+                )
+                sketch_rows = [
+                    row for row in daily_sketches(columns, repo, compression)
+                    if (row[2] == 'lead_time' and (row[1], row[3]) in deployment_days)
+                    or (row[2] == 'mttr' and row[1] in incident_days)
+                ]
+                save_sketches(self.cursor, sketch_rows)
+
+            # Purge
+            self.cursor.execute(RECORD_HORIZON_QUERY, {'repo': repo, 'raw_cutoff': raw_cutoff,
+                                                       'incident_cutoff': incident_cutoff})
+            self.cursor.execute(PRUNE_INCIDENTS_QUERY, incident)
+            incidents = self.cursor.rowcount
+            self.cursor.execute(DETACH_INCIDENTS_QUERY, raw)
+            self.cursor.execute(PRUNE_DEPLOYMENTS_QUERY, raw)
+            deployments = self.cursor.rowcount
+            self.cursor.execute(PRUNE_CHANGES_QUERY, raw)
+            changes = self.cursor.rowcount
+
+            if dry_run:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+        except psycopg2.Error:
+            self.conn.rollback()
+            raise
+
+        return RetentionResult(
+            deployment_days=len(deployment_days),
+            incident_days=len(incident_days),
+            sketches=len(sketch_rows),
+            deployments=deployments,
+            changes=changes,
+            incidents=incidents
+        )
+
+    def trends(self, repo: str, months: int = 12, environment: str = "production") -> list:
+        """
+        Tendances mensuelles d'un repository sur tout l'historique (agrégats et tables brutes)
+
+        Args:
+            repo: Repository (owner/name)
+            months: Nombre de mois, mois en cours inclus
+            environment: Environnement des déploiements (le MTTR couvre tous les incidents)
+
+        Returns:
+            Lignes (mois, déploiements réussis, déploiements/jour, lead time moyen (h),
+            CFR (%), MTTR moyen (h))
+        """
+        return self._fetch(TRENDS_QUERY, {'months': months, 'environment': environment, 'repo': repo})
+
+
+def _format(value, digits: int = 2) -> str:
+    return '-' if value is None else f"{float(value):.{digits}f}"
+
+
+def main():
+    """Fonction principale"""
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="Fold old raw rows into daily rollups and prune them")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help="Fold and prune raw rows older than the retention policy")
+    run.add_argument('--days', type=int, default=int(os.getenv('DORA_RETENTION_DAYS', RAW_RETENTION_DAYS)),
+                     help="Days of deployments, links and commits kept in the raw tables")
+    run.add_argument('--incident-days', type=int,
+                     default=int(os.getenv('DORA_INCIDENT_RETENTION_DAYS',
+                                           os.getenv('DORA_RETENTION_DAYS', RAW_RETENTION_DAYS))),
+                     help="Days of incidents kept in the raw tables")
+    run.add_argument('--compression', type=int, default=DEFAULT_COMPRESSION)
+    run.add_argument('--dry-run', action='store_true', help="Report what would be folded and pruned, then roll back")
+    trends = subparsers.add_parser('trends', help="Show monthly metrics over the full history")
+    trends.add_argument('--months', type=int, default=12)
+    trends.add_argument('--environment', default='production')
+    args = parser.parse_args()
+
+    job = RetentionJob(*config.db_params())
+
+    try:
+        job.connect()
+        if args.command == 'run':
+            policy = RetentionPolicy(raw_days=args.days, incident_days=args.incident_days)
+            result = job.fold_and_prune(policy, config.repository(), args.compression, args.dry_run)
+            print("=" * 70)
+            print(f"Retention ({policy.raw_days} days raw, {policy.incident_days} days incidents)"
+                  f"{' - dry run, rolled back' if args.dry_run else ''}")
+            print(f"  - Days folded: {result.deployment_days} deployment, {result.incident_days} incident")
+            print(f"  - Sketches stored: {result.sketches}")
+            print(f"  - Pruned: {result.deployments} deployments, {result.changes} commits, "
+                  f"{result.incidents} incidents")
+            print("=" * 70)
+        else:
+            rows = job.trends(config.repository(), args.months, args.environment)
+            print("=" * 78)
+            print(f"{'month':<10} {'deploys':>8} {'per day':>8} {'lead time (h)':>14} "
+                  f"{'CFR (%)':>8} {'MTTR (h)':>9}")
+            print("=" * 78)
+            for month, deployments, per_day, lead_time, failure_rate, mttr in rows:
+                print(f"{month:%Y-%m}    {deployments or 0:>8} {_format(per_day):>8} {_format(lead_time):>14} "
+                      f"{_format(failure_rate):>8} {_format(mttr):>9}")
+            print("=" * 78)
+    finally:
+        job.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,23 @@ Script principal pour exécuter le pipeline complet des métriques DORA
 
 Ce script:
 1. Extrait les données de GitHub (deployments, commits, incidents)
-2. Charge les données dans PostgreSQL
+2. Charge les données dans PostgreSQL (ou SQLite embarqué avec DORA_STORAGE=sqlite)
 3. Exporte les métriques DORA en CSV
+
+Chaque étape est enregistrée dans un répertoire de spool (DORA_SPOOL_DIR) :
+un run interrompu reprend à la dernière étape terminée.
 """
 
 import os
 import sys
-from dotenv import load_dotenv
-from github_extractor import GitHubDataExtractor
-from db_loader import DatabaseLoader
-from export_metrics import MetricsExporter
+from datetime import date
+from typing import Dict, List
+import config
+from checkpoint import PipelineCheckpoint, combine_fingerprints, directory_fingerprint
+from records import RetentionHorizon
+
+# Ressources extraites, spoolées entre les étapes
+RESOURCES = ['deployments', 'commits', 'deployment_commits', 'history_walks', 'incidents']
 
 
 def print_header(message: str):
@@ -28,13 +35,11 @@ def check_environment():
     required_vars = [
         'GITHUB_TOKEN',
         'GITHUB_OWNER',
-        'GITHUB_REPO',
-        'DB_HOST',
-        'DB_PORT',
-        'DB_NAME',
-        'DB_USER',
-        'DB_PASSWORD'
+        'GITHUB_REPO'
     ]
+    # Le backend SQLite embarqué n'a pas besoin de serveur PostgreSQL
+    if not config.use_sqlite():
+        required_vars += ['DB_HOST', 'DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASSWORD']
 
     missing = []
     for var in required_vars:
@@ -51,70 +56,192 @@ def check_environment():
     return True
 
 
-def main():
-    """Fonction principale"""
-    print_header("DORA Metrics Pipeline")
+def extract_step(loader, checkpoint: PipelineCheckpoint, environments: List[str]) -> Dict[str, list]:
+    """
+    Extrait les données GitHub (ou les relit depuis le spool d'un run interrompu)
 
-    # Charge les variables d'environnement
-    load_dotenv()
+    Args:
+        loader: Loader du backend configuré (déploiements déjà liés)
+        checkpoint: Points de reprise du run
+        environments: Environnements dont les déploiements sont extraits
 
-    # Vérifie l'environnement
-    if not check_environment():
-        sys.exit(1)
+    Returns:
+        Dictionnaire contenant deployments, commits, deployment_commits et incidents
+    """
+    from github_extractor import GitHubDataExtractor
+    from git_mirror import LocalGitMirror
 
-    # Configuration
-    github_token = os.getenv('GITHUB_TOKEN')
-    github_owner = os.getenv('GITHUB_OWNER')
-    github_repo = os.getenv('GITHUB_REPO')
+    github_token, github_owner, github_repo = config.github_settings()
 
-    db_host = os.getenv('DB_HOST')
-    db_port = int(os.getenv('DB_PORT'))
-    db_name = os.getenv('DB_NAME')
-    db_user = os.getenv('DB_USER')
-    db_password = os.getenv('DB_PASSWORD')
+    # Miroir git local optionnel : l'historique des commits est alors résolu sans l'API
+    git_mirror_path = os.getenv('GIT_MIRROR_PATH')
 
-    output_dir = "exports"
+    # Les déploiements dont l'historique a déjà été parcouru ne le sont pas à nouveau,
+    # et rien d'antérieur à l'horizon de la rétention n'est ré-extrait
+    try:
+        loader.connect()
+        walked_deployment_ids = loader.get_walked_deployment_ids()
+        horizon = loader.retention_horizon()
+    except Exception as e:
+        print(f"WARNING: Could not read already walked deployments: {e}")
+        walked_deployment_ids = set()
+        horizon = RetentionHorizon()
+    finally:
+        loader.disconnect()
 
-    # ÉTAPE 1: Extraction des données GitHub
-    print_header("Step 1: Extracting data from GitHub")
     try:
+        commit_source = None
+        if git_mirror_path:
+            commit_source = LocalGitMirror(git_mirror_path, github_owner, github_repo, token=github_token)
+            commit_source.sync()
+
         extractor = GitHubDataExtractor(github_token, github_owner, github_repo)
-        data = extractor.extract_all_data()
+        return extractor.extract_all_data(
+            skip_deployment_ids=walked_deployment_ids,
+            commit_source=commit_source,
+            checkpoint=checkpoint,
+            environments=environments,
+            horizon=horizon
+        )
     except Exception as e:
         print(f"ERROR: Failed to extract data from GitHub: {e}")
         sys.exit(1)
 
-    # ÉTAPE 2: Chargement des données dans PostgreSQL
-    print_header("Step 2: Loading data into PostgreSQL")
-    loader = DatabaseLoader(db_host, db_port, db_name, db_user, db_password)
+
+def load_step(loader, data: Dict[str, list], checkpoint: PipelineCheckpoint) -> str:
+    """
+    Charge les données extraites, sauf si ni elles ni la base n'ont changé depuis le dernier run
+
+    L'empreinte couvre les données extraites, l'identité de la base et l'état de
+    ses tables après le chargement : une base réinitialisée, remplacée ou modifiée
+    entre deux runs est rechargée.
+
+    Args:
+        loader: Loader du backend configuré
+        data: Données extraites
+        checkpoint: Points de reprise du run
+
+    Returns:
+        Empreinte des données chargées et de l'état de la base
+    """
+    if checkpoint.is_done('load'):
+        print("Data already loaded by the interrupted run, skipping.")
+        return checkpoint.step_fingerprint('load')
+
+    data_fingerprint = checkpoint.data_fingerprint(RESOURCES)
+
+    def load_fingerprint():
+        return combine_fingerprints(data_fingerprint, config.database_identity(), loader.table_state())
 
     try:
         loader.connect()
-        loader.load_all_data(data)
+        fingerprint = load_fingerprint()
+        if checkpoint.is_unchanged('load', fingerprint):
+            print("Extracted data and database unchanged since last run, skipping load.")
+        else:
+            if not loader.load_all_data(data, checkpoint=checkpoint):
+                raise RuntimeError("some tables failed to load")
+            fingerprint = load_fingerprint()
+        checkpoint.mark_done('load', fingerprint)
     except Exception as e:
         print(f"ERROR: Failed to load data into database: {e}")
+        print("Re-run the pipeline to resume from the last checkpoint.")
         sys.exit(1)
     finally:
         loader.disconnect()
 
+    return fingerprint
+
+
+def export_step(exporter, checkpoint: PipelineCheckpoint, load_fingerprint: str, output_dir: str,
+                environments: List[str], incremental: bool):
+    """
+    Exporte les métriques, sauf si rien n'a changé depuis l'export du jour
+
+    L'empreinte couvre les données chargées (et l'état de la base), la date du
+    jour (fenêtre glissante), les réglages d'export et l'état des fichiers
+    exportés : des CSV supprimés ou modifiés sont réécrits.
+
+    Args:
+        exporter: Exporteur du backend configuré
+        checkpoint: Points de reprise du run
+        load_fingerprint: Empreinte des données chargées
+        output_dir: Répertoire des CSV
+        environments: Environnements exportés
+        incremental: Exporte les détails du lead time et du MTTR en deltas
+    """
+    if checkpoint.is_done('export'):
+        print("Metrics already exported by the interrupted run, skipping.")
+        return
+
+    def export_fingerprint():
+        return combine_fingerprints(load_fingerprint, date.today().isoformat(), environments, incremental,
+                                    directory_fingerprint(output_dir))
+
+    fingerprint = export_fingerprint()
+    if checkpoint.is_unchanged('export', fingerprint):
+        print("Data, settings and exported files unchanged since today's last export, skipping export.")
+        checkpoint.mark_done('export', fingerprint)
+    else:
+        try:
+            exporter.connect()
+            if not exporter.export_all_metrics(output_dir, checkpoint=checkpoint, environments=environments,
+                                               incremental=incremental):
+                raise RuntimeError("some exports failed")
+            checkpoint.mark_done('export', export_fingerprint())
+        except Exception as e:
+            print(f"ERROR: Failed to export metrics: {e}")
+            print("Re-run the pipeline to resume from the last checkpoint.")
+            sys.exit(1)
+        finally:
+            exporter.disconnect()
+
+
+def main():
+    """Fonction principale"""
+    print_header("DORA Metrics Pipeline")
+
+    # Charge les variables d'environnement
+    config.load_env()
+
+    # Vérifie l'environnement
+    if not check_environment():
+        sys.exit(1)
+
+    _, github_owner, github_repo = config.github_settings()
+    loader, exporter, database = config.create_backend()
+
+    # Environnements extraits et exportés en une seule passe (ex: production,staging)
+    environments = config.environments()
+
+    output_dir = config.output_dir()
+    # Détails du lead time et du MTTR exportés en deltas plutôt que réécrits
+    incremental = config.flag('DORA_INCREMENTAL_EXPORTS')
+
+    # Points de reprise : un run interrompu reprend à la dernière étape terminée
+    checkpoint = PipelineCheckpoint(config.spool_dir())
+    if checkpoint.is_resuming():
+        print(f"Resuming interrupted run from checkpoint in {checkpoint.spool_dir}/")
+
+    # ÉTAPE 1: Extraction des données GitHub
+    print_header("Step 1: Extracting data from GitHub")
+    data = extract_step(loader, checkpoint, environments)
+
+    # ÉTAPE 2: Chargement des données dans PostgreSQL
+    print_header(f"Step 2: Loading data into {database}")
+    load_fingerprint = load_step(loader, data, checkpoint)
+
     # ÉTAPE 3: Export des métriques DORA
     print_header("Step 3: Exporting DORA metrics to CSV")
-    exporter = MetricsExporter(db_host, db_port, db_name, db_user, db_password)
+    export_step(exporter, checkpoint, load_fingerprint, output_dir, environments, incremental)
 
-    try:
-        exporter.connect()
-        exporter.export_all_metrics(output_dir)
-    except Exception as e:
-        print(f"ERROR: Failed to export metrics: {e}")
-        sys.exit(1)
-    finally:
-        exporter.disconnect()
+    checkpoint.finish_run()
 
     # Résumé final
     print_header("Pipeline Completed Successfully!")
     print("Results:")
     print(f"  - Data extracted from: {github_owner}/{github_repo}")
-    print(f"  - Data loaded into: {db_name} database")
+    print(f"  - Data loaded into: {database}")
     print(f"  - Metrics exported to: {output_dir}/")
     print("\nCSV files generated:")
     print("  - dora_metrics_summary.csv       (All metrics summary)")
@@ -122,6 +249,9 @@ def main():
     print("  - dora_lead_time.csv             (Lead time for changes)")
     print("  - dora_change_failure_rate.csv   (Change failure rate)")
     print("  - dora_mttr.csv                  (Mean time to recovery)")
+    for environment in environments:
+        if environment != "production":
+            print(f"  - dora_*_{environment}.csv  ({environment} environment)")
     print("\nYou can now analyze the metrics or visualize them!")
     print("=" * 70 + "\n")
 
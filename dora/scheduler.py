@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Planificateur adaptatif du pipeline DORA pour plusieurs repositories
+
+Au lieu d'un cron à intervalle fixe pour chaque repository, le démon :
+- sonde chaque repository à peu de frais (derniers déploiements et incidents
+  mis à jour : quelques requêtes) et ne lance le pipeline complet que
+  s'il y a eu de l'activité depuis la dernière sonde
+- maintient une moyenne mobile exponentielle (EWMA) de l'activité par heure :
+  les repositories actifs sont sondés souvent, les repositories calmes rarement
+- étire tous les intervalles quand le budget de rate limit GitHub s'épuise
+- ajoute une gigue aléatoire pour ne pas sonder tous les repositories en même temps
+- limite le nombre de pipelines simultanés
+
+Chaque repository a son spool et son répertoire d'export (exports/owner__name/),
+et ses lignes sont isolées en base par la colonne repo. La fraîcheur de chaque
+repository (âge de la dernière synchronisation réussie) est exportée dans
+exports/dora_freshness.csv à chaque tour.
+
+Usage:
+    DORA_REPOS=owner/api,owner/web python scheduler.py [--once]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
+from github import Github, GithubException
+import config
+
+STATE_FILE = 'scheduler_state.json'
+FRESHNESS_FILE = 'dora_freshness.csv'
+
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 6 * 3600
+# Fenêtre de lissage de l'activité : poids de la dernière mesure
+EWMA_ALPHA = 0.3
+# Gigue relative appliquée à chaque intervalle (±10 %)
+JITTER = 0.1
+# En dessous de cette fraction du quota restant, les intervalles sont étirés
+LOW_BUDGET = 0.2
+# Réserve de requêtes : en dessous, plus aucune sonde avant le reset du quota
+MIN_REMAINING = 100
+# Une synchronisation complète est forcée au-delà de cette ancienneté, même sans activité
+MAX_STALENESS = 24 * 3600
+CONCURRENCY = 2
+
+
+class AdaptiveScheduler:
+    def __init__(self, token: str, repos: List[str], spool_dir: str = ".dora_spool",
+                 output_dir: str = "exports", concurrency: int = CONCURRENCY,
+                 incident_label: str = "incident"):
+        """
+        Initialise le planificateur et relit l'état persisté
+
+        Args:
+            token: GitHub personal access token
+            repos: Repositories au format owner/name
+            spool_dir: Répertoire de l'état du planificateur et des spools par repository
+            output_dir: Répertoire du CSV de fraîcheur et des exports par repository
+            concurrency: Nombre maximum de pipelines simultanés
+            incident_label: Label des issues d'incident
+        """
+        self.github = Github(token, per_page=100)
+        self.repos = repos
+        self.spool_dir = spool_dir
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.incident_label = incident_label
+        self.lock = threading.Lock()
+        self.running = set()
+        os.makedirs(spool_dir, exist_ok=True)
+        self.state = self._read_state()
+
+    def _read_state(self) -> Dict[str, Dict[str, Any]]:
+        """Lit l'état persisté (activité, prochaine sonde, dernière synchronisation)"""
+        path = os.path.join(self.spool_dir, STATE_FILE)
+        state = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        for repo in self.repos:
+            state.setdefault(repo, {
+                'activity': 0.0,
+                'interval': MIN_INTERVAL,
+                'next_poll': None,
+                'last_probe': None,
+                'last_success': None,
+                'last_error': None
+            })
+        return state
+
+    def _write_state(self):
+        """Écrit l'état de façon atomique"""
+        path = os.path.join(self.spool_dir, STATE_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _rate_limiting(self) -> Tuple[int, int]:
+        """
+        Quota GitHub (restant, limite) ; (0, 0) s'il est inconnu : sans réponse
+        déjà reçue, PyGithub interroge l'API, qui peut être injoignable
+        """
+        try:
+            return self.github.rate_limiting
+        except Exception as e:
+            print(f"Rate limit unavailable: {type(e).__name__}")
+            return 0, 0
+
+    def budget_factor(self) -> float:
+        """
+        Facteur d'étirement des intervalles selon le quota GitHub restant
+
+        Lu dans les en-têtes de la dernière réponse de l'API (aucune requête).
+
+        Returns:
+            1 tant que le quota est confortable, jusqu'à 10 quand il s'épuise
+        """
+        remaining, limit = self._rate_limiting()
+        if limit <= 0 or remaining / limit >= LOW_BUDGET:
+            return 1.0
+        return min(10.0, LOW_BUDGET / max(remaining / limit, 0.01))
+
+    def seconds_until_budget(self) -> float:
+        """Secondes à attendre avant de sonder (0 si la réserve de requêtes est disponible)"""
+        remaining, limit = self._rate_limiting()
+        if limit <= 0 or remaining >= MIN_REMAINING:
+            return 0.0
+        return max(0.0, self.github.rate_limiting_resettime - time.time())
+
+    def probe(self, repo: str, since: datetime) -> int:
+        """
+        Sonde l'activité d'un repository depuis une date, en quelques requêtes
+
+        Compte les déploiements créés et les incidents mis à jour depuis since
+        (pages parcourues du plus récent au plus ancien).
+
+        Args:
+            repo: Repository au format owner/name
+            since: Date de la sonde précédente
+
+        Returns:
+            Nombre d'événements
+        """
+        github_repo = self.github.get_repo(repo)
+        events = 0
+
+        for deployment in github_repo.get_deployments():
+            if deployment.created_at <= since:
+                break
+            events += 1
+
+        for issue in github_repo.get_issues(state='all', labels=[self.incident_label], since=since):
+            events += 1
+
+        return events
+
+    def run_pipeline(self, repo: str) -> bool:
+        """
+        Lance le pipeline complet pour un repository (processus séparé, spool et
+        répertoire d'export dédiés)
+
+        Returns:
+            True si le pipeline s'est terminé sans erreur
+        """
+        owner, name = repo.split('/', 1)
+        env = dict(os.environ,
+                   GITHUB_OWNER=owner,
+                   GITHUB_REPO=name,
+                   DORA_SPOOL_DIR=os.path.join(self.spool_dir, f"{owner}__{name}"),
+                   DORA_OUTPUT_DIR=os.path.join(self.output_dir, f"{owner}__{name}"))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_dora_pipeline.py')
+        result = subprocess.run([sys.executable, script], env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[{repo}] pipeline failed:\n{result.stdout[-2000:]}{result.stderr[-2000:]}")
+        return result.returncode == 0
+
+    def next_interval(self, activity: float) -> float:
+        """
+        Intervalle avant la prochaine sonde : environ un événement attendu par
+        intervalle, borné, étiré selon le budget et avec gigue
+
+        Args:
+            activity: Activité lissée (événements par heure)
+
+        Returns:
+            Intervalle en secondes
+        """
+        interval = 3600 / activity if activity > 0 else MAX_INTERVAL
+        interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL) * self.budget_factor()
+        return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def poll(self, repo: str):
+        """
+        Sonde un repository, lance le pipeline si nécessaire et replanifie la sonde suivante
+
+        Toute erreur est enregistrée dans l'état du repository : la sonde suivante
+        est toujours planifiée et le repository libéré pour le prochain tour.
+        """
+        now = datetime.now(timezone.utc)
+        with self.lock:
+            state = dict(self.state[repo])
+
+        last_probe = datetime.fromisoformat(state['last_probe']) if state['last_probe'] else now - timedelta(days=1)
+        last_success = datetime.fromisoformat(state['last_success']) if state['last_success'] else None
+        hours = max((now - last_probe).total_seconds() / 3600, 1 / 60)
+
+        try:
+            events = self.probe(repo, last_probe)
+            stale = last_success is None or (now - last_success).total_seconds() > MAX_STALENESS
+            state['activity'] = EWMA_ALPHA * events / hours + (1 - EWMA_ALPHA) * state['activity']
+
+            # La sonde n'avance que si l'activité a été synchronisée : après un échec,
+            # la sonde suivante retrouve les mêmes événements et relance le pipeline
+            if events or stale:
+                reason = f"{events} new events" if events else "stale"
+                print(f"[{repo}] {reason}, running pipeline...")
+                if self.run_pipeline(repo):
+                    state['last_probe'] = now.isoformat()
+                    state['last_success'] = now.isoformat()
+                    state['last_error'] = None
+                else:
+                    state['last_error'] = 'pipeline failed'
+            else:
+                state['last_probe'] = now.isoformat()
+                print(f"[{repo}] no activity since {last_probe:%Y-%m-%d %H:%M}, skipping")
+        except GithubException as e:
+            print(f"[{repo}] probe failed: {e}")
+            state['last_error'] = str(e)
+        except Exception as e:
+            print(f"[{repo}] poll failed: {type(e).__name__}: {e}")
+            state['last_error'] = f"{type(e).__name__}: {e}"
+        finally:
+            state['interval'] = self.next_interval(state['activity'])
+            state['next_poll'] = (datetime.now(timezone.utc) + timedelta(seconds=state['interval'])).isoformat()
+            print(f"[{repo}] activity {state['activity']:.2f}/h, next poll in {state['interval'] / 60:.0f} min")
+
+            with self.lock:
+                self.state[repo] = state
+                self.running.discard(repo)
+                self._write_state()
+                self.export_freshness()
+
+    def export_freshness(self):
+        """Exporte la fraîcheur de chaque repository (âge de la dernière synchronisation réussie)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        now = datetime.now(timezone.utc)
+        filename = os.path.join(self.output_dir, FRESHNESS_FILE)
+
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['repo', 'last_success', 'freshness_minutes', 'activity_per_hour',
+                             'poll_interval_minutes', 'next_poll', 'last_error'])
+            for repo in self.repos:
+                state = self.state[repo]
+                freshness = None
+                if state['last_success']:
+                    freshness = round((now - datetime.fromisoformat(state['last_success'])).total_seconds() / 60, 1)
+                writer.writerow([repo, state['last_success'], freshness, round(state['activity'], 3),
+                                 round(state['interval'] / 60, 1), state['next_poll'], state['last_error']])
+
+    def due_repos(self) -> List[str]:
+        """Repositories dont la sonde est due, du plus en retard au moins en retard"""
+        now = datetime.now(timezone.utc)
+        due = [
+            repo for repo in self.repos
+            if repo not in self.running
+            and (self.state[repo]['next_poll'] is None or datetime.fromisoformat(self.state[repo]['next_poll']) <= now)
+        ]
+        return sorted(due, key=lambda repo: self.state[repo]['next_poll'] or '')
+
+    def run(self, once: bool = False):
+        """
+        Boucle principale : soumet les sondes dues au pool (concurrence limitée)
+
+        Args:
+            once: Sonde chaque repository une seule fois puis s'arrête
+        """
+        print(f"Scheduling {len(self.repos)} repositories (concurrency {self.concurrency})")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            if once:
+                list(executor.map(self.poll, self.repos))
+                return
+
+            while True:
+                wait = self.seconds_until_budget()
+                if wait:
+                    print(f"Rate limit budget exhausted, waiting {wait / 60:.0f} min for reset")
+                    time.sleep(wait)
+
+                with self.lock:
+                    due = self.due_repos()[:self.concurrency - len(self.running)]
+                    self.running.update(due)
+                for repo in due:
+                    executor.submit(self.poll, repo)
+
+                time.sleep(min(30, MIN_INTERVAL))
+
+
+def main():
+    """Fonction principale"""
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="Adaptive polling scheduler for the DORA pipeline")
+    parser.add_argument('--once', action='store_true', help="Poll every repository once and exit")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('DORA_SCHEDULER_CONCURRENCY', CONCURRENCY)))
+    args = parser.parse_args()
+
+    token, owner, name = config.github_settings()
+    repos = config.env_list('DORA_REPOS')
+    if not repos and owner and name:
+        repos = [config.repository()]
+
+    if not token or not repos:
+        print("Please set GITHUB_TOKEN and DORA_REPOS (or GITHUB_OWNER and GITHUB_REPO) in .env file")
+        sys.exit(1)
+
+    scheduler = AdaptiveScheduler(token, repos, config.spool_dir(), config.output_dir(),
+                                  concurrency=args.concurrency)
+    try:
+        scheduler.run(once=args.once)
+    except KeyboardInterrupt:
+        print("\nScheduler stopped.")
+
+
+if __name__ == "__main__":
+    main()
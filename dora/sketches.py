@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Sketches de quantiles fusionnables (t-digest) pour le lead time et le MTTR
+
+Un t-digest résume une distribution en quelques dizaines de centroïdes
+(moyenne, poids), plus serrés aux extrémités pour garder p90/p99 précis.
+Les sketches sont stockés par repository, jour, métrique et environnement
+dans metric_sketches, puis fusionnés pour obtenir les percentiles d'une
+fenêtre ou de plusieurs repositories sans relire les lignes brutes.
+
+Usage:
+    python sketches.py build                       # calcule les sketches journaliers depuis la base
+    python sketches.py query --metric lead_time --days 28 [--repo owner/name]
+"""
+
+import struct
+import argparse
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Sequence, Union
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+import config
+from metrics import MetricColumns, columns_from_database
+
+DEFAULT_COMPRESSION = 100
+METRICS = ('lead_time', 'mttr')
+ALL_ENVIRONMENTS = 'all'
+
+# magic, version, compression, total, min, max, nombre de centroïdes
+_HEADER = struct.Struct('<2sBHQddI')
+_MAGIC = b'TD'
+_VERSION = 1
+
+
+class TDigest:
+    """t-digest fusionnable (variante "merging", fonction d'échelle k1)"""
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> int:
+        return int(self.weights.sum())
+
+    def update(self, values: Union[Sequence[float], np.ndarray]) -> 'TDigest':
+        """Ajoute des valeurs brutes (poids 1) puis recompresse"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._compress(np.concatenate([self.means, values]),
+                           np.concatenate([self.weights, np.ones(values.size)]))
+        return self
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """Fusionne un autre sketch dans celui-ci"""
+        if other.weights.size:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    @classmethod
+    def merge_all(cls, digests: Iterable['TDigest'], compression: int = DEFAULT_COMPRESSION) -> 'TDigest':
+        """Fusionne plusieurs sketches en une seule compression"""
+        digests = [digest for digest in digests if digest.weights.size]
+        merged = cls(compression)
+        if digests:
+            merged.min = min(digest.min for digest in digests)
+            merged.max = max(digest.max for digest in digests)
+            merged._compress(np.concatenate([digest.means for digest in digests]),
+                             np.concatenate([digest.weights for digest in digests]))
+        return merged
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """
+        Regroupe les centroïdes triés par tranche unitaire de k(q) = δ/2π · asin(2q - 1)
+
+        Un centroïde rejoint la tranche de son quantile de gauche : les tranches
+        sont étroites près de q=0 et q=1 (valeurs isolées) et larges au centre.
+        """
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q_left = (cumulative - weights) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray, None]:
+        """
+        Percentile(s) approché(s), interpolation linéaire comme PERCENTILE_CONT
+
+        Args:
+            q: Quantile(s) entre 0 et 1
+
+        Returns:
+            Valeur(s) estimée(s), None si le sketch est vide
+        """
+        if not self.weights.size:
+            return None
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # Position PERCENTILE_CONT q·(n-1) décalée au centre de la valeur (exacte si poids unitaires)
+        position = np.asarray(q, dtype=np.float64) * (total - 1) + 0.5
+        result = np.interp(position, np.r_[0, centers, total], np.r_[self.min, self.means, self.max])
+        return float(result) if result.ndim == 0 else result
+
+    def to_bytes(self) -> bytes:
+        """Sérialise le sketch (en-tête + moyennes float32 + poids uint32)"""
+        header = _HEADER.pack(_MAGIC, _VERSION, self.compression, self.count,
+                              self.min, self.max, self.means.size)
+        return (header + self.means.astype('<f4').tobytes()
+                + np.rint(self.weights).astype('<u4').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TDigest':
+        """Désérialise un sketch produit par to_bytes()"""
+        magic, version, compression, _, minimum, maximum, size = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Unsupported sketch format: {magic!r} v{version}")
+        digest = cls(compression)
+        offset = _HEADER.size
+        digest.means = np.frombuffer(data, dtype='<f4', count=size, offset=offset).astype(np.float64)
+        digest.weights = np.frombuffer(data, dtype='<u4', count=size, offset=offset + 4 * size).astype(np.float64)
+        digest.min, digest.max = minimum, maximum
+        return digest
+
+
+def _daily_rows(repo: str, metric: str, environments: np.ndarray, days: np.ndarray,
+                hours: np.ndarray, compression: int) -> List[tuple]:
+    """Construit un sketch par (jour, environnement)"""
+    rows = []
+    for environment in np.unique(environments):
+        in_environment = environments == environment
+        for day in np.unique(days[in_environment]):
+            values = hours[in_environment & (days == day)]
+            digest = TDigest(compression).update(values)
+            rows.append((repo, day.item(), metric, str(environment), digest.count, digest.to_bytes()))
+    return rows
+
+
+def daily_sketches(columns: MetricColumns, repo: str, compression: int = DEFAULT_COMPRESSION) -> List[tuple]:
+    """
+    Calcule les sketches journaliers du lead time et du MTTR
+
+    Le lead time est rattaché au jour du déploiement (réussi), le MTTR au jour
+    d'ouverture de l'incident, comme les filtres de fenêtre des requêtes SQL.
+
+    Args:
+        columns: Colonnes des métriques (voir metrics.py)
+        repo: Repository au format owner/name
+        compression: Paramètre δ du t-digest
+
+    Returns:
+        Lignes (repo, day, metric, environment, sample_count, sketch)
+    """
+    success = columns.lead_status == 'success'
+    lead_hours = (columns.lead_deployed_at[success] - columns.lead_committed_at[success]) / np.timedelta64(1, 'h')
+    rows = _daily_rows(repo, 'lead_time', columns.lead_environment[success],
+                       columns.lead_deployed_at[success].astype('datetime64[D]'), lead_hours, compression)
+
+    closed = (columns.incident_state == 'closed') & ~np.isnat(columns.incident_closed_at)
+    recovery_hours = (columns.incident_closed_at[closed] - columns.incident_created_at[closed]) / np.timedelta64(1, 'h')
+    rows += _daily_rows(repo, 'mttr', np.full(recovery_hours.size, ALL_ENVIRONMENTS, dtype=object),
+                        columns.incident_created_at[closed].astype('datetime64[D]'), recovery_hours, compression)
+    return rows
+
+
+def save_sketches(cursor, rows: List[tuple]):
+    """
+    Enregistre des sketches (remplace ceux du même jour), sans valider la transaction
+
+    Args:
+        cursor: Curseur psycopg2
+        rows: Lignes (repo, day, metric, environment, sample_count, sketch)
+    """
+    execute_values(cursor, """
+        INSERT INTO metric_sketches (repo, day, metric, environment, sample_count, sketch)
+        VALUES %s
+        ON CONFLICT (repo, day, metric, environment) DO UPDATE SET
+            sample_count = EXCLUDED.sample_count,
+            sketch = EXCLUDED.sketch,
+            updated_at = CURRENT_TIMESTAMP
+    """, rows)
+
+
+class SketchStore:
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str):
+        """
+        Initialise l'accès à la table metric_sketches
+
+        Args:
+            host: Hôte PostgreSQL
+            port: Port PostgreSQL
+            dbname: Nom de la base de données
+            user: Utilisateur
+            password: Mot de passe
+        """
+        self.conn_params = {
+            'host': host,
+            'port': port,
+            'dbname': dbname,
+            'user': user,
+            'password': password
+        }
+        self.conn = None
+        self.cursor = None
+
+    def connect(self):
+        """Établit la connexion à la base de données"""
+        try:
+            print("Connecting to PostgreSQL database...")
+            self.conn = psycopg2.connect(**self.conn_params)
+            self.cursor = self.conn.cursor()
+            print("Connection established successfully!")
+        except psycopg2.Error as e:
+            print(f"Error connecting to database: {e}")
+            raise
+
+    def disconnect(self):
+        """Ferme la connexion à la base de données"""
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
+        print("Database connection closed.")
+
+    def build(self, repo: str, compression: int = DEFAULT_COMPRESSION) -> int:
+        """
+        Recalcule et enregistre les sketches journaliers depuis les tables brutes
+
+        Les jours repliés par la rétention (daily_rollups) gardent les sketches
+        calculés au repli : les tables brutes n'en contiennent plus qu'une partie.
+        Les autres sketches du repository qui ne sont pas recalculés (jour sans
+        données restantes) sont supprimés dans la même transaction.
+
+        Args:
+            repo: Repository au format owner/name
+            compression: Paramètre δ du t-digest
+
+        Returns:
+            Nombre de sketches enregistrés
+        """
+        self.cursor.execute("SELECT day, environment FROM daily_rollups WHERE repo = %s", (repo,))
+        folded = set(self.cursor.fetchall())
+        rows = [
+            row for row in daily_sketches(columns_from_database(self.cursor, repo), repo, compression)
+            if (row[1], row[3]) not in folded
+        ]
+        rewritten = {(row[1], row[2], row[3]) for row in rows}
+        self.cursor.execute("SELECT day, metric, environment FROM metric_sketches WHERE repo = %s", (repo,))
+        stale = [
+            (repo,) + key for key in self.cursor.fetchall()
+            if (key[0], key[2]) not in folded and key not in rewritten
+        ]
+        if stale:
+            execute_values(self.cursor, """
+                DELETE FROM metric_sketches s
+                USING (VALUES %s) AS v(repo, day, metric, environment)
+                WHERE s.repo = v.repo AND s.day = v.day
+                  AND s.metric = v.metric AND s.environment = v.environment
+            """, stale)
+        self.save(rows)
+        return len(rows)
+
+    def save(self, rows: List[tuple]):
+        """Enregistre des sketches (remplace ceux du même jour)"""
+        save_sketches(self.cursor, rows)
+        self.conn.commit()
+
+    def query(self, metric: str, start: date, end: date, environment: str = "production",
+              repos: Optional[List[str]] = None) -> TDigest:
+        """
+        Fusionne les sketches d'une fenêtre de jours, pour un ou plusieurs repositories
+
+        Args:
+            metric: 'lead_time' ou 'mttr'
+            start: Premier jour inclus
+            end: Dernier jour inclus
+            environment: Environnement (ignoré pour le MTTR)
+            repos: Repositories à fusionner (par défaut: tous)
+
+        Returns:
+            Sketch fusionné
+        """
+        self.cursor.execute("""
+            SELECT sketch FROM metric_sketches
+            WHERE metric = %(metric)s
+              AND environment = %(environment)s
+              AND day BETWEEN %(start)s AND %(end)s
+              AND (%(repos)s IS NULL OR repo = ANY(%(repos)s))
+        """, {
+            'metric': metric,
+            'environment': ALL_ENVIRONMENTS if metric == 'mttr' else environment,
+            'start': start,
+            'end': end,
+            'repos': repos
+        })
+        return TDigest.merge_all(TDigest.from_bytes(bytes(row[0])) for row in self.cursor.fetchall())
+
+
+def main():
+    """Fonction principale"""
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="Build and query mergeable quantile sketches")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Compute daily sketches from the raw tables")
+    build.add_argument('--compression', type=int, default=DEFAULT_COMPRESSION)
+    query = subparsers.add_parser('query', help="Merge sketches over a window and print percentiles")
+    query.add_argument('--metric', choices=METRICS, default='lead_time')
+    query.add_argument('--days', type=int, default=28)
+    query.add_argument('--environment', default='production')
+    query.add_argument('--repo', action='append', help="Repository (owner/name), repeatable; default: all")
+    args = parser.parse_args()
+
+    store = SketchStore(*config.db_params())
+
+    try:
+        store.connect()
+        if args.command == 'build':
+            repo = config.repository()
+            print(f"Stored {store.build(repo, args.compression)} daily sketches for {repo}")
+        else:
+            end = date.today()
+            digest = store.query(args.metric, end - timedelta(days=args.days), end, args.environment, args.repo)
+            if not digest.count:
+                print("No data in the requested window")
+                return
+            p50, p90, p99 = digest.quantile([0.5, 0.9, 0.99])
+            print(f"{args.metric} over {args.days} days ({digest.count} samples): "
+                  f"p50={p50:.2f}h p90={p90:.2f}h p99={p99:.2f}h")
+    finally:
+        store.disconnect()
+
+
+if __name__ == "__main__":
+    main()
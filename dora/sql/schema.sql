@@ -3,39 +3,46 @@
 -- Table pour stocker les déploiements
 CREATE TABLE IF NOT EXISTS deployments (
     id SERIAL PRIMARY KEY,
-    deployment_id BIGINT UNIQUE NOT NULL,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    deployment_id BIGINT NOT NULL,
     sha VARCHAR(40) NOT NULL,
     environment VARCHAR(50) NOT NULL,
     status VARCHAR(20) NOT NULL,
     created_at TIMESTAMP NOT NULL,
     updated_at TIMESTAMP,
     description TEXT,
+    loaded_at TIMESTAMP DEFAULT clock_timestamp(),
+    history_walked_at TIMESTAMP,
     CONSTRAINT chk_status CHECK (status IN ('pending', 'success', 'failure', 'error', 'inactive'))
 );
 
 -- Table pour stocker les commits/changes
 CREATE TABLE IF NOT EXISTS changes (
     id SERIAL PRIMARY KEY,
-    sha VARCHAR(40) UNIQUE NOT NULL,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    sha VARCHAR(40) NOT NULL,
     committed_date TIMESTAMP NOT NULL,
     author VARCHAR(255),
     message TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    loaded_at TIMESTAMP DEFAULT clock_timestamp()
 );
 
 -- Table de liaison entre déploiements et commits
 CREATE TABLE IF NOT EXISTS deployment_commits (
     id SERIAL PRIMARY KEY,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
     deployment_id INTEGER REFERENCES deployments(id) ON DELETE CASCADE,
     commit_id INTEGER REFERENCES changes(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT clock_timestamp(),
     UNIQUE(deployment_id, commit_id)
 );
 
 -- Table pour stocker les incidents (issues avec label "incident")
 CREATE TABLE IF NOT EXISTS incidents (
     id SERIAL PRIMARY KEY,
-    issue_number INTEGER UNIQUE NOT NULL,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    issue_number INTEGER NOT NULL,
     deploy_id INTEGER REFERENCES deployments(id),
     title TEXT NOT NULL,
     state VARCHAR(20) NOT NULL,
@@ -43,18 +50,173 @@ CREATE TABLE IF NOT EXISTS incidents (
     closed_at TIMESTAMP,
     labels TEXT[],
     assignees TEXT[],
+    loaded_at TIMESTAMP DEFAULT clock_timestamp(),
     CONSTRAINT chk_state CHECK (state IN ('open', 'closed'))
 );
 
+-- Date du dernier chargement ayant modifié la ligne (exports incrémentaux),
+-- ajoutée aux bases créées avant son introduction
+ALTER TABLE deployments ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP DEFAULT clock_timestamp();
+ALTER TABLE changes ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP DEFAULT clock_timestamp();
+ALTER TABLE incidents ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP DEFAULT clock_timestamp();
+
+-- Repository de chaque ligne (owner/name) : plusieurs repositories partagent la base et
+-- les clés uniques incluent le repository. Ajouté aux bases existantes, dont les lignes
+-- sont attribuées au repository configuré par `dora init` (voir BaseLoader.assign_legacy_rows)
+ALTER TABLE deployments ADD COLUMN IF NOT EXISTS repo VARCHAR(255) NOT NULL DEFAULT '';
+ALTER TABLE changes ADD COLUMN IF NOT EXISTS repo VARCHAR(255) NOT NULL DEFAULT '';
+ALTER TABLE deployment_commits ADD COLUMN IF NOT EXISTS repo VARCHAR(255) NOT NULL DEFAULT '';
+ALTER TABLE incidents ADD COLUMN IF NOT EXISTS repo VARCHAR(255) NOT NULL DEFAULT '';
+ALTER TABLE deployments DROP CONSTRAINT IF EXISTS deployments_deployment_id_key;
+ALTER TABLE changes DROP CONSTRAINT IF EXISTS changes_sha_key;
+ALTER TABLE incidents DROP CONSTRAINT IF EXISTS incidents_issue_number_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_deployments_repo_key ON deployments(repo, deployment_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_repo_key ON changes(repo, sha);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_incidents_repo_key ON incidents(repo, issue_number);
+
+-- Heure de l'instruction plutôt que du début de la transaction (CURRENT_TIMESTAMP) :
+-- une transaction longue ne doit pas dater ses lignes bien avant leur commit
+ALTER TABLE deployments ALTER COLUMN loaded_at SET DEFAULT clock_timestamp();
+ALTER TABLE changes ALTER COLUMN loaded_at SET DEFAULT clock_timestamp();
+ALTER TABLE incidents ALTER COLUMN loaded_at SET DEFAULT clock_timestamp();
+ALTER TABLE deployment_commits ALTER COLUMN created_at SET DEFAULT clock_timestamp();
+
+-- Date du parcours de l'historique du déploiement (get_commit_history) ; à l'ajout de la
+-- colonne, les déploiements ayant déjà plusieurs commits liés sont considérés parcourus
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+            AND table_name = 'deployments'
+            AND column_name = 'history_walked_at'
+    ) THEN
+        ALTER TABLE deployments ADD COLUMN history_walked_at TIMESTAMP;
+        UPDATE deployments SET history_walked_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT deployment_id FROM deployment_commits
+            GROUP BY deployment_id
+            HAVING COUNT(*) > 1
+        );
+    END IF;
+END $$;
+
+-- Table de quarantaine des lignes rejetées au chargement
+CREATE TABLE IF NOT EXISTS load_rejects (
+    id SERIAL PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    row_key TEXT,
+    payload JSONB NOT NULL,
+    error TEXT NOT NULL,
+    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Date du dernier rejet d'une ligne déjà en quarantaine, ajoutée aux bases existantes
+ALTER TABLE load_rejects ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Un rejet par table, clé et erreur : les doublons accumulés avant l'index unique sont supprimés
+DELETE FROM load_rejects a
+USING load_rejects b
+WHERE a.table_name = b.table_name
+    AND a.row_key = b.row_key
+    AND a.error = b.error
+    AND a.id < b.id;
+
+-- Sketches de quantiles (t-digest) par repository, jour, métrique et environnement
+CREATE TABLE IF NOT EXISTS metric_sketches (
+    repo VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    environment VARCHAR(50) NOT NULL,
+    sample_count INTEGER NOT NULL,
+    sketch BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (repo, day, metric, environment)
+);
+
+-- Agrégats journaliers des lignes brutes purgées par la rétention (voir retention.py) :
+-- déploiements et lead time par environnement, incidents et MTTR sous l'environnement 'all'
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    day DATE NOT NULL,
+    environment VARCHAR(50) NOT NULL,
+    deployments_total INTEGER NOT NULL DEFAULT 0,
+    deployments_success INTEGER NOT NULL DEFAULT 0,
+    deployments_failed INTEGER NOT NULL DEFAULT 0,
+    lead_time_count INTEGER NOT NULL DEFAULT 0,
+    lead_time_sum_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+    incidents_opened INTEGER NOT NULL DEFAULT 0,
+    incidents_resolved INTEGER NOT NULL DEFAULT 0,
+    recovery_sum_hours DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rolled_up_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (repo, day, environment)
+);
+
+-- Agrégats par repository, ajouté aux bases existantes (clé primaire étendue au repository)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+            AND table_name = 'daily_rollups'
+            AND column_name = 'repo'
+    ) THEN
+        ALTER TABLE daily_rollups ADD COLUMN repo VARCHAR(255) NOT NULL DEFAULT '';
+        ALTER TABLE daily_rollups DROP CONSTRAINT daily_rollups_pkey;
+        ALTER TABLE daily_rollups ADD PRIMARY KEY (repo, day, environment);
+    END IF;
+END $$;
+
+-- Horizon de la rétention par repository : lignes antérieures repliées puis purgées,
+-- ni ré-extraites ni rechargées (voir retention.py et DatabaseLoader._retained)
+CREATE TABLE IF NOT EXISTS retention_horizons (
+    repo VARCHAR(255) PRIMARY KEY,
+    deployments_before DATE NOT NULL,
+    incidents_before DATE NOT NULL,
+    updated_at TIMESTAMP DEFAULT clock_timestamp()
+);
+
+-- File de jobs d'extraction/chargement (workers distribués, voir job_queue.py)
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    id SERIAL PRIMARY KEY,
+    repo VARCHAR(255) NOT NULL,
+    resource VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    depends_on INTEGER REFERENCES pipeline_jobs(id) ON DELETE SET NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    worker VARCHAR(255),
+    lease_expires_at TIMESTAMP,
+    result TEXT,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    CONSTRAINT chk_job_status CHECK (status IN ('pending', 'running', 'done', 'failed'))
+);
+
 -- Index pour améliorer les performances des requêtes
 CREATE INDEX IF NOT EXISTS idx_deployments_created_at ON deployments(created_at);
 CREATE INDEX IF NOT EXISTS idx_deployments_status ON deployments(status);
 CREATE INDEX IF NOT EXISTS idx_deployments_environment ON deployments(environment);
+CREATE INDEX IF NOT EXISTS idx_deployment_commits_repo ON deployment_commits(repo);
 CREATE INDEX IF NOT EXISTS idx_changes_committed_date ON changes(committed_date);
 CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents(created_at);
 CREATE INDEX IF NOT EXISTS idx_incidents_closed_at ON incidents(closed_at);
 CREATE INDEX IF NOT EXISTS idx_incidents_state ON incidents(state);
 CREATE INDEX IF NOT EXISTS idx_incidents_deploy_id ON incidents(deploy_id);
+CREATE INDEX IF NOT EXISTS idx_deployments_loaded_at ON deployments(loaded_at);
+CREATE INDEX IF NOT EXISTS idx_changes_loaded_at ON changes(loaded_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_loaded_at ON incidents(loaded_at);
+CREATE INDEX IF NOT EXISTS idx_deployment_commits_created_at ON deployment_commits(created_at);
+CREATE INDEX IF NOT EXISTS idx_deployment_commits_commit_id ON deployment_commits(commit_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pipeline_jobs_active ON pipeline_jobs(repo, resource)
+    WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claim ON pipeline_jobs(status, run_after);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_load_rejects_key ON load_rejects(table_name, row_key, md5(error));
+CREATE INDEX IF NOT EXISTS idx_metric_sketches_metric_day ON metric_sketches(metric, environment, day);
 
 -- Vue pour faciliter l'analyse des déploiements avec leurs commits
 CREATE OR REPLACE VIEW deployment_details AS
@@ -68,14 +230,89 @@ SELECT
     c.sha as commit_sha,
     c.committed_date,
     c.author,
-    c.message as commit_message
+    c.message as commit_message,
+    d.repo
 FROM deployments d
 LEFT JOIN deployment_commits dc ON d.id = dc.deployment_id
 LEFT JOIN changes c ON dc.commit_id = c.id
 ORDER BY d.created_at DESC, c.committed_date DESC;
 
+-- Entrées journalières des métriques sur tout l'historique, par repository : agrégats de
+-- la rétention pour les jours purgés, agrégation des tables brutes pour les autres
+-- (recréée : la colonne repo a été ajoutée en tête)
+DROP VIEW IF EXISTS daily_metric_inputs;
+CREATE VIEW daily_metric_inputs AS
+SELECT
+    repo,
+    day,
+    environment,
+    deployments_total,
+    deployments_success,
+    deployments_failed,
+    lead_time_count,
+    lead_time_sum_hours,
+    incidents_opened,
+    incidents_resolved,
+    recovery_sum_hours
+FROM daily_rollups
+UNION ALL
+SELECT
+    d.repo,
+    d.created_at::date,
+    d.environment,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE d.status = 'success'),
+    COUNT(*) FILTER (WHERE d.status IN ('failure', 'error')),
+    COALESCE(SUM(lt.lead_time_count), 0),
+    COALESCE(SUM(lt.lead_time_sum_hours), 0),
+    0,
+    0,
+    0
+FROM deployments d
+LEFT JOIN (
+    SELECT
+        dc.deployment_id,
+        COUNT(*) as lead_time_count,
+        SUM(EXTRACT(EPOCH FROM (d2.created_at - c.committed_date)) / 3600) as lead_time_sum_hours
+    FROM deployment_commits dc
+    JOIN deployments d2 ON d2.id = dc.deployment_id
+    JOIN changes c ON c.id = dc.commit_id
+    WHERE d2.status = 'success'
+    GROUP BY dc.deployment_id
+) lt ON lt.deployment_id = d.id
+WHERE NOT EXISTS (
+    SELECT 1 FROM daily_rollups r
+    WHERE r.repo = d.repo AND r.day = d.created_at::date AND r.environment = d.environment
+)
+GROUP BY d.repo, d.created_at::date, d.environment
+UNION ALL
+SELECT
+    i.repo,
+    i.created_at::date,
+    'all',
+    0,
+    0,
+    0,
+    0,
+    0,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE i.state = 'closed' AND i.closed_at IS NOT NULL),
+    COALESCE(SUM(EXTRACT(EPOCH FROM (i.closed_at - i.created_at)) / 3600)
+        FILTER (WHERE i.state = 'closed' AND i.closed_at IS NOT NULL), 0)
+FROM incidents i
+WHERE NOT EXISTS (
+    SELECT 1 FROM daily_rollups r
+    WHERE r.repo = i.repo AND r.day = i.created_at::date AND r.environment = 'all'
+)
+GROUP BY i.repo, i.created_at::date;
+
 -- Commentaires pour documentation
 COMMENT ON TABLE deployments IS 'Stocke les déploiements créés via GitHub API';
 COMMENT ON TABLE changes IS 'Stocke les commits/changements du repository';
 COMMENT ON TABLE deployment_commits IS 'Table de liaison many-to-many entre déploiements et commits';
 COMMENT ON TABLE incidents IS 'Stocke les incidents (issues GitHub avec label "incident")';
+COMMENT ON TABLE load_rejects IS 'Lignes rejetées au chargement, mises en quarantaine avec leur erreur';
+COMMENT ON TABLE retention_horizons IS 'Dates avant lesquelles la rétention a replié et purgé les lignes de chaque repository';
+COMMENT ON TABLE pipeline_jobs IS 'Jobs d''extraction par repository et ressource, réclamés par les workers (FOR UPDATE SKIP LOCKED)';
+COMMENT ON TABLE metric_sketches IS 'Sketches t-digest journaliers (lead time, MTTR), fusionnables entre jours et repositories';
+COMMENT ON TABLE daily_rollups IS 'Agrégats journaliers (DF, lead time, CFR, MTTR) des lignes brutes purgées par la rétention';
@@ -0,0 +1,83 @@
+-- DORA Metrics Database Schema (backend SQLite embarqué)
+-- Mêmes tables que schema.sql ; dates stockées en texte UTC 'YYYY-MM-DD HH:MM:SS',
+-- labels et assignés en tableaux JSON. Chaque ligne appartient à un repository (repo),
+-- inclus dans les clés uniques
+
+CREATE TABLE IF NOT EXISTS deployments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    deployment_id INTEGER NOT NULL,
+    sha VARCHAR(40) NOT NULL,
+    environment VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    description TEXT,
+    loaded_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    history_walked_at TEXT,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    CONSTRAINT chk_status CHECK (status IN ('pending', 'success', 'failure', 'error', 'inactive'))
+);
+
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha VARCHAR(40) NOT NULL CHECK (length(sha) <= 40),
+    committed_date TEXT NOT NULL,
+    author VARCHAR(255),
+    message TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    loaded_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    repo VARCHAR(255) NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS deployment_commits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    deployment_id INTEGER REFERENCES deployments(id) ON DELETE CASCADE,
+    commit_id INTEGER REFERENCES changes(id) ON DELETE CASCADE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    UNIQUE(deployment_id, commit_id)
+);
+
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    issue_number INTEGER NOT NULL,
+    deploy_id INTEGER REFERENCES deployments(id),
+    title TEXT NOT NULL,
+    state VARCHAR(20) NOT NULL,
+    created_at TEXT NOT NULL,
+    closed_at TEXT,
+    labels TEXT,
+    assignees TEXT,
+    loaded_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    repo VARCHAR(255) NOT NULL DEFAULT '',
+    CONSTRAINT chk_state CHECK (state IN ('open', 'closed'))
+);
+
+CREATE TABLE IF NOT EXISTS load_rejects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name VARCHAR(50) NOT NULL,
+    row_key TEXT,
+    payload TEXT NOT NULL,
+    error TEXT NOT NULL,
+    rejected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Un rejet par table, clé et erreur (les doublons des bases plus anciennes sont supprimés)
+DELETE FROM load_rejects
+WHERE id NOT IN (SELECT MAX(id) FROM load_rejects GROUP BY table_name, row_key, error);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_load_rejects_key ON load_rejects(table_name, row_key, error);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_deployments_repo_key ON deployments(repo, deployment_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_repo_key ON changes(repo, sha);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_incidents_repo_key ON incidents(repo, issue_number);
+CREATE INDEX IF NOT EXISTS idx_deployment_commits_repo ON deployment_commits(repo);
+
+CREATE INDEX IF NOT EXISTS idx_deployments_created_at ON deployments(created_at);
+CREATE INDEX IF NOT EXISTS idx_deployments_status ON deployments(status);
+CREATE INDEX IF NOT EXISTS idx_deployments_environment ON deployments(environment);
+CREATE INDEX IF NOT EXISTS idx_changes_committed_date ON changes(committed_date);
+CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents(created_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_closed_at ON incidents(closed_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_state ON incidents(state);
+CREATE INDEX IF NOT EXISTS idx_incidents_deploy_id ON incidents(deploy_id);
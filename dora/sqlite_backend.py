@@ -0,0 +1,193 @@
+"""
+Backend de stockage SQLite embarqué
+
+Alternative à PostgreSQL pour les petites équipes et les runs de CI : mêmes
+opérations de chargement, de liaison et d'export que DatabaseLoader et
+MetricsExporter (logique commune dans storage.py), dans un simple fichier,
+sans serveur ni dépendance externe.
+"""
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+from typing import List
+from records import LoadResult
+from storage import BaseLoader, BaseMetricsExporter, SQLiteDialect, to_sqlite_time
+
+# Lots plus petits que pour PostgreSQL : certaines versions de SQLite limitent à 999 paramètres
+CHUNK_SIZE = 500
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'schema_sqlite.sql')
+
+# Colonnes ajoutées depuis la création des premières bases (SQLite n'a pas ADD COLUMN IF NOT EXISTS),
+# avec la requête qui les remplit à l'ajout
+ADDED_COLUMNS = [
+    ('deployments', 'loaded_at TEXT', None),
+    ('changes', 'loaded_at TEXT', None),
+    ('incidents', 'loaded_at TEXT', None),
+    ('load_rejects', 'last_seen_at TEXT', None),
+    ('deployment_commits', "repo VARCHAR(255) NOT NULL DEFAULT ''", None),
+    # Déploiements ayant déjà plusieurs commits liés : historique considéré comme parcouru
+    ('deployments', 'history_walked_at TEXT', """
+        UPDATE deployments SET history_walked_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT deployment_id FROM deployment_commits
+            GROUP BY deployment_id
+            HAVING COUNT(*) > 1
+        )
+    """)
+]
+
+# Tables dont la clé unique (déclarée dans la table) a été étendue au repository :
+# SQLite ne supprime pas une contrainte, les anciennes tables sont reconstruites
+REBUILT_TABLES = ['deployments', 'changes', 'incidents']
+
+
+class SQLiteConnection:
+    """Connexion au fichier SQLite (self.path), partagée par le loader et l'exporteur"""
+
+    dialect = SQLiteDialect()
+    db_error = sqlite3.Error
+
+    def connect(self):
+        """Ouvre la base SQLite (schéma créé par SQLiteLoader.init_schema)"""
+        print(f"Opening SQLite database {self.path}...")
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.cursor = self.conn.cursor()
+        print("Connection established successfully!")
+
+    def disconnect(self):
+        """Ferme la base SQLite"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            print("Database connection closed.")
+
+
+class SQLiteLoader(SQLiteConnection, BaseLoader):
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, repo: str = ''):
+        """
+        Initialise le chargeur SQLite (même interface que DatabaseLoader)
+
+        Args:
+            path: Chemin du fichier de base de données (":memory:" pour une base en mémoire)
+            chunk_size: Nombre de lignes par lot chargé
+            repo: Repository des lignes chargées (owner/name)
+        """
+        super().__init__(chunk_size, repo)
+        self.path = path
+
+    def init_schema(self):
+        """
+        Crée ou met à jour le schéma (colonnes ajoutées depuis, tables reconstruites
+        sans leur ancienne clé unique, puis sql/schema_sqlite.sql) et attribue les
+        lignes existantes au repository du loader
+        """
+        print(f"Applying {os.path.basename(SCHEMA_FILE)}...")
+        for table, column, backfill in ADDED_COLUMNS:
+            existing = self._columns(table)
+            if existing and column.split()[0] not in existing:
+                self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                if backfill:
+                    self.cursor.execute(backfill)
+        self.conn.commit()
+
+        legacy = [table for table in REBUILT_TABLES if self._columns(table) and 'repo' not in self._columns(table)]
+        with open(SCHEMA_FILE, encoding='utf-8') as f:
+            schema = f.read()
+        if legacy:
+            self._rebuild_tables(legacy, schema)
+        self.conn.executescript(schema)
+        self.assign_legacy_rows()
+        self.conn.commit()
+
+    def _columns(self, table: str) -> List[str]:
+        """Colonnes d'une table (liste vide si elle n'existe pas)"""
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        return [row['name'] for row in self.cursor.fetchall()]
+
+    def _rebuild_tables(self, tables: List[str], schema: str):
+        """
+        Reconstruit des tables selon le schéma courant en conservant leurs lignes et leurs id
+
+        Les anciennes tables sont renommées sans réécrire les clés étrangères qui les
+        référencent (legacy_alter_table), puis supprimées une fois les lignes copiées.
+
+        Args:
+            tables: Tables à reconstruire
+            schema: Script du schéma courant
+        """
+        print(f"Rebuilding tables {', '.join(tables)} with repository keys...")
+        self.conn.execute("PRAGMA foreign_keys = OFF")
+        self.conn.execute("PRAGMA legacy_alter_table = ON")
+        try:
+            for table in tables:
+                self.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+            self.conn.executescript(schema)
+            self.cursor.execute("BEGIN")
+            for table in tables:
+                legacy_columns = set(self._columns(f"{table}_legacy"))
+                columns = ', '.join(c for c in self._columns(table) if c in legacy_columns)
+                self.cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_legacy")
+                self.cursor.execute(f"DROP TABLE {table}_legacy")
+            self.conn.commit()
+        finally:
+            self.conn.execute("PRAGMA legacy_alter_table = OFF")
+            self.conn.execute("PRAGMA foreign_keys = ON")
+
+    def _begin(self):
+        # Une seule transaction : sinon le RELEASE du savepoint le plus externe validerait chaque lot
+        self.cursor.execute("BEGIN")
+
+    def _adapt_row(self, record: tuple) -> tuple:
+        """Dates en texte UTC, listes (labels, assignés) en tableaux JSON"""
+        return tuple(
+            to_sqlite_time(value) if isinstance(value, datetime)
+            else json.dumps(value) if isinstance(value, list)
+            else value
+            for value in record
+        )
+
+    def _upsert(self, table: str, key_column: str, query: str, rows: List[tuple]) -> LoadResult:
+        """
+        Exécute un upsert dont le DO UPDATE ne réécrit que les lignes modifiées
+
+        SQLite ne distingue pas insertion et mise à jour dans RETURNING : les
+        clés déjà présentes sont lues avant l'upsert, et total_changes donne le
+        nombre de lignes réellement écrites.
+        """
+        keys = [row[0] for row in rows]
+        placeholders = ','.join('?' * len(keys))
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE repo = ? AND {key_column} IN ({placeholders})",
+                            [self.repo] + keys)
+        existing = self.cursor.fetchone()[0]
+
+        written = self._execute_batch(query, rows)
+        inserted = len(rows) - existing
+        updated = written - inserted
+        return LoadResult(inserted=inserted, updated=updated, unchanged=existing - updated)
+
+    def _execute_batch(self, query: str, rows: List[tuple]) -> int:
+        """Exécute une requête à une ligne VALUES pour chaque ligne du lot"""
+        before = self.conn.total_changes
+        self.cursor.executemany(query, rows)
+        return self.conn.total_changes - before
+
+
+class SQLiteMetricsExporter(SQLiteConnection, BaseMetricsExporter):
+    """Exporte les métriques DORA depuis la base SQLite (mêmes CSV que MetricsExporter)"""
+
+    def __init__(self, path: str, repo: str = ''):
+        """
+        Initialise l'exporteur SQLite
+
+        Args:
+            path: Chemin du fichier de base de données
+            repo: Repository dont les métriques sont exportées (owner/name)
+        """
+        super().__init__(repo)
+        self.path = path
@@ -0,0 +1,912 @@
+"""
+Logique de chargement et d'export commune aux backends de stockage
+
+DatabaseLoader / MetricsExporter (PostgreSQL) et SQLiteLoader /
+SQLiteMetricsExporter (SQLite embarqué) partagent les requêtes, le chargement
+par lots avec quarantaine et les exports CSV. Chaque backend ne fournit que sa
+connexion, son dialecte SQL (SQLDialect) et l'exécution des lots.
+
+Ce module n'importe aucun driver : le backend SQLite reste utilisable sans psycopg2.
+"""
+
+import os
+import csv
+import json
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Set, Callable, Hashable
+from records import (DeploymentRecord, CommitRecord, IncidentRecord, DeploymentCommitRecord, HistoryWalkRecord,
+                     LoadResult, RetentionHorizon)
+
+# Tables dont chaque ligne appartient à un repository (colonne repo, incluse dans les clés uniques)
+REPO_TABLES = ('deployments', 'changes', 'deployment_commits', 'incidents')
+
+# Requêtes des métriques d'un repository (fenêtre glissante de 28 jours), rendues par SQLDialect.render()
+DEPLOYMENT_FREQUENCY_QUERY = """
+    SELECT
+        COUNT(*) as total_successful_deployments,
+        COUNT(*) / 28.0 as deployments_per_day,
+        ROUND(COUNT(*) / 4.0, 2) as deployments_per_week
+    FROM deployments
+    WHERE
+        repo = {repo}
+        AND status = 'success'
+        AND environment = {environment}
+        AND created_at >= {window_start}
+"""
+
+LEAD_TIME_QUERY = """
+    SELECT
+        d.deployment_id,
+        d.sha as deployment_sha,
+        d.created_at as deployed_at,
+        c.sha as commit_sha,
+        c.committed_date,
+        ROUND({lead_time_hours}, 2) as lead_time_hours,
+        ROUND({lead_time_hours} / 24, 2) as lead_time_days
+    FROM deployments d
+    JOIN deployment_commits dc ON d.id = dc.deployment_id
+    JOIN changes c ON dc.commit_id = c.id
+    WHERE
+        d.repo = {repo}
+        AND d.status = 'success'
+        AND d.environment = {environment}
+        AND d.created_at >= {window_start}
+    ORDER BY d.created_at DESC
+"""
+
+CHANGE_FAILURE_RATE_QUERY = """
+    WITH deployment_stats AS (
+        SELECT
+            COUNT(*) as total_deployments,
+            COUNT(*) FILTER (WHERE status = 'success') as successful_deployments,
+            COUNT(*) FILTER (WHERE status IN ('failure', 'error')) as failed_deployments
+        FROM deployments
+        WHERE
+            repo = {repo}
+            AND environment = {environment}
+            AND created_at >= {window_start}
+    )
+    SELECT
+        total_deployments,
+        successful_deployments,
+        failed_deployments,
+        CASE
+            WHEN total_deployments > 0 THEN
+                ROUND(failed_deployments * 100.0 / total_deployments, 2)
+            ELSE 0
+        END as failure_rate_percentage
+    FROM deployment_stats
+"""
+
+MTTR_QUERY = """
+    SELECT
+        issue_number,
+        title,
+        state,
+        created_at,
+        closed_at,
+        CASE
+            WHEN closed_at IS NOT NULL THEN
+                ROUND({recovery_hours}, 2)
+            ELSE NULL
+        END as recovery_time_hours,
+        CASE
+            WHEN closed_at IS NOT NULL THEN
+                ROUND({recovery_hours} / 24, 2)
+            ELSE NULL
+        END as recovery_time_days
+    FROM incidents
+    WHERE
+        repo = {repo}
+        AND created_at >= {window_start}
+    ORDER BY created_at DESC
+"""
+
+SUMMARY_QUERY = """
+    WITH
+    deployment_frequency AS (
+        SELECT
+            COUNT(*) as total_deployments,
+            ROUND(COUNT(*) / 28.0, 2) as deployments_per_day
+        FROM deployments
+        WHERE
+            repo = {repo}
+            AND status = 'success'
+            AND environment = {environment}
+            AND created_at >= {window_start}
+    ),
+    lead_time AS (
+        SELECT
+            ROUND(AVG({lead_time_hours}), 2) as avg_hours
+        FROM deployments d
+        JOIN deployment_commits dc ON d.id = dc.deployment_id
+        JOIN changes c ON dc.commit_id = c.id
+        WHERE
+            d.repo = {repo}
+            AND d.status = 'success'
+            AND d.environment = {environment}
+            AND d.created_at >= {window_start}
+    ),
+    failure_rate AS (
+        SELECT
+            CASE
+                WHEN COUNT(*) > 0 THEN
+                    ROUND(COUNT(*) FILTER (WHERE status IN ('failure', 'error')) * 100.0 / COUNT(*), 2)
+                ELSE 0
+            END as failure_percentage
+        FROM deployments
+        WHERE
+            repo = {repo}
+            AND environment = {environment}
+            AND created_at >= {window_start}
+    ),
+    recovery_time AS (
+        SELECT
+            ROUND(AVG({recovery_hours}), 2) as avg_hours
+        FROM incidents
+        WHERE
+            repo = {repo}
+            AND state = 'closed'
+            AND closed_at IS NOT NULL
+            AND created_at >= {window_start}
+    )
+    SELECT
+        'Last 28 days' as metric_period,
+        df.total_deployments as deployment_frequency_total,
+        df.deployments_per_day as deployment_frequency_per_day,
+        lt.avg_hours as lead_time_avg_hours,
+        fr.failure_percentage as change_failure_rate_percent,
+        rt.avg_hours as mttr_avg_hours
+    FROM deployment_frequency df, lead_time lt, failure_rate fr, recovery_time rt
+"""
+
+
+class SQLDialect:
+    """Syntaxe SQL propre à un backend (paramètres, calcul de durées, lots de lignes)"""
+
+    # Début de la fenêtre glissante de 28 jours des métriques
+    window_start = ''
+    # Paramètre positionnel
+    placeholder = ''
+    # Clause terminant les upserts (voir BaseLoader._upsert)
+    returning = ''
+    # Cible de conflit des rejets (index unique de load_rejects)
+    reject_key = ''
+    # Date de chargement (loaded_at) : heure de l'instruction, pas du début de la transaction
+    now = 'CURRENT_TIMESTAMP'
+
+    def param(self, name: str) -> str:
+        """Paramètre nommé"""
+        raise NotImplementedError
+
+    def values(self, width: int) -> str:
+        """Lignes d'un VALUES exécuté par lot (voir BaseLoader._execute_batch)"""
+        raise NotImplementedError
+
+    def hours_between(self, end: str, start: str) -> str:
+        """Durée en heures entre deux colonnes de date"""
+        raise NotImplementedError
+
+    def render(self, template: str) -> str:
+        """Rend une requête de métrique de ce module dans le dialecte"""
+        return template.format(
+            repo=self.param('repo'),
+            environment=self.param('environment'),
+            window_start=self.window_start,
+            lead_time_hours=self.hours_between('d.created_at', 'c.committed_date'),
+            recovery_hours=self.hours_between('closed_at', 'created_at')
+        )
+
+
+class PostgreSQLDialect(SQLDialect):
+    window_start = "CURRENT_DATE - INTERVAL '28 days'"
+    placeholder = '%s'
+    # xmax = 0 : ligne insérée (sinon mise à jour) ; les lignes inchangées ne sont pas retournées
+    returning = 'RETURNING (xmax = 0) AS inserted'
+    # Erreur hachée : un message long dépasserait la taille maximale d'une entrée d'index
+    reject_key = '(table_name, row_key, md5(error))'
+    # CURRENT_TIMESTAMP est figé au début de la transaction (voir export_metrics.WATERMARK_LAG)
+    now = 'clock_timestamp()'
+
+    def param(self, name: str) -> str:
+        return f"%({name})s"
+
+    def values(self, width: int) -> str:
+        # Un seul %s, développé par execute_values
+        return '%s'
+
+    def hours_between(self, end: str, start: str) -> str:
+        return f"(EXTRACT(EPOCH FROM ({end} - {start})) / 3600)"
+
+
+class SQLiteDialect(SQLDialect):
+    # Dates stockées en texte UTC 'YYYY-MM-DD HH:MM:SS', comparables à date()
+    window_start = "date('now', '-28 days')"
+    placeholder = '?'
+    reject_key = '(table_name, row_key, error)'
+
+    def param(self, name: str) -> str:
+        return f":{name}"
+
+    def values(self, width: int) -> str:
+        return f"({', '.join('?' * width)})"
+
+    def hours_between(self, end: str, start: str) -> str:
+        return f"((julianday({end}) - julianday({start})) * 24)"
+
+
+def to_sqlite_time(value: Optional[datetime]) -> Optional[str]:
+    """Convertit une date en texte UTC comparable et utilisable par julianday()"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class BaseLoader:
+    """
+    Chargement commun aux backends : upserts par lots, quarantaine, liaisons
+
+    Les sous-classes fournissent connect()/disconnect(), le dialecte, la
+    classe d'erreur du driver et l'exécution des lots (_upsert, _execute_batch).
+    Toutes les lignes chargées et relues appartiennent au repository self.repo.
+    """
+
+    dialect: SQLDialect = None
+    # Classe de base des erreurs du driver
+    db_error = Exception
+    # Tables attribuées au repository configuré par assign_legacy_rows()
+    repo_tables = REPO_TABLES
+
+    def __init__(self, chunk_size: int, repo: str = ''):
+        """
+        Args:
+            chunk_size: Nombre de lignes par lot chargé
+            repo: Repository des lignes chargées (owner/name)
+        """
+        self.chunk_size = chunk_size
+        self.repo = repo
+        self.conn = None
+        self.cursor = None
+        # Dernière erreur de chargement (les load_* l'affichent sans la propager)
+        self.last_error = None
+
+    def init_schema(self):
+        """Crée ou met à jour le schéma (étape explicite : dora init, jamais pendant un chargement)"""
+        raise NotImplementedError
+
+    def assign_legacy_rows(self):
+        """
+        Attribue au repository du loader les lignes sans repository (repo vide),
+        chargées avant l'ajout de la colonne repo, quand la base ne servait qu'à un
+        seul repository. Sans validation de la transaction (voir init_schema).
+        """
+        if not self.repo:
+            return
+        p = self.dialect.placeholder
+        for table in self.repo_tables:
+            self.cursor.execute(f"UPDATE {table} SET repo = {p} WHERE repo = ''", (self.repo,))
+            if self.cursor.rowcount > 0:
+                print(f"  Assigned {self.cursor.rowcount} existing {table} rows to {self.repo}")
+
+    def _begin(self):
+        """Ouvre explicitement la transaction d'un chargement si le driver ne le fait pas"""
+
+    def _adapt_row(self, record: tuple) -> tuple:
+        """Convertit un enregistrement en ligne du backend (par défaut, tel quel)"""
+        return record
+
+    def _upsert(self, table: str, key_column: str, query: str, rows: List[tuple]) -> LoadResult:
+        """
+        Exécute un upsert dont le DO UPDATE ne réécrit que les lignes modifiées
+
+        Args:
+            table: Table chargée
+            key_column: Colonne de la clé de conflit
+            query: Requête INSERT ... ON CONFLICT ... WHERE ... IS DISTINCT FROM ...
+            rows: Lignes à charger
+
+        Returns:
+            Nombre de lignes insérées, modifiées et inchangées
+        """
+        raise NotImplementedError
+
+    def _execute_batch(self, query: str, rows: List[tuple]) -> int:
+        """Exécute une requête sur un lot de lignes (VALUES) et retourne le nombre de lignes écrites"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _dedupe(rows: list, key: Callable[[tuple], Hashable]) -> list:
+        """
+        Déduplique un lot sur sa clé de conflit (la dernière occurrence l'emporte)
+
+        Une même clé présente deux fois dans un INSERT ... ON CONFLICT DO UPDATE
+        fait échouer toute l'instruction ("cannot affect row a second time").
+        """
+        unique = {}
+        for row in rows:
+            unique[key(row)] = row
+        if len(unique) < len(rows):
+            print(f"  Removed {len(rows) - len(unique)} duplicate rows from batch")
+        return list(unique.values())
+
+    def _reject(self, table: str, row: tuple, row_key: Hashable, error: Exception):
+        """
+        Met en quarantaine une ligne rejetée dans load_rejects
+
+        Un rejet déjà présent (même table, clé et erreur) n'est pas dupliqué à
+        chaque nouveau run : seuls son payload et last_seen_at sont mis à jour.
+        La clé est préfixée par le repository du loader.
+        """
+        p = self.dialect.placeholder
+        if self.repo:
+            row_key = f"{self.repo}:{row_key}"
+        self.cursor.execute(
+            f"""
+            INSERT INTO load_rejects (table_name, row_key, payload, error, last_seen_at)
+            VALUES ({p}, {p}, {p}, {p}, CURRENT_TIMESTAMP)
+            ON CONFLICT {self.dialect.reject_key} DO UPDATE SET
+                payload = EXCLUDED.payload,
+                last_seen_at = EXCLUDED.last_seen_at
+            """,
+            (table, str(row_key), json.dumps(row._asdict(), default=str), str(error).strip())
+        )
+        print(f"  Rejected {table} row {row_key}: {str(error).strip().splitlines()[0]}")
+
+    def _load_chunks(self, table: str, rows: list, key: Callable[[tuple], Hashable],
+                     load_chunk: Callable[[list], LoadResult]) -> LoadResult:
+        """
+        Charge des lignes par lots, dans la transaction courante
+
+        Chaque lot est protégé par un savepoint : si un lot échoue, il est rejoué
+        ligne par ligne et seules les lignes en erreur sont mises en quarantaine
+        dans load_rejects. Le reste du chargement n'est pas perdu.
+
+        Args:
+            table: Nom de la table (pour la quarantaine)
+            rows: Lignes à charger
+            key: Clé de conflit d'une ligne
+            load_chunk: Fonction chargeant un lot de lignes
+
+        Returns:
+            Cumul des résultats de chargement
+        """
+        results = []
+        rows = self._dedupe(rows, key)
+
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            self.cursor.execute("SAVEPOINT load_chunk")
+            try:
+                results.append(load_chunk(chunk))
+                self.cursor.execute("RELEASE SAVEPOINT load_chunk")
+                continue
+            except self.db_error:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT load_chunk")
+                self.cursor.execute("RELEASE SAVEPOINT load_chunk")
+
+            # Lot en erreur : rejoué ligne par ligne pour isoler les lignes fautives
+            for row in chunk:
+                self.cursor.execute("SAVEPOINT load_row")
+                try:
+                    results.append(load_chunk([row]))
+                    self.cursor.execute("RELEASE SAVEPOINT load_row")
+                except self.db_error as e:
+                    self.cursor.execute("ROLLBACK TO SAVEPOINT load_row")
+                    self.cursor.execute("RELEASE SAVEPOINT load_row")
+                    self._reject(table, row, key(row), e)
+                    results.append(LoadResult(rejected=1))
+
+        return LoadResult(*map(sum, zip(*results))) if results else LoadResult()
+
+    def retention_horizon(self) -> RetentionHorizon:
+        """Horizon de la rétention du repository (aucun sans rétention, cas par défaut)"""
+        return RetentionHorizon()
+
+    def _retained(self, table: str, records: list) -> list:
+        """
+        Écarte les enregistrements des jours déjà repliés par la rétention : ils
+        seraient sinon rechargés, recomptés par les métriques puis purgés à nouveau
+
+        Args:
+            table: Table chargée
+            records: Enregistrements à charger
+
+        Returns:
+            Enregistrements à charger
+        """
+        return records
+
+    def _load_table(self, table: str, label: str, key_column: str, query: str, records: list) -> LoadResult:
+        """
+        Charge une table complète dans une transaction
+
+        Args:
+            table: Table chargée
+            label: Nom affiché des enregistrements
+            key_column: Colonne de la clé de conflit (attribut homonyme des enregistrements)
+            query: Upsert de la table
+            records: Enregistrements à charger
+
+        Returns:
+            Nombre de lignes insérées, modifiées et inchangées
+        """
+        if not records:
+            print(f"No {label} to load.")
+            return LoadResult()
+
+        print(f"Loading {len(records)} {label}...")
+
+        try:
+            self._begin()
+            retained = self._retained(table, records)
+            if len(retained) < len(records):
+                print(f"  Skipping {len(records) - len(retained)} {label} of days already folded by retention")
+            result = self._load_chunks(
+                table, retained, lambda record: getattr(record, key_column),
+                lambda chunk: self._upsert(table, key_column, query,
+                                           [self._adapt_row(r) + (self.repo,) for r in chunk])
+            )
+            self.conn.commit()
+            print(f"Successfully loaded {label}: {result}")
+            return result
+        except self.db_error as e:
+            self.conn.rollback()
+            self.last_error = e
+            print(f"Error loading {label}: {e}")
+            return LoadResult()
+
+    def load_deployments(self, deployments: List[DeploymentRecord]) -> LoadResult:
+        """
+        Charge les déploiements dans la base de données
+
+        Une version plus ancienne que celle en base (updated_at antérieur) est
+        ignorée, et un statut connu n'est jamais ramené à 'pending' : un événement
+        deployment reçu après son deployment_status ne dégrade pas le statut.
+
+        Args:
+            deployments: Liste des déploiements à charger
+
+        Returns:
+            Nombre de déploiements insérés, modifiés et inchangés
+        """
+        status = "CASE WHEN EXCLUDED.status = 'pending' THEN deployments.status ELSE EXCLUDED.status END"
+        query = f"""
+            INSERT INTO deployments (deployment_id, sha, environment, status, created_at, updated_at, description, repo)
+            VALUES {self.dialect.values(8)}
+            ON CONFLICT (repo, deployment_id) DO UPDATE SET
+                status = {status},
+                updated_at = EXCLUDED.updated_at,
+                loaded_at = {self.dialect.now}
+            WHERE (deployments.updated_at IS NULL OR EXCLUDED.updated_at >= deployments.updated_at)
+                AND (deployments.status, deployments.updated_at)
+                    IS DISTINCT FROM ({status}, EXCLUDED.updated_at)
+            {self.dialect.returning}
+        """
+        return self._load_table('deployments', 'deployments', 'deployment_id', query, deployments)
+
+    def load_commits(self, commits: List[CommitRecord]) -> LoadResult:
+        """
+        Charge les commits dans la base de données
+
+        Args:
+            commits: Liste des commits à charger
+
+        Returns:
+            Nombre de commits insérés, modifiés et inchangés
+        """
+        query = f"""
+            INSERT INTO changes (sha, committed_date, author, message, repo)
+            VALUES {self.dialect.values(5)}
+            ON CONFLICT (repo, sha) DO UPDATE SET
+                committed_date = EXCLUDED.committed_date,
+                author = EXCLUDED.author,
+                message = EXCLUDED.message,
+                loaded_at = {self.dialect.now}
+            WHERE (changes.committed_date, changes.author, changes.message)
+                IS DISTINCT FROM (EXCLUDED.committed_date, EXCLUDED.author, EXCLUDED.message)
+            {self.dialect.returning}
+        """
+        return self._load_table('changes', 'commits', 'sha', query, commits)
+
+    def load_incidents(self, incidents: List[IncidentRecord]) -> LoadResult:
+        """
+        Charge les incidents dans la base de données
+
+        Args:
+            incidents: Liste des incidents à charger
+
+        Returns:
+            Nombre d'incidents insérés, modifiés et inchangés
+        """
+        query = f"""
+            INSERT INTO incidents (issue_number, title, state, created_at, closed_at, labels, assignees, repo)
+            VALUES {self.dialect.values(8)}
+            ON CONFLICT (repo, issue_number) DO UPDATE SET
+                title = EXCLUDED.title,
+                state = EXCLUDED.state,
+                closed_at = EXCLUDED.closed_at,
+                labels = EXCLUDED.labels,
+                assignees = EXCLUDED.assignees,
+                loaded_at = {self.dialect.now}
+            WHERE (incidents.title, incidents.state, incidents.closed_at, incidents.labels, incidents.assignees)
+                IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.state, EXCLUDED.closed_at, EXCLUDED.labels, EXCLUDED.assignees)
+            {self.dialect.returning}
+        """
+        return self._load_table('incidents', 'incidents', 'issue_number', query, incidents)
+
+    def link_deployment_commits(self) -> int:
+        """
+        Crée les liens entre déploiements et commits
+        Simplification : 1 commit = 1 déploiement (le commit SHA du déploiement)
+        """
+        print("Linking deployments to commits...")
+
+        query = f"""
+            INSERT INTO deployment_commits (repo, deployment_id, commit_id)
+            SELECT d.repo, d.id, c.id
+            FROM deployments d
+            JOIN changes c ON c.repo = d.repo AND c.sha = d.sha
+            WHERE d.repo = {self.dialect.placeholder}
+            AND NOT EXISTS (
+                SELECT 1 FROM deployment_commits dc
+                WHERE dc.deployment_id = d.id AND dc.commit_id = c.id
+            )
+        """
+
+        try:
+            self.cursor.execute(query, (self.repo,))
+            self.conn.commit()
+            print(f"Successfully linked {self.cursor.rowcount} deployment-commit pairs")
+            return self.cursor.rowcount
+        except self.db_error as e:
+            self.conn.rollback()
+            self.last_error = e
+            print(f"Error linking deployments and commits: {e}")
+            return 0
+
+    def load_deployment_commit_links(self, links: List[DeploymentCommitRecord]) -> int:
+        """
+        Crée les liens deployment_commits issus de l'historique des déploiements
+
+        Args:
+            links: Liste de paires deployment_id (GitHub) / sha (DeploymentCommitRecord)
+
+        Returns:
+            Nombre de liens créés
+        """
+        if not links:
+            print("No deployment-commit history to link.")
+            return 0
+
+        print(f"Linking {len(links)} commits from deployment history...")
+
+        # WHERE true : lève l'ambiguïté JOIN ... ON / ON CONFLICT pour SQLite
+        query = f"""
+            WITH v(deployment_id, sha, repo) AS (VALUES {self.dialect.values(3)})
+            INSERT INTO deployment_commits (repo, deployment_id, commit_id)
+            SELECT v.repo, d.id, c.id
+            FROM v
+            JOIN deployments d ON d.repo = v.repo AND d.deployment_id = v.deployment_id
+            JOIN changes c ON c.repo = v.repo AND c.sha = v.sha
+            WHERE true
+            ON CONFLICT (deployment_id, commit_id) DO NOTHING
+        """
+
+        def insert_links(chunk):
+            created = self._execute_batch(query, [link + (self.repo,) for link in chunk])
+            return LoadResult(inserted=created, unchanged=len(chunk) - created)
+
+        try:
+            self._begin()
+            result = self._load_chunks('deployment_commits', links, lambda link: link, insert_links)
+            self.conn.commit()
+            print(f"Successfully linked {result.inserted} history commits")
+            return result.inserted
+        except self.db_error as e:
+            self.conn.rollback()
+            self.last_error = e
+            print(f"Error linking deployment history: {e}")
+            return 0
+
+    def mark_history_walked(self, walks: List[HistoryWalkRecord]) -> int:
+        """
+        Marque les déploiements dont l'historique a été parcouru (history_walked_at)
+
+        A appeler une fois les commits et les liens de ces déploiements chargés :
+        un déploiement marqué n'est plus parcouru, même s'il n'a aucun commit
+        propre (redéploiement du même SHA).
+
+        Args:
+            walks: Déploiements parcourus (HistoryWalkRecord)
+
+        Returns:
+            Nombre de déploiements marqués
+        """
+        if not walks:
+            return 0
+
+        query = f"""
+            WITH v(deployment_id, repo) AS (VALUES {self.dialect.values(2)})
+            UPDATE deployments SET history_walked_at = CURRENT_TIMESTAMP
+            WHERE (repo, deployment_id) IN (SELECT repo, deployment_id FROM v)
+        """
+
+        def mark(chunk):
+            marked = self._execute_batch(query, [(walk.deployment_id, self.repo) for walk in chunk])
+            return LoadResult(updated=marked, unchanged=len(chunk) - marked)
+
+        try:
+            self._begin()
+            result = self._load_chunks('deployments', walks, lambda walk: walk.deployment_id, mark)
+            self.conn.commit()
+            print(f"Marked {result.updated} deployments as walked")
+            return result.updated
+        except self.db_error as e:
+            self.conn.rollback()
+            self.last_error = e
+            print(f"Error marking walked deployments: {e}")
+            return 0
+
+    def get_walked_deployment_ids(self) -> Set[int]:
+        """
+        Récupère les déploiements (ids GitHub) dont l'historique a déjà été parcouru
+
+        Returns:
+            Ensemble des deployment_id GitHub
+        """
+        self.cursor.execute(
+            f"SELECT deployment_id FROM deployments WHERE repo = {self.dialect.placeholder} "
+            f"AND history_walked_at IS NOT NULL",
+            (self.repo,)
+        )
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def table_state(self) -> Dict[str, List[int]]:
+        """
+        État des tables chargées pour le repository (nombre de lignes et plus grand
+        id), pour détecter une base réinitialisée ou modifiée depuis le dernier chargement
+
+        Returns:
+            Dictionnaire table -> [nombre de lignes, plus grand id]
+        """
+        state = {}
+        for table in REPO_TABLES:
+            self.cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {table} "
+                                f"WHERE repo = {self.dialect.placeholder}", (self.repo,))
+            state[table] = list(self.cursor.fetchone())
+        return state
+
+    def load_all_data(self, data: Dict[str, list], checkpoint=None) -> bool:
+        """
+        Charge toutes les données dans la base de données
+
+        Args:
+            data: Dictionnaire contenant deployments, commits et incidents
+            checkpoint: PipelineCheckpoint pour ne pas recharger les tables déjà chargées
+
+        Returns:
+            True si toutes les tables ont été chargées sans erreur
+        """
+        print("=" * 70)
+        print("Starting database loading...")
+        print("=" * 70)
+
+        failed_steps = []
+
+        def run_step(name, skipped, load, *args):
+            step = f"load:{name}"
+            if checkpoint is not None and checkpoint.is_done(step):
+                print(f"Resuming: {name} already loaded, skipping")
+                return skipped
+
+            self.last_error = None
+            count = load(*args)
+            if self.last_error is not None:
+                failed_steps.append(name)
+            elif checkpoint is not None:
+                checkpoint.mark_done(step)
+            return count
+
+        # Charge les commits d'abord (car les déploiements y font référence)
+        commits_loaded = run_step('commits', LoadResult(), self.load_commits, data.get('commits', []))
+
+        # Charge les déploiements
+        deployments_loaded = run_step('deployments', LoadResult(), self.load_deployments, data.get('deployments', []))
+
+        # Crée les liens deployment_commits (SHA déployé + historique)
+        links_created = run_step('links', 0, self.link_deployment_commits)
+        links_created += run_step('history_links', 0, self.load_deployment_commit_links,
+                                  data.get('deployment_commits', []))
+
+        # Marque les déploiements parcourus seulement si leurs commits et leurs liens sont en base
+        if not failed_steps:
+            run_step('history_walks', 0, self.mark_history_walked, data.get('history_walks', []))
+
+        # Charge les incidents
+        incidents_loaded = run_step('incidents', LoadResult(), self.load_incidents, data.get('incidents', []))
+
+        print("=" * 70)
+        print("Loading completed!")
+        print(f"  - Commits: {commits_loaded}")
+        print(f"  - Deployments: {deployments_loaded}")
+        print(f"  - Deployment-Commit links: {links_created}")
+        print(f"  - Incidents: {incidents_loaded}")
+        if failed_steps:
+            print(f"  - Failed steps: {', '.join(failed_steps)}")
+        print("=" * 70)
+
+        return not failed_steps
+
+
+class BaseMetricsExporter:
+    """
+    Exports CSV communs aux backends (mêmes fichiers et mêmes colonnes)
+
+    Les sous-classes fournissent connect()/disconnect(), le dialecte et la
+    classe d'erreur du driver ; les exports incrémentaux sont propres à PostgreSQL.
+    Les métriques exportées sont celles du repository self.repo.
+    """
+
+    dialect: SQLDialect = None
+    db_error = Exception
+    # Exports incrémentaux du lead time et du MTTR (export_*_incremental)
+    supports_incremental = False
+
+    def __init__(self, repo: str = ''):
+        """
+        Args:
+            repo: Repository dont les métriques sont exportées (owner/name)
+        """
+        self.repo = repo
+        self.conn = None
+        self.cursor = None
+        # Dernière erreur d'export (export_to_csv l'affiche sans la propager)
+        self.last_error = None
+
+    def export_to_csv(self, query: str, filename: str, headers: List[str] = None,
+                      params: Optional[Dict[str, Any]] = None):
+        """
+        Exécute une requête et exporte le résultat en CSV
+
+        Args:
+            query: Requête SQL à exécuter
+            filename: Nom du fichier CSV de sortie
+            headers: En-têtes personnalisés (optionnel)
+            params: Paramètres de la requête (optionnel)
+        """
+        try:
+            if params is None:
+                self.cursor.execute(query)
+            else:
+                self.cursor.execute(query, params)
+            rows = [dict(row) for row in self.cursor.fetchall()]
+
+            if not rows:
+                print(f"No data to export for {filename}")
+                return
+
+            # Utilise les noms de colonnes de la requête si headers non fourni
+            if not headers:
+                headers = rows[0].keys()
+
+            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=headers)
+                writer.writeheader()
+                writer.writerows(rows)
+
+            print(f"Exported {len(rows)} rows to {filename}")
+
+        except self.db_error as e:
+            self.conn.rollback()
+            self.last_error = e
+            print(f"Error exporting data: {e}")
+        except IOError as e:
+            self.last_error = e
+            print(f"Error writing to file {filename}: {e}")
+
+    @staticmethod
+    def _metric_filename(output_dir: str, metric: str, environment: str) -> str:
+        """Nom du CSV d'une métrique ; suffixé par l'environnement hors production"""
+        suffix = "" if environment == "production" else f"_{environment}"
+        return os.path.join(output_dir, f"dora_{metric}{suffix}.csv")
+
+    def export_deployment_frequency(self, output_dir: str = ".", environment: str = "production"):
+        """Exporte les métriques de fréquence de déploiement"""
+        filename = self._metric_filename(output_dir, "deployment_frequency", environment)
+        self.export_to_csv(self.dialect.render(DEPLOYMENT_FREQUENCY_QUERY), filename,
+                           params={'environment': environment, 'repo': self.repo})
+
+    def export_lead_time(self, output_dir: str = ".", environment: str = "production"):
+        """Exporte les métriques de lead time"""
+        filename = self._metric_filename(output_dir, "lead_time", environment)
+        self.export_to_csv(self.dialect.render(LEAD_TIME_QUERY), filename,
+                           params={'environment': environment, 'repo': self.repo})
+
+    def export_change_failure_rate(self, output_dir: str = ".", environment: str = "production"):
+        """Exporte les métriques de taux d'échec"""
+        filename = self._metric_filename(output_dir, "change_failure_rate", environment)
+        self.export_to_csv(self.dialect.render(CHANGE_FAILURE_RATE_QUERY), filename,
+                           params={'environment': environment, 'repo': self.repo})
+
+    def export_mttr(self, output_dir: str = "."):
+        """Exporte les métriques de temps de récupération"""
+        filename = os.path.join(output_dir, "dora_mttr.csv")
+        self.export_to_csv(self.dialect.render(MTTR_QUERY), filename, params={'repo': self.repo})
+
+    def export_summary(self, output_dir: str = ".", environment: str = "production"):
+        """Exporte un résumé de toutes les métriques DORA"""
+        filename = self._metric_filename(output_dir, "metrics_summary", environment)
+        self.export_to_csv(self.dialect.render(SUMMARY_QUERY), filename,
+                           params={'environment': environment, 'repo': self.repo})
+
+    def export_lead_time_incremental(self, output_dir: str = ".", environment: str = "production",
+                                     compact: bool = False):
+        """Exporte le détail du lead time de façon incrémentale (voir supports_incremental)"""
+        raise NotImplementedError
+
+    def export_mttr_incremental(self, output_dir: str = ".", compact: bool = False):
+        """Exporte le détail des incidents de façon incrémentale (voir supports_incremental)"""
+        raise NotImplementedError
+
+    def export_all_metrics(self, output_dir: str = ".", checkpoint=None,
+                           environments: Optional[List[str]] = None, incremental: bool = False) -> bool:
+        """
+        Exporte toutes les métriques DORA
+
+        Args:
+            output_dir: Répertoire de sortie des CSV
+            checkpoint: PipelineCheckpoint pour ne pas refaire les exports déjà terminés
+            environments: Environnements à exporter (par défaut: production)
+            incremental: Détails du lead time et du MTTR en deltas (PostgreSQL uniquement)
+
+        Returns:
+            True si tous les exports ont réussi
+        """
+        print("=" * 70)
+        print("Exporting DORA metrics to CSV files...")
+        print("=" * 70)
+        if incremental and not self.supports_incremental:
+            print("Incremental exports require PostgreSQL, writing full detail files")
+            incremental = False
+
+        # Crée le répertoire de sortie s'il n'existe pas
+        os.makedirs(output_dir, exist_ok=True)
+
+        export_lead_time = self.export_lead_time_incremental if incremental else self.export_lead_time
+        export_mttr = self.export_mttr_incremental if incremental else self.export_mttr
+
+        exports = []
+        for environment in environments or ["production"]:
+            exports += [
+                (f"deployment_frequency:{environment}", self.export_deployment_frequency, environment),
+                (f"lead_time:{environment}", export_lead_time, environment),
+                (f"change_failure_rate:{environment}", self.export_change_failure_rate, environment),
+                (f"summary:{environment}", self.export_summary, environment)
+            ]
+        # Les incidents ne sont pas rattachés à un environnement : MTTR n'est exporté qu'une fois
+        exports.append(("mttr", export_mttr, None))
+
+        failed_exports = []
+        for name, export, environment in exports:
+            step = f"export:{name}"
+            if checkpoint is not None and checkpoint.is_done(step):
+                print(f"Resuming: {name} already exported, skipping")
+                continue
+
+            self.last_error = None
+            if environment is None:
+                export(output_dir)
+            else:
+                export(output_dir, environment)
+            if self.last_error is not None:
+                failed_exports.append(name)
+            elif checkpoint is not None:
+                checkpoint.mark_done(step)
+
+        print("=" * 70)
+        print(f"All metrics exported to {output_dir}")
+        print("=" * 70)
+
+        return not failed_exports
@@ -0,0 +1,79 @@
+"""
+Génération d'un jeu de données DORA synthétique pour les benchmarks
+
+Les dates sont relatives à maintenant : une partie des déploiements et des
+incidents tombe dans la fenêtre glissante de 28 jours des requêtes.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from records import DeploymentRecord, CommitRecord, IncidentRecord, DeploymentCommitRecord
+
+STATUS_WEIGHTS = [('success', 85), ('failure', 8), ('error', 2), ('inactive', 5)]
+ENVIRONMENTS = ['production', 'staging', 'preview']
+
+
+def generate_dataset(deployments: int = 1000, commits_per_deployment: int = 5, incidents: int = 100,
+                     days: int = 180, seed: int = 42) -> Dict[str, list]:
+    """
+    Génère un jeu de données au format de GitHubDataExtractor.extract_all_data()
+
+    Args:
+        deployments: Nombre de déploiements
+        commits_per_deployment: Nombre moyen de commits par déploiement
+        incidents: Nombre d'incidents
+        days: Période couverte, en jours avant maintenant
+        seed: Graine aléatoire (jeu de données reproductible)
+
+    Returns:
+        Dictionnaire contenant deployments, commits, deployment_commits et incidents
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(days=days)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+
+    data = {'deployments': [], 'commits': [], 'deployment_commits': [], 'incidents': []}
+    commit_number = 0
+
+    for deployment_id in range(1, deployments + 1):
+        created_at = start + timedelta(seconds=rng.uniform(0, days * 86400))
+        commit_count = max(1, int(rng.expovariate(1 / commits_per_deployment)))
+
+        for position in range(commit_count):
+            commit_number += 1
+            sha = f"{commit_number:040x}"
+            # Lead time log-normal : médiane de quelques heures, longue traîne de plusieurs jours
+            lead_time = timedelta(hours=min(rng.lognormvariate(1.5, 1.2), 24 * 30))
+            data['commits'].append(CommitRecord.create(
+                sha, created_at - lead_time, f"developer-{rng.randrange(25)}", f"Change #{commit_number}"
+            ))
+            data['deployment_commits'].append(DeploymentCommitRecord(deployment_id, sha))
+
+        data['deployments'].append(DeploymentRecord.create(
+            deployment_id=deployment_id,
+            sha=data['commits'][-1].sha,
+            environment=rng.choices(ENVIRONMENTS, weights=[60, 25, 15])[0],
+            status=rng.choices(statuses, weights=weights)[0],
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=rng.randint(1, 30)),
+            description=f"Deployment {deployment_id}"
+        ))
+
+    for issue_number in range(1, incidents + 1):
+        created_at = start + timedelta(seconds=rng.uniform(0, days * 86400))
+        recovery = timedelta(hours=rng.lognormvariate(1.0, 1.0))
+        closed_at = created_at + recovery if created_at + recovery < now and rng.random() < 0.9 else None
+        data['incidents'].append(IncidentRecord.create(
+            issue_number=issue_number,
+            title=f"Incident {issue_number}",
+            state='closed' if closed_at else 'open',
+            created_at=created_at,
+            closed_at=closed_at,
+            labels=['incident'],
+            assignees=[f"developer-{rng.randrange(25)}"]
+        ))
+
+    return data
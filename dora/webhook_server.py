@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Récepteur de webhooks GitHub pour une ingestion événementielle des données DORA
+- Vérifie la signature X-Hub-Signature-256 de chaque livraison
+- Stocke les événements dans une file locale durable (SQLite)
+- Charge les événements par lots via DatabaseLoader (mêmes upserts que le pipeline),
+  dans les tables du repository de chaque événement
+- Met de côté (dead letters) les événements dont le contenu est invalide
+
+Événements supportés : deployment, deployment_status, push, issues
+
+Usage:
+    python webhook_server.py serve [--port 8080] [--record-dir payloads/]
+    python webhook_server.py replay payloads/*.json
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Tuple
+from records import DeploymentRecord, CommitRecord, IncidentRecord
+
+SUPPORTED_EVENTS = ('deployment', 'deployment_status', 'push', 'issues')
+
+# Un lot est chargé dès qu'il atteint BATCH_SIZE événements, ou toutes les FLUSH_INTERVAL secondes
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Vérifie la signature HMAC-SHA256 envoyée par GitHub
+
+    Args:
+        secret: Secret configuré sur le webhook
+        body: Corps brut de la requête
+        signature: Valeur de l'en-tête X-Hub-Signature-256
+
+    Returns:
+        True si la signature est valide
+    """
+    if not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature)
+
+
+class EventQueue:
+    def __init__(self, path: str):
+        """
+        Initialise la file d'événements durable
+
+        Args:
+            path: Fichier SQLite de la file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                received_at TEXT NOT NULL
+            )
+        """)
+        # Événements invalides retirés de la file, conservés pour analyse
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY,
+                event TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                received_at TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def put(self, event: str, payload: Dict):
+        """Ajoute un événement à la file (persisté avant l'accusé de réception)"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO events (event, payload, received_at) VALUES (?, ?, ?)",
+                (event, json.dumps(payload), datetime.now().isoformat())
+            )
+            self.conn.commit()
+
+    def fetch_batch(self, limit: int = BATCH_SIZE) -> List[Tuple[int, str, Dict]]:
+        """Lit les plus anciens événements en attente"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, event, payload FROM events ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(event_id, event, json.loads(payload)) for event_id, event, payload in rows]
+
+    def ack(self, event_ids: List[int]):
+        """Retire de la file les événements chargés"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM events WHERE id = ?", [(i,) for i in event_ids])
+            self.conn.commit()
+
+    def dead_letter(self, failures: List[Tuple[int, str]]):
+        """
+        Déplace des événements invalides de la file vers dead_letters
+
+        Args:
+            failures: Paires (id de l'événement, erreur)
+        """
+        failed_at = datetime.now().isoformat()
+        with self.lock:
+            for event_id, error in failures:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO dead_letters (id, event, payload, received_at, error, failed_at)
+                    SELECT id, event, payload, received_at, ?, ? FROM events WHERE id = ?
+                """, (error, failed_at, event_id))
+                self.conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            self.conn.commit()
+
+    def dead_letter_count(self) -> int:
+        """Nombre d'événements mis de côté"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def size(self) -> int:
+        """Nombre d'événements en attente"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Convertit un horodatage ISO 8601 de GitHub (suffixe Z compris)"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def records_from_event(event: str, payload: Dict, incident_label: str = "incident") -> Dict[str, list]:
+    """
+    Convertit un événement webhook en enregistrements à charger
+
+    Args:
+        event: Type d'événement (en-tête X-GitHub-Event)
+        payload: Contenu JSON de l'événement
+        incident_label: Label identifiant les issues d'incident
+
+    Returns:
+        Dictionnaire au format de GitHubDataExtractor.extract_all_data()
+    """
+    data = {'deployments': [], 'commits': [], 'deployment_commits': [], 'incidents': []}
+
+    if event in ('deployment', 'deployment_status'):
+        deployment = payload['deployment']
+        status = payload.get('deployment_status')
+        data['deployments'].append(DeploymentRecord.create(
+            deployment_id=deployment['id'],
+            sha=deployment['sha'],
+            environment=deployment['environment'],
+            status=status['state'] if status else 'pending',
+            created_at=_parse_time(deployment['created_at']),
+            updated_at=_parse_time(status['created_at'] if status else deployment['updated_at']),
+            description=deployment.get('description')
+        ))
+
+    elif event == 'push':
+        for commit in payload.get('commits', []):
+            data['commits'].append(CommitRecord.create(
+                sha=commit['id'],
+                committed_date=_parse_time(commit['timestamp']),
+                author=commit.get('author', {}).get('name'),
+                message=commit.get('message')
+            ))
+
+    elif event == 'issues':
+        issue = payload['issue']
+        labels = [label['name'] for label in issue.get('labels', [])]
+        if incident_label in labels:
+            data['incidents'].append(IncidentRecord.create(
+                issue_number=issue['number'],
+                title=issue['title'],
+                state=issue['state'],
+                created_at=_parse_time(issue['created_at']),
+                closed_at=_parse_time(issue.get('closed_at')),
+                labels=labels,
+                assignees=[assignee['login'] for assignee in issue.get('assignees', [])]
+            ))
+
+    return data
+
+
+def event_repository(payload: Dict, default: str = '') -> str:
+    """Repository (owner/name) d'un événement, ou default si le payload ne le précise pas"""
+    repository = payload.get('repository') if isinstance(payload, dict) else None
+    if isinstance(repository, dict) and repository.get('full_name'):
+        return repository['full_name']
+    return default
+
+
+def merge_events(events: List[Tuple[int, str, Dict]], incident_label: str = "incident",
+                 failures: Optional[List[Tuple[int, str]]] = None) -> Dict[str, list]:
+    """
+    Regroupe un lot d'événements ; pour une même clé, le dernier événement reçu l'emporte
+
+    Args:
+        events: Événements (id, type, payload) dans l'ordre de réception
+        incident_label: Label identifiant les issues d'incident
+        failures: Si fourni, reçoit les événements invalides (id, erreur), ignorés
+            au lieu d'interrompre le lot
+
+    Returns:
+        Dictionnaire au format de GitHubDataExtractor.extract_all_data()
+    """
+    deployments = {}
+    commits = {}
+    incidents = {}
+
+    for event_id, event, payload in events:
+        try:
+            data = records_from_event(event, payload, incident_label)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            if failures is None:
+                raise
+            failures.append((event_id, f"{type(e).__name__}: {e}"))
+            continue
+        for record in data['deployments']:
+            # Un événement deployment tardif ne doit pas écraser un statut déjà connu
+            known = deployments.get(record.deployment_id)
+            if event == 'deployment' and known is not None:
+                continue
+            deployments[record.deployment_id] = record
+        for record in data['commits']:
+            commits[record.sha] = record
+        for record in data['incidents']:
+            incidents[record.issue_number] = record
+
+    return {
+        'deployments': list(deployments.values()),
+        'commits': list(commits.values()),
+        'deployment_commits': [],
+        'incidents': list(incidents.values())
+    }
+
+
+class WebhookIngestor:
+    def __init__(self, queue: EventQueue, db_config: Dict, incident_label: str = "incident", repo: str = ''):
+        """
+        Initialise le chargement par lots de la file d'événements
+
+        Args:
+            queue: File d'événements durable
+            db_config: Paramètres de connexion de DatabaseLoader
+            incident_label: Label identifiant les issues d'incident
+            repo: Repository des événements qui n'en précisent pas (owner/name)
+        """
+        self.queue = queue
+        self.db_config = db_config
+        self.incident_label = incident_label
+        self.repo = repo
+        self.loader = None
+
+    def flush(self) -> int:
+        """
+        Charge en base un lot d'événements en attente
+
+        Les événements sont chargés par repository (champ repository.full_name).
+        Les événements invalides (champ manquant, date illisible) sont déplacés
+        vers dead_letters sans bloquer le reste du lot.
+
+        Returns:
+            Nombre d'événements retirés de la file (chargés ou mis de côté)
+        """
+        from db_loader import DatabaseLoader
+
+        events = self.queue.fetch_batch()
+        if not events:
+            return 0
+
+        by_repo = {}
+        for event in events:
+            by_repo.setdefault(event_repository(event[2], self.repo), []).append(event)
+
+        failures = []
+        data = {repo: merge_events(repo_events, self.incident_label, failures)
+                for repo, repo_events in by_repo.items()}
+        if failures:
+            for event_id, error in failures:
+                print(f"Moving invalid webhook event {event_id} to dead letters: {error}")
+            self.queue.dead_letter(failures)
+        processed = len(failures)
+        failed_ids = {event_id for event_id, _ in failures}
+
+        if self.loader is None:
+            self.loader = DatabaseLoader(**self.db_config)
+            self.loader.connect()
+
+        for repo, repo_events in by_repo.items():
+            self.loader.repo = repo
+            if not self.loader.load_all_data(data[repo]):
+                # Les événements restent dans la file et seront rejoués au prochain flush
+                self.close()
+                return processed
+            loaded = [event_id for event_id, _, _ in repo_events if event_id not in failed_ids]
+            self.queue.ack(loaded)
+            processed += len(loaded)
+        return processed
+
+    def close(self):
+        """Ferme la connexion du loader (rouverte au prochain flush)"""
+        if self.loader is None:
+            return
+        try:
+            self.loader.disconnect()
+        except Exception as e:
+            print(f"Error closing webhook loader: {e}")
+        self.loader = None
+
+    def run_forever(self, interval: float = FLUSH_INTERVAL):
+        """Boucle de chargement, exécutée dans un thread dédié"""
+        while True:
+            try:
+                while self.flush() >= BATCH_SIZE:
+                    pass
+            except Exception as e:
+                print(f"Error flushing webhook events: {e}")
+                self.close()
+            time.sleep(interval)
+
+
+def parse_payload(body: bytes, content_type: Optional[str]) -> Dict:
+    """
+    Décode le payload d'une livraison (JSON, ou champ payload d'un webhook
+    configuré en application/x-www-form-urlencoded)
+
+    Raises:
+        ValueError: si le corps n'est pas un objet JSON
+    """
+    text = body.decode('utf-8')
+    if (content_type or '').split(';')[0].strip() == 'application/x-www-form-urlencoded':
+        fields = parse_qs(text)
+        if 'payload' not in fields:
+            raise ValueError("form-encoded delivery without payload field")
+        text = fields['payload'][0]
+    payload = json.loads(text)
+    if not isinstance(payload, dict):
+        raise ValueError("payload is not a JSON object")
+    return payload
+
+
+def make_handler(queue: EventQueue, secret: str, record_dir: Optional[str] = None):
+    """Construit le handler HTTP lié à la file et au secret du webhook"""
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            if not verify_signature(secret, body, self.headers.get('X-Hub-Signature-256')):
+                self.send_response(401)
+                self.end_headers()
+                return
+
+            event = self.headers.get('X-GitHub-Event', '')
+            if event not in SUPPORTED_EVENTS:
+                # ping et événements non suivis : acquittés sans traitement
+                self.send_response(204)
+                self.end_headers()
+                return
+
+            try:
+                payload = parse_payload(body, self.headers.get('Content-Type'))
+            except ValueError as e:
+                # UnicodeDecodeError et JSONDecodeError compris : une relivraison échouerait de même
+                print(f"Rejecting unreadable {event} delivery: {e}")
+                self.send_response(400)
+                self.end_headers()
+                return
+            queue.put(event, payload)
+
+            if record_dir:
+                delivery = self.headers.get('X-GitHub-Delivery', str(time.time_ns()))
+                with open(os.path.join(record_dir, f"{event}-{delivery}.json"), 'w', encoding='utf-8') as f:
+                    json.dump({'event': event, 'payload': payload}, f)
+
+            self.send_response(202)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            print(f"  webhook: {format % args}")
+
+    return WebhookHandler
+
+
+def serve(host: str, port: int, queue: EventQueue, ingestor: WebhookIngestor, secret: str,
+          record_dir: Optional[str] = None):
+    """Démarre le serveur HTTP et le thread de chargement"""
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+
+    threading.Thread(target=ingestor.run_forever, daemon=True).start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(queue, secret, record_dir))
+    print(f"Listening for GitHub webhooks on {host}:{port} ({queue.size()} events pending)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping webhook server...")
+    finally:
+        server.server_close()
+
+
+def replay(paths: List[str], queue: EventQueue, ingestor: WebhookIngestor):
+    """Rejoue des livraisons enregistrées (fichiers {"event": ..., "payload": ...})"""
+    queued = 0
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                delivery = json.load(f)
+            queue.put(delivery['event'], delivery['payload'])
+            queued += 1
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Skipping unreadable delivery {path}: {e}")
+    print(f"Queued {queued} recorded deliveries")
+
+    total = 0
+    try:
+        while True:
+            flushed = ingestor.flush()
+            if not flushed:
+                break
+            total += flushed
+    finally:
+        ingestor.close()
+    print(f"Processed {total} events ({queue.size()} still pending, "
+          f"{queue.dead_letter_count()} dead letters)")
+
+
+def main():
+    """Fonction principale"""
+    import config
+
+    config.load_env()
+
+    parser = argparse.ArgumentParser(description="GitHub webhook receiver for DORA metrics")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Receive webhooks over HTTP")
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=int(os.getenv('WEBHOOK_PORT', 8080)))
+    serve_parser.add_argument('--record-dir', help="Save every verified delivery for later replay")
+    replay_parser = subparsers.add_parser('replay', help="Load recorded deliveries")
+    replay_parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    db_config = dict(zip(('host', 'port', 'dbname', 'user', 'password'), config.db_params()))
+
+    queue = EventQueue(os.getenv('WEBHOOK_QUEUE_PATH', '.dora_spool/webhook_queue.db'))
+    ingestor = WebhookIngestor(queue, db_config, repo=config.repository())
+
+    if args.command == 'replay':
+        replay(args.paths, queue, ingestor)
+        return
+
+    secret = os.getenv('GITHUB_WEBHOOK_SECRET')
+    if not secret:
+        print("Error: GITHUB_WEBHOOK_SECRET must be set to verify webhook signatures")
+        sys.exit(1)
+
+    serve(args.host, args.port, queue, ingestor, secret, args.record_dir)
+
+
+if __name__ == "__main__":
+    main()